@@ -1,53 +1,498 @@
-from http.server import BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from urllib.parse import urlparse
+import hmac
 import json
+import hashlib
 import os
+import sys
+import time
+import uuid
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+
+# The agent and its tools live in src/python
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "python"))
 
 # --- CONFIG ---
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY") or os.environ.get("SUPABASE_KEY")
+SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "10"))
+# Keep-alive connections kept open to PostgREST (one per concurrent request)
+SUPABASE_POOL_SIZE = int(os.environ.get("SUPABASE_POOL_SIZE", "16"))
+# Seconds a supabase_select result is served from memory; 0 = no cache (per call: cache_ttl=)
+SUPABASE_CACHE_TTL = float(os.environ.get("SUPABASE_CACHE_TTL", "0"))
+SUPABASE_CACHE_SIZE = 256
+
+# --- AGENT RUNTIME ---
+AGENT_MAX_SESSIONS = int(os.environ.get("AGENT_MAX_SESSIONS", "200"))
+# Idle seconds before a session's chat is dropped (the client can resend its history)
+AGENT_SESSION_TTL = float(os.environ.get("AGENT_SESSION_TTL", "1800"))
+AGENT_HTTP_WORKERS = int(os.environ.get("AGENT_HTTP_WORKERS", "8"))
+AGENT_REQUEST_TIMEOUT = float(os.environ.get("AGENT_REQUEST_TIMEOUT", "60"))
+MAX_BODY_BYTES = 256 * 1024
+# Callers must send "Authorization: Bearer <token>": a logged-in user's Supabase JWT,
+# or this shared secret (for server-to-server calls and ?stats scripts)
+AGENT_API_SECRET = os.environ.get("AGENT_API_SECRET", "")
+# Seconds a Supabase JWT stays accepted after /auth/v1/user confirmed it
+AUTH_CACHE_TTL = 60
 
 # --- SUPABASE HTTP CLIENT (Lightweight) ---
+_session = None
+_session_lock = threading.Lock()
+
+def supabase_session() -> requests.Session:
+    """
+    Shared keep-alive session: auth headers set once, pooled connections
+    (no TCP/TLS handshake per call) and gzip responses. It lives as long as
+    the process, so warm serverless invocations reuse the connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SUPABASE_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "apikey": SUPABASE_KEY,
+                "Authorization": f"Bearer {SUPABASE_KEY}",
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip",
+            })
+            _session = session
+        return _session
+
 def supabase_rpc(function_name, params=None):
     """Call a Supabase RPC function"""
     url = f"{SUPABASE_URL}/rest/v1/rpc/{function_name}"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
-    resp = requests.post(url, headers=headers, json=params or {})
+    resp = supabase_session().post(url, json=params or {}, timeout=SUPABASE_TIMEOUT)
     return resp.json() if resp.status_code == 200 else None
 
-def supabase_select(table, select="*", filters=None, limit=None):
-    """Select from Supabase via REST"""
-    url = f"{SUPABASE_URL}/rest/v1/{table}?select={select}"
-    if filters:
-        for k, v in filters.items():
-            url += f"&{k}={v}"
-    if limit:
-        url += f"&limit={limit}"
-    
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
-    resp = requests.get(url, headers=headers)
+class SelectCache:
+    """
+    Read-through cache for supabase_select, keyed by table, select, filters
+    and limit; LRU-bounded to `max_entries`.
+
+    An entry is served from memory for its TTL. After that, a single-page
+    read is revalidated with If-None-Match when the response carried an
+    ETag: a 304 renews the entry without a body. Otherwise (no ETag, or a
+    paged read without limit) the rows are read again. Rows are shared
+    between callers: treat them as read-only.
+    """
+
+    def __init__(self, max_entries=SUPABASE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, etag, rows)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(table, select, filters, limit):
+        return (table, select, tuple(sorted((str(k), str(v)) for k, v in _filter_items(filters))), limit)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, ttl, etag, rows):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, etag, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def invalidate(self, *tables):
+        """Drop the entries of `tables` (all of them if none is given), e.g. after a write."""
+        with self._lock:
+            self.stats["invalidations"] += 1
+            if not tables:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] in tables]:
+                del self._entries[key]
+
+    def stats_snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+select_cache = SelectCache()
+
+def _filter_items(filters):
+    """Filters as (column, condition) pairs: a dict, or a list of pairs to repeat a column."""
+    if not filters:
+        return []
+    return list(filters.items()) if isinstance(filters, dict) else list(filters)
+
+def _select(table, select, filters, limit, etag=None):
+    """(rows, etag) for one select; rows is None when `etag` still matches (304)."""
+    if not limit:
+        # Without a limit PostgREST silently caps the result; page through everything instead
+        return list(supabase_select_iter(table, select, filters)), None
+
+    params = [("select", select), *_filter_items(filters), ("limit", limit)]
+    headers = {"If-None-Match": etag} if etag else None
+    resp = supabase_session().get(f"{SUPABASE_URL}/rest/v1/{table}", params=params, headers=headers,
+                                  timeout=SUPABASE_TIMEOUT)
+    if resp.status_code == 304:
+        return None, etag
     if resp.status_code != 200:
         raise Exception(f"Supabase Error: {resp.text}")
-    return resp.json()
+    return resp.json(), resp.headers.get("ETag")
+
+def supabase_select(table, select="*", filters=None, limit=None, cache_ttl=None):
+    """
+    Select from Supabase via REST. Filters are PostgREST params, as a dict
+    ({"status": "eq.aberto"}) or a list of pairs ([("created_at", "gte.…"),
+    ("created_at", "lt.…")]), and are URL-encoded. With a cache TTL
+    (`cache_ttl`, or SUPABASE_CACHE_TTL by default) the read goes through
+    `select_cache`, for hot reads such as the catalog or the open caixas.
+    """
+    ttl = SUPABASE_CACHE_TTL if cache_ttl is None else cache_ttl
+    if ttl <= 0:
+        return _select(table, select, filters, limit)[0]
+
+    key = SelectCache.key(table, select, filters, limit)
+    entry = select_cache.get(key)
+    if entry is not None and time.monotonic() < entry[0]:
+        select_cache.count("hits")
+        return entry[2]
+
+    rows, etag = _select(table, select, filters, limit, etag=entry[1] if entry else None)
+    if rows is None:
+        select_cache.count("revalidated")
+        rows = entry[2]
+    else:
+        select_cache.count("misses")
+    select_cache.put(key, ttl, etag, rows)
+    return rows
+
+def keyset_filter(keys, after):
+    """PostgREST or=(...) body for rows after `after` in `keys` order (same as src/python/paged_reader.py)."""
+    terms = []
+    for i, column in enumerate(keys):
+        equal = [f'{k}.eq."{v}"' for k, v in zip(keys[:i], after[:i])]
+        greater = f'{column}.gt."{after[i]}"'
+        terms.append(f"and({','.join(equal + [greater])})" if equal else greater)
+    return ",".join(terms)
+
+def supabase_select_iter(table, select="*", filters=None, keys=("id",), page_size=1000):
+    """
+    Yields rows page by page (keyset pagination on `keys`), so large reads
+    such as months of vendas run in constant memory.
+    """
+    session = supabase_session()
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
+    after = None
+    while True:
+        params = [("select", select), ("order", ",".join(keys)), ("limit", page_size), *_filter_items(filters)]
+        if after is not None:
+            params.append(("or", f"({keyset_filter(keys, after)})"))
+        resp = session.get(url, params=params, timeout=SUPABASE_TIMEOUT)
+        if resp.status_code != 200:
+            raise Exception(f"Supabase Error: {resp.text}")
+        page = resp.json()
+        yield from page
+        if len(page) < page_size:
+            return
+        after = tuple(page[-1][k] for k in keys)
+
+# --- AUTH ---
+_verified_tokens = {}  # sha256(token) -> expires_at
+_verified_lock = threading.Lock()
+
+def _bearer_token(authorization):
+    scheme, _, token = (authorization or "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else ""
+
+def _supabase_user_ok(token):
+    """True when Supabase Auth accepts `token` as a user session (the anon and service keys are not)."""
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    now = time.monotonic()
+    with _verified_lock:
+        if _verified_tokens.get(digest, 0) > now:
+            return True
+    try:
+        resp = supabase_session().get(f"{SUPABASE_URL}/auth/v1/user", timeout=SUPABASE_TIMEOUT,
+                                      headers={"Authorization": f"Bearer {token}"})
+    except requests.RequestException:
+        return False
+    if resp.status_code != 200 or not resp.json().get("id"):
+        return False
+    with _verified_lock:
+        if len(_verified_tokens) > 1024:
+            for key in [k for k, expires in _verified_tokens.items() if expires <= now]:
+                del _verified_tokens[key]
+        _verified_tokens[digest] = now + AUTH_CACHE_TTL
+    return True
+
+def is_authorized(authorization):
+    """Checks an Authorization header against AGENT_API_SECRET or Supabase Auth."""
+    token = _bearer_token(authorization)
+    if not token:
+        return False
+    if AGENT_API_SECRET and hmac.compare_digest(token.encode(), AGENT_API_SECRET.encode()):
+        return True
+    return bool(SUPABASE_URL) and _supabase_user_ok(token)
+
+# --- AGENT SESSIONS ---
+
+class SessionBusy(Exception):
+    """Another message of the same session is still being answered."""
+
+class Session:
+    def __init__(self, agent):
+        self.agent = agent
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+class AgentRuntime:
+    """
+    Serves ProfessionalAgent to many chat sessions from one process.
+
+    The Gemini model, the tool executor and the Supabase client are built
+    once, in a background thread, and shared; a session only holds its own
+    chat history and memory. Sessions live in an LRU pool bounded by
+    `max_sessions` and an idle `session_ttl`. An evicted session comes back
+    from the `history` the client sends along (AgentChat already does).
+
+    Turns run on `workers` threads. A request waits at most `timeout`
+    seconds, queue included: after that it gets a timeout, and a turn that
+    already started still finishes into the session's history.
+    """
+
+    def __init__(self, model_factory=None, max_sessions=AGENT_MAX_SESSIONS, session_ttl=AGENT_SESSION_TTL,
+                 workers=AGENT_HTTP_WORKERS, timeout=AGENT_REQUEST_TIMEOUT):
+        self.model_factory = model_factory
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.timeout = timeout
+        self._sessions = OrderedDict()  # session_id -> Session, least recently used first
+        self._lock = threading.Lock()
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-http")
+        self._shared = None  # Future -> (model, tool executor)
+        self.stats = {"requests": 0, "created": 0, "restored": 0, "evicted": 0, "expired": 0,
+                      "timeouts": 0, "busy": 0, "errors": 0}
+
+    # --- Shared clients ---
+
+    def warm(self):
+        """Start building the shared model and Supabase client; returns the future (idempotent)."""
+        with self._lock:
+            if self._shared is None:
+                future = Future()
+
+                def _build():
+                    try:
+                        future.set_result(self._build_shared())
+                    except BaseException as e:
+                        future.set_exception(e)
+
+                # Not on the workers: they would wait on a build queued behind them
+                threading.Thread(target=_build, name="agent-warmup", daemon=True).start()
+                self._shared = future
+            return self._shared
+
+    def _build_shared(self):
+        import supabase_client
+        from agent import criar_modelo, MAX_FERRAMENTAS_PARALELAS
+
+        supabase_client.aquecer()
+        model = (self.model_factory or criar_modelo)()
+        tools = ThreadPoolExecutor(max_workers=MAX_FERRAMENTAS_PARALELAS, thread_name_prefix="agent-tool")
+        return model, tools
+
+    def _shared_clients(self, deadline):
+        future = self.warm()
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FuturesTimeout:
+            raise
+        except Exception:
+            # e.g. missing GEMINI_API_KEY: the next request tries again
+            with self._lock:
+                if self._shared is future:
+                    self._shared = None
+            raise
+
+    # --- Session pool ---
+
+    def _expire(self, now):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.session_ttl:
+                return
+            del self._sessions[session_id]
+            self.stats["expired"] += 1
+
+    def _session(self, session_id, history, deadline):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_used = now
+                return session
+
+        from agent import ProfessionalAgent
+        model, tools = self._shared_clients(deadline)
+        agent = ProfessionalAgent(model=model, executor=tools)
+        if history:
+            agent.restaurar_historico(history)
+
+        with self._lock:
+            # Two first messages of the same session may race here: keep the first
+            existing = self._sessions.get(session_id)
+            if existing is not None:
+                return existing
+            session = self._sessions[session_id] = Session(agent)
+            self.stats["created"] += 1
+            if history:
+                self.stats["restored"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evicted"] += 1
+            return session
+
+    # --- Turns ---
+
+    def _turn(self, session_id, message, history, deadline):
+        if time.monotonic() >= deadline:
+            raise TimeoutError("request expired while queued")
+        session = self._session(session_id, history, deadline)
+        if not session.lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise SessionBusy("the previous message of this session is still being answered")
+        try:
+            response = session.agent.responder(message)
+            return response, session.agent.ultima_metrica
+        finally:
+            session.last_used = time.monotonic()
+            session.lock.release()
+
+    def reply(self, session_id, message, history=None):
+        """Answer `message` in `session_id`; raises TimeoutError, SessionBusy or the build error."""
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            self.stats["requests"] += 1
+        future = self._workers.submit(self._turn, session_id, message, history, deadline)
+        try:
+            response, metrics = future.result(timeout=self.timeout)
+        except (TimeoutError, FuturesTimeout):
+            self._count("timeouts")
+            raise TimeoutError(f"no answer within {self.timeout:g} s")
+        except SessionBusy:
+            self._count("busy")
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+        return {"response": response, "session_id": session_id, "metrics": metrics}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def stats_snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["sessions"] = len(self._sessions)
+        stats["max_sessions"] = self.max_sessions
+        stats["ready"] = self._shared is not None and self._shared.done() and not self._shared.exception()
+        return stats
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> AgentRuntime:
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = AgentRuntime()
+        return _runtime
+
+# Cold start: build the model and Supabase client while the first request is being parsed
+if os.environ.get("GEMINI_API_KEY"):
+    get_runtime().warm()
 
 # --- HANDLER ---
 
 class handler(BaseHTTPRequestHandler):
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def do_POST(self):
-        self.send_response(200)
+        """
+        Body: {"message": str, "session_id"?: str, "history"?: [{"role", "content"}]}.
+        Reply: {"response", "session_id", "metrics"}; send the session_id back on the next message.
+        Requires "Authorization: Bearer <Supabase JWT or AGENT_API_SECRET>".
+        """
+        if not is_authorized(self.headers.get('Authorization')):
+            return self._send_unauthorized()
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY_BYTES:
+                return self._send_json(413, {"error": "request body too large"})
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "invalid JSON body"})
+
+        message = data.get("message") if isinstance(data, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            return self._send_json(400, {"error": "'message' is required"})
+        session_id = data.get("session_id")
+        if not isinstance(session_id, str) or not 0 < len(session_id) <= 128:
+            session_id = uuid.uuid4().hex
+        history = data.get("history")
+        history = [m for m in history if isinstance(m, dict)] if isinstance(history, list) else None
+
+        try:
+            result = get_runtime().reply(session_id, message.strip(), history)
+        except TimeoutError as e:
+            return self._send_json(504, {"error": str(e), "session_id": session_id})
+        except SessionBusy as e:
+            return self._send_json(409, {"error": str(e), "session_id": session_id})
+        except Exception as e:
+            return self._send_json(503, {"error": f"Agent unavailable: {e}", "session_id": session_id})
+        self._send_json(200, result)
+
+    def _send_unauthorized(self):
+        body = json.dumps({"error": "missing or invalid credentials"}).encode('utf-8')
+        self.send_response(401)
         self.send_header('Content-type', 'application/json')
+        self.send_header('WWW-Authenticate', 'Bearer')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps({"message": "API is running (Agent removed)"}).encode('utf-8'))
+        self.wfile.write(body)
 
     def do_GET(self):
+        if "stats" in urlparse(self.path).query:
+            if not is_authorized(self.headers.get('Authorization')):
+                return self._send_unauthorized()
+            return self._send_json(200, {**get_runtime().stats_snapshot(),
+                                         "select_cache": select_cache.stats_snapshot()})
         self.send_response(200)
+        self.end_headers()
         self.wfile.write("Python API OK".encode('utf-8'))
 
+if __name__ == "__main__":
+    # Local server: python api/index.py [port]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.environ.get("PORT", "8000"))
+    print(f"Agent API on http://localhost:{port}")
+    ThreadingHTTPServer(("", port), handler).serve_forever()
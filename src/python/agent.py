@@ -1,64 +1,274 @@
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import google.generativeai as genai
 from dotenv import load_dotenv
-from tools import TOOL_MAP, get_vendas_resumo, check_stock
+from tools import TOOL_MAP
+from conversation_memory import MemoriaConversa
 import colorama
 from colorama import Fore, Style
 
 load_dotenv()
-colorama.init(autoreset=True)
 
-class ProfessionalAgent:
-    def __init__(self):
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY não encontrada no .env")
-
-        genai.configure(api_key=api_key)
-        
-        # Configuração do Modelo com Tools (Function Calling)
-        # O SDK do Python permite passar as funções direto para 'tools'
-        self.tools_list = [get_vendas_resumo, check_stock]
-        
-        self.model = genai.GenerativeModel(
-            model_name='gemini-flash-latest',
-            tools=self.tools_list,
-            system_instruction="""
+# Chamadas de ferramenta de uma mesma resposta do modelo rodam em paralelo
+MAX_FERRAMENTAS_PARALELAS = int(os.environ.get("AGENT_TOOL_WORKERS", "8"))
+# Tempo máximo (s) de cada ferramenta; passando disso o modelo recebe um erro
+TIMEOUT_FERRAMENTA = float(os.environ.get("AGENT_TOOL_TIMEOUT", "20"))
+TIMEOUT_FERRAMENTAS = {
+    "get_curva_abc": 45,
+    "get_margens": 45,
+    "get_previsao_estoque": 45,
+}
+# Rodadas modelo -> ferramentas -> modelo por mensagem (evita laço infinito)
+MAX_RODADAS = 8
+SEM_FERRAMENTAS = {"function_calling_config": {"mode": "NONE"}}
+# Papéis do histórico enviado pelos chats da web -> papéis do Gemini (os ausentes são descartados)
+PAPEIS_HISTORICO = {"user": "user", "model": "model", "assistant": "model"}
+
+INSTRUCOES_SISTEMA = """
             Voce e o Gerente Inteligente do "Hortifruti Bom Preco".
             Sua funcao e auxiliar o dono do mercado com informacoes precisas e insights.
-            
+
             REGRAS:
             1. Sempre responda em Portugues do Brasil (PT-BR).
             2. Seja profissional e direto. NAO use emojis (causa erro no terminal).
             3. USE AS FERRAMENTAS disponiveis para responder perguntas sobre Vendas e Estoque. NUNCA invente dados.
             4. Se a ferramenta retornar um erro, avise o usuario honestamente.
             5. Se o usuario perguntar algo fora do contexto do mercado, responda educadamente que seu foco e a gestao do hortifruti.
-            
+            6. Quando precisar de varias informacoes independentes, chame todas as ferramentas de uma vez.
+
             Contexto: Voce tem acesso direto ao banco de dados via ferramentas. Acredite nos dados retornados pelas ferramentas.
             """
-        )
-        
-        # Inicia chat com histórico automático
-        self.chat = self.model.start_chat(enable_automatic_function_calling=True)
 
-    def send_message(self, message: str) -> str:
+def criar_modelo():
+    """
+    Configura o SDK e cria o modelo com as ferramentas. O modelo não guarda
+    estado de conversa: um só pode atender várias sessões (api/index.py).
+    """
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY não encontrada no .env")
+
+    genai.configure(api_key=api_key)
+
+    # Configuração do Modelo com Tools (Function Calling)
+    # O SDK do Python permite passar as funções direto para 'tools'
+    # (versões com cache do TOOL_MAP: mesmo nome, docstring e assinatura)
+    return genai.GenerativeModel(
+        model_name='gemini-flash-latest',
+        tools=list(TOOL_MAP.values()),
+        system_instruction=INSTRUCOES_SISTEMA,
+    )
+
+class ProfessionalAgent:
+    def __init__(self, model=None, executor=None):
+        # `model` e `executor` podem ser compartilhados entre sessões; o chat,
+        # a memória e as métricas são sempre desta instância
+        self.tools_list = list(TOOL_MAP.values())
+        self.model = model or criar_modelo()
+
+        # O laço de ferramentas é nosso (não o automático do SDK): as chamadas
+        # de uma mesma resposta rodam em paralelo, com timeout por ferramenta
+        self.chat = self.model.start_chat()
+        # Histórico limitado: resultados antigos cortados e perguntas antigas resumidas
+        self.memoria = MemoriaConversa()
+        self._executor = executor or ThreadPoolExecutor(max_workers=MAX_FERRAMENTAS_PARALELAS,
+                                                        thread_name_prefix="agent-tool")
+        self.ultima_metrica = None
+        self.metricas = deque(maxlen=100)
+
+    # --- Ferramentas ---
+
+    def _chamar(self, nome, args):
+        inicio = time.perf_counter()
+        try:
+            funcao = TOOL_MAP.get(nome)
+            resultado = funcao(**args) if funcao else f"Erro: ferramenta '{nome}' não existe."
+        except Exception as e:
+            resultado = f"Erro ao executar {nome}: {e}"
+        return resultado, (time.perf_counter() - inicio) * 1000
+
+    def _executar_ferramentas(self, chamadas, metrica):
         """
-        Envia mensagem para o agente e retorna a resposta.
-        O SDK lida automaticamente com a chamada de ferramenta e o loop de resposta (round-trip).
+        Executa as chamadas (function_call) de uma resposta em paralelo e
+        devolve as partes function_response na mesma ordem.
         """
+        inicio = time.perf_counter()
+        futuros = [(fc.name, self._executor.submit(self._chamar, fc.name, dict(fc.args))) for fc in chamadas]
+        partes = []
+        for nome, futuro in futuros:
+            timeout = TIMEOUT_FERRAMENTAS.get(nome, TIMEOUT_FERRAMENTA)
+            restante = max(timeout - (time.perf_counter() - inicio), 0)
+            feitos, _ = wait([futuro], timeout=restante)
+            if feitos:
+                resultado, ms = futuro.result()
+                ok = not (isinstance(resultado, str) and resultado.startswith("Erro"))
+            else:
+                # A thread segue até terminar, mas o modelo não espera por ela
+                resultado, ms, ok = f"Erro: a ferramenta {nome} excedeu {timeout:g} s.", timeout * 1000, False
+            metrica["ferramentas"].append({"nome": nome, "ms": ms, "ok": ok})
+            partes.append(genai.protos.Part(function_response=genai.protos.FunctionResponse(
+                name=nome, response={"result": resultado})))
+        metrica["ferramentas_ms"] += (time.perf_counter() - inicio) * 1000
+        return partes
+
+    @staticmethod
+    def _chamadas(response):
+        return [p.function_call for p in response.parts if p.function_call and p.function_call.name]
+
+    # --- Conversa ---
+
+    def _rodadas(self, message, stream, metrica):
+        """
+        Gera os trechos de texto da resposta. Enquanto o modelo pedir
+        ferramentas, elas são executadas (em paralelo dentro da mesma
+        resposta) e os resultados voltam para ele. Com `stream`, o texto sai
+        conforme é gerado, inclusive o que vier antes de uma chamada.
+        """
+        conteudo = message
+        for _ in range(MAX_RODADAS):
+            t = time.perf_counter()
+            response = self.chat.send_message(conteudo, stream=stream)
+            if stream:
+                try:
+                    for chunk in response:
+                        for parte in chunk.parts:
+                            if parte.text:
+                                yield parte.text
+                finally:
+                    # O histórico do chat só fecha a rodada com a resposta inteira
+                    response.resolve()
+            metrica["modelo_ms"] += (time.perf_counter() - t) * 1000
+            metrica["rodadas"] += 1
+            uso = getattr(response, "usage_metadata", None)
+            if uso:
+                metrica["prompt_tokens"] += uso.prompt_token_count
+            chamadas = self._chamadas(response)
+            if not chamadas:
+                if not stream:
+                    yield response.text
+                return
+            conteudo = self._executar_ferramentas(chamadas, metrica)
+
+        # Rodadas esgotadas: os resultados da última leva ainda precisam ir para
+        # o modelo (o histórico não pode terminar numa chamada sem resposta).
+        # Sem ferramentas, ele fecha a mensagem com o que já tem.
+        t = time.perf_counter()
+        response = self.chat.send_message(conteudo, tool_config=SEM_FERRAMENTAS)
+        metrica["modelo_ms"] += (time.perf_counter() - t) * 1000
+        metrica["rodadas"] += 1
+        yield response.text
+
+    def _conversar(self, message, stream):
+        metrica = {"modo": "stream" if stream else "bloqueante", "modelo_ms": 0.0, "ferramentas_ms": 0.0,
+                   "ferramentas": [], "rodadas": 0, "primeiro_texto_ms": None, "prompt_tokens": 0,
+                   "historico_tokens": self.memoria.tokens(self.chat.history)}
+        inicio = time.perf_counter()
+        tamanho_historico = len(self.chat.history)
         try:
-            print(f"{Fore.CYAN}[Agente] Pensando...{Style.RESET_ALL}")
-            response = self.chat.send_message(message)
-            return response.text
+            for texto in self._rodadas(message, stream, metrica):
+                if metrica["primeiro_texto_ms"] is None:
+                    metrica["primeiro_texto_ms"] = (time.perf_counter() - inicio) * 1000
+                yield texto
+            # Com a resposta já entregue: deixa o histórico no orçamento para a próxima
+            self.memoria.compactar(self.chat)
         except Exception as e:
-            return f"[Erro] no Agente: {str(e)}"
+            # A mensagem que falhou sai do histórico: uma chamada de ferramenta sem
+            # resposta no fim dele faria o modelo recusar todas as próximas
+            self.chat.history = list(self.chat.history)[:tamanho_historico]
+            yield f"[Erro] no Agente: {str(e)}"
+        finally:
+            metrica["total_ms"] = (time.perf_counter() - inicio) * 1000
+            self.ultima_metrica = metrica
+            self.metricas.append(metrica)
+
+    def send_message(self, message: str) -> str:
+        """
+        Envia mensagem para o agente e retorna a resposta completa.
+        Tempos do modelo e de cada ferramenta ficam em `ultima_metrica`.
+        """
+        print(f"{Fore.CYAN}[Agente] Pensando...{Style.RESET_ALL}")
+        return self.responder(message)
+
+    def responder(self, message: str) -> str:
+        """`send_message` sem a saída no terminal (uso pelo serviço HTTP)."""
+        return "".join(self._conversar(message, stream=False))
+
+    def stream_message(self, message: str):
+        """
+        Como `send_message`, mas gera a resposta em trechos conforme o modelo
+        os produz. `ultima_metrica` registra o tempo até o primeiro trecho.
+        """
+        return self._conversar(message, stream=True)
+
+    def restaurar_historico(self, mensagens):
+        """
+        Recria o histórico a partir de [{"role": ..., "content": texto}], para
+        uma sessão que o servidor já descartou. Aceita os papéis do AgentChat
+        ("user"/"model") e do ManagerChat ("user"/"assistant"/"system"); os
+        avisos "system" são da interface e ficam de fora. Mensagens seguidas
+        do mesmo papel viram um turno só, e a saudação inicial do assistente
+        é descartada, assim como uma última pergunta sem resposta, para o
+        histórico alternar usuário/modelo. Só o texto volta; o histórico passa pelo orçamento da memória.
+        """
+        turnos = []  # (papel, [textos])
+        for m in mensagens:
+            papel = PAPEIS_HISTORICO.get(m.get("role"))
+            if not papel or not m.get("content") or (papel == "model" and not turnos):
+                continue
+            if turnos and turnos[-1][0] == papel:
+                turnos[-1][1].append(str(m["content"]))
+            else:
+                turnos.append((papel, [str(m["content"])]))
+        if turnos and turnos[-1][0] == "user":
+            # Pergunta sem resposta (ex.: falhou): a mensagem nova vem logo depois dela
+            turnos.pop()
+        historico = [genai.protos.Content(role=papel, parts=[genai.protos.Part(text=t) for t in textos])
+                     for papel, textos in turnos]
+        self.chat.history = historico
+        if historico:
+            self.memoria.compactar(self.chat)
+
+def descrever_metrica(metrica) -> str:
+    """'modelo 1200 ms (2 rodadas), ferramentas 310 ms [a 300 ms, b 120 ms], 1º texto 900 ms, total 1520 ms'"""
+    ferramentas = ", ".join(f"{f['nome']} {f['ms']:.0f} ms" + ("" if f['ok'] else " (erro)")
+                            for f in metrica["ferramentas"])
+    texto = f"modelo {metrica['modelo_ms']:.0f} ms ({metrica['rodadas']} rodadas)"
+    if ferramentas:
+        texto += f", ferramentas {metrica['ferramentas_ms']:.0f} ms [{ferramentas}]"
+    if metrica.get("prompt_tokens"):
+        texto += f", prompt {metrica['prompt_tokens']} tokens (histórico ~{metrica['historico_tokens']})"
+    if metrica.get("primeiro_texto_ms") is not None:
+        texto += f", 1º texto {metrica['primeiro_texto_ms']:.0f} ms"
+    return texto + f", total {metrica['total_ms']:.0f} ms"
+
+def comparar_metricas(metricas) -> dict:
+    """Médias de tempo até o primeiro texto e total, por modo (stream x bloqueante)."""
+    por_modo = {}
+    for m in metricas:
+        por_modo.setdefault(m.get("modo", "bloqueante"), []).append(m)
+    resultado = {}
+    for modo, lista in por_modo.items():
+        primeiros = [m["primeiro_texto_ms"] for m in lista if m.get("primeiro_texto_ms") is not None]
+        resultado[modo] = {
+            "mensagens": len(lista),
+            "primeiro_texto_ms": sum(primeiros) / len(primeiros) if primeiros else None,
+            "total_ms": sum(m["total_ms"] for m in lista) / len(lista),
+        }
+    return resultado
 
 # Teste simples se rodar direto
 if __name__ == "__main__":
+    # No main.py quem inicializa o colorama é o próprio main (este módulo sobe numa thread)
+    colorama.init(autoreset=True)
     agent = ProfessionalAgent()
     print("Agente Iniciado. Digite 'sair' para encerrar.")
     while True:
         msg = input(f"{Fore.GREEN}Voce: {Style.RESET_ALL}")
         if msg.lower() in ['sair', 'exit']: break
-        resp = agent.send_message(msg)
-        print(f"{Fore.YELLOW}Agente:{Style.RESET_ALL} {resp}\n")
+        print(f"{Fore.YELLOW}Agente:{Style.RESET_ALL} ", end="")
+        for trecho in agent.stream_message(msg):
+            print(trecho, end="", flush=True)
+        print("\n")
+        print(f"{Style.DIM}[Tempo] {descrever_metrica(agent.ultima_metrica)}{Style.RESET_ALL}")
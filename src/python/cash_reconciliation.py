@@ -0,0 +1,356 @@
+import sys
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from catalog_index import normalizar
+from paged_reader import ler_tabela
+
+# Intervalo mínimo (s) entre duas consultas incrementais ao Supabase
+INTERVALO_ATUALIZACAO = 10
+# Janela relida antes do watermark: pega vendas gravadas fora de ordem (reaplicar é idempotente)
+FOLGA_SEGUNDOS = 300
+
+CAMPOS_CAIXA = "*"
+CAMPOS_VENDA = "id, caixa_id, status, total, forma_pagamento, updated_at, vendas_pagamentos(*)"
+CAMPOS_MOVIMENTACAO = "id, caixa_id, tipo, valor, criado_em"
+MEIOS = ("dinheiro", "pix", "cartao", "outros")
+
+def _centavos(valor) -> int:
+    # Somas em centavos inteiros: milhares de vendas sem erro de arredondamento
+    return int(round(float(valor or 0) * 100))
+
+def meio_pagamento(forma) -> str:
+    """'dinheiro', 'pix', 'cartao' ou 'outros' (aceita o enum e os nomes de formas_pagamento)."""
+    nome = normalizar(forma or '')
+    if 'dinheiro' in nome:
+        return 'dinheiro'
+    if 'pix' in nome:
+        return 'pix'
+    if 'debito' in nome or 'credito' in nome or 'cartao' in nome:
+        return 'cartao'
+    return 'outros'
+
+def contribuicao_venda(venda, formas=None):
+    """
+    Quanto a venda soma em cada meio, em centavos (vazio se não finalizada).
+    Com pagamentos divididos (`vendas_pagamentos`), cada parte vai para o seu
+    meio; o que passar do total é troco e sai do dinheiro. Sem pagamentos,
+    usa `forma_pagamento` da venda (vendas antigas).
+    """
+    if venda.get('status') != 'finalizada':
+        return {}
+    formas = formas or {}
+    total = _centavos(venda.get('total'))
+    pagamentos = venda.get('vendas_pagamentos') or []
+    if not pagamentos:
+        return {meio_pagamento(venda.get('forma_pagamento')): total}
+
+    contrib = {}
+    for p in pagamentos:
+        forma = p.get('forma_pagamento') or formas.get(p.get('forma_pagamento_id'))
+        meio = meio_pagamento(forma)
+        contrib[meio] = contrib.get(meio, 0) + _centavos(p.get('valor'))
+    troco = sum(contrib.values()) - total
+    if troco > 0:
+        contrib['dinheiro'] = contrib.get('dinheiro', 0) - troco
+    return contrib
+
+class Turno:
+    """Saldos correntes de um caixa (turno), em centavos."""
+
+    def __init__(self, caixa):
+        self.id = caixa['id']
+        self.atualizar_caixa(caixa)
+        self.vendas = {meio: 0 for meio in MEIOS}
+        self.qtd_vendas = 0
+        self.sangrias = 0
+        self.suprimentos = 0
+
+    def atualizar_caixa(self, caixa):
+        self.caixa = caixa
+        self.valor_inicial = _centavos(caixa.get('valor_inicial') or caixa.get('valor_abertura'))
+        self.status = caixa.get('status') or 'aberto'
+
+    @property
+    def dinheiro_esperado(self):
+        return self.valor_inicial + self.vendas['dinheiro'] + self.suprimentos - self.sangrias
+
+    def resumo(self):
+        reais = lambda c: c / 100
+        return {
+            "caixa_id": self.id,
+            "status": self.status,
+            "operador_id": self.caixa.get('operador_id'),
+            "data_abertura": self.caixa.get('data_abertura'),
+            "valor_inicial": reais(self.valor_inicial),
+            "qtd_vendas": self.qtd_vendas,
+            "vendas": {meio: reais(v) for meio, v in self.vendas.items()},
+            "total_vendas": reais(sum(self.vendas.values())),
+            "sangrias": reais(self.sangrias),
+            "suprimentos": reais(self.suprimentos),
+            "dinheiro_esperado": reais(self.dinheiro_esperado),
+        }
+
+class ConciliacaoCaixas:
+    """
+    Saldos correntes de cada caixa aberto, mantidos de forma incremental.
+
+    Um caixa visto pela primeira vez é carregado inteiro (suas vendas e
+    movimentações). Depois disso, cada `atualizar()` lê só as vendas com
+    `updated_at` e as movimentações com `criado_em` posteriores aos
+    watermarks. A contribuição de cada venda fica guardada; se a venda
+    muda (cancelada, corrigida), a antiga é subtraída antes de somar a
+    nova. Assim "quanto tem no caixa 2" e o fechamento são leituras de
+    memória, sem somar as vendas de novo.
+    """
+
+    def __init__(self, intervalo=INTERVALO_ATUALIZACAO, folga=FOLGA_SEGUNDOS):
+        self.intervalo = intervalo
+        self.folga = timedelta(seconds=folga)
+        self._turnos = {}          # caixa_id -> Turno
+        self._contrib = {}         # venda_id -> (caixa_id, {meio: centavos})
+        self._movimentacoes = {}   # movimentacao_id -> caixa_id
+        self._formas = None        # formas_pagamento.id -> nome
+        self._wm_vendas = None
+        self._wm_movimentacoes = None
+        self._ultima_consulta = 0.0
+        self._lock = threading.RLock()
+        self.stats = {"atualizacoes": 0, "caixas_carregados": 0, "vendas_aplicadas": 0,
+                      "vendas_corrigidas": 0, "movimentacoes_aplicadas": 0}
+
+    # --- Eventos ---
+
+    def aplicar_venda(self, venda):
+        """Soma a venda ao seu caixa, trocando a contribuição anterior se já foi vista."""
+        with self._lock:
+            anterior = self._contrib.pop(venda['id'], None)
+            if anterior:
+                turno = self._turnos.get(anterior[0])
+                if turno:
+                    for meio, valor in anterior[1].items():
+                        turno.vendas[meio] -= valor
+                    turno.qtd_vendas -= 1
+            turno = self._turnos.get(venda.get('caixa_id'))
+            contrib = contribuicao_venda(venda, self._formas) if turno else {}
+            if contrib:
+                for meio, valor in contrib.items():
+                    turno.vendas[meio] += valor
+                turno.qtd_vendas += 1
+                self._contrib[venda['id']] = (turno.id, contrib)
+            if anterior and anterior[1] != contrib:
+                self.stats["vendas_corrigidas"] += 1
+            self.stats["vendas_aplicadas"] += 1
+            self._avancar('_wm_vendas', venda.get('updated_at'))
+
+    def aplicar_movimentacao(self, mov):
+        """Sangria ou suprimento (só entram uma vez; a tabela não tem edição)."""
+        with self._lock:
+            self._avancar('_wm_movimentacoes', mov.get('criado_em'))
+            turno = self._turnos.get(mov.get('caixa_id'))
+            if turno is None or mov['id'] in self._movimentacoes:
+                return
+            self._movimentacoes[mov['id']] = turno.id
+            if mov.get('tipo') == 'sangria':
+                turno.sangrias += _centavos(mov.get('valor'))
+            elif mov.get('tipo') == 'suprimento':
+                turno.suprimentos += _centavos(mov.get('valor'))
+            self.stats["movimentacoes_aplicadas"] += 1
+
+    def _avancar(self, atributo, instante):
+        if instante and (getattr(self, atributo) is None or instante > getattr(self, atributo)):
+            setattr(self, atributo, instante)
+
+    # --- Sincronização com o Supabase ---
+
+    def _desde(self, watermark):
+        if watermark is None:
+            return None
+        instante = datetime.fromisoformat(watermark.replace('Z', '+00:00'))
+        return (instante - self.folga).isoformat()
+
+    def _carregar_caixa(self, sb, caixa):
+        turno = Turno(caixa)
+        self._turnos[turno.id] = turno
+        filtro = lambda q: q.eq("caixa_id", turno.id)
+        for venda in ler_tabela(sb, "vendas", CAMPOS_VENDA, filtros=filtro):
+            self.aplicar_venda(venda)
+        for mov in ler_tabela(sb, "movimentacoes_caixa", CAMPOS_MOVIMENTACAO, filtros=filtro):
+            self.aplicar_movimentacao(mov)
+        self.stats["caixas_carregados"] += 1
+
+    def atualizar(self, sb=None, forcar=False):
+        """Traz caixas abertos e as vendas/movimentações novas, respeitando `intervalo`."""
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_consulta < self.intervalo:
+            return False
+        if sb is None:
+            from supabase_client import get_supabase
+            sb = get_supabase()
+
+        with self._lock:
+            if self._formas is None:
+                self._formas = {f['id']: f['nome'] for f in ler_tabela(sb, "formas_pagamento", "id, nome")}
+
+            # Na primeira consulta os watermarks começam agora: o passado dos caixas
+            # abertos vem da carga de cada um, não de todas as vendas da história
+            inicio = datetime.now(timezone.utc).isoformat()
+            self._wm_vendas = self._wm_vendas or inicio
+            self._wm_movimentacoes = self._wm_movimentacoes or inicio
+            # Calculados antes de carregar caixas novos: o que chegar no meio é relido
+            desde_vendas = self._desde(self._wm_vendas)
+            desde_movs = self._desde(self._wm_movimentacoes)
+
+            abertos = {c['id']: c for c in ler_tabela(
+                sb, "caixas", CAMPOS_CAIXA, filtros=lambda q: q.eq("status", "aberto"))}
+            for caixa_id, turno in list(self._turnos.items()):
+                if caixa_id in abertos:
+                    turno.atualizar_caixa(abertos[caixa_id])
+                elif turno.status == 'aberto':
+                    # Saiu da lista de abertos: fechado (ou apagado) desde a última consulta
+                    linhas = sb.table("caixas").select(CAMPOS_CAIXA).eq("id", caixa_id).execute().data
+                    if linhas:
+                        turno.atualizar_caixa(linhas[0])
+                    else:
+                        self._descartar(caixa_id)
+            for caixa_id, caixa in abertos.items():
+                if caixa_id not in self._turnos:
+                    self._carregar_caixa(sb, caixa)
+
+            for venda in ler_tabela(sb, "vendas", CAMPOS_VENDA, chave=("updated_at", "id"),
+                                    filtros=lambda q: q.gte("updated_at", desde_vendas)):
+                self.aplicar_venda(venda)
+            for mov in ler_tabela(sb, "movimentacoes_caixa", CAMPOS_MOVIMENTACAO, chave=("criado_em", "id"),
+                                  filtros=lambda q: q.gte("criado_em", desde_movs)):
+                self.aplicar_movimentacao(mov)
+
+            self._ultima_consulta = agora
+            self.stats["atualizacoes"] += 1
+        return True
+
+    def _descartar(self, caixa_id):
+        self._turnos.pop(caixa_id, None)
+        for venda_id in [v for v, c in self._contrib.items() if c[0] == caixa_id]:
+            del self._contrib[venda_id]
+        for mov_id in [m for m, c in self._movimentacoes.items() if c == caixa_id]:
+            del self._movimentacoes[mov_id]
+
+    def expirar(self):
+        """Faz a próxima `atualizar()` consultar o Supabase mesmo dentro do intervalo."""
+        self._ultima_consulta = 0.0
+
+    # --- Consultas (memória) ---
+
+    def abertos(self):
+        """Caixas abertos, do mais antigo para o mais novo."""
+        with self._lock:
+            turnos = [t for t in self._turnos.values() if t.status == 'aberto']
+        return sorted(turnos, key=lambda t: t.caixa.get('data_abertura') or '')
+
+    def localizar(self, referencia):
+        """Turno por número (1 = caixa aberto há mais tempo) ou pelo início do id."""
+        referencia = str(referencia).strip().lower()
+        abertos = self.abertos()
+        if referencia.isdigit() and 0 < int(referencia) <= len(abertos):
+            return abertos[int(referencia) - 1]
+        with self._lock:
+            for caixa_id, turno in self._turnos.items():
+                if referencia and caixa_id.lower().startswith(referencia):
+                    return turno
+        return None
+
+    def divergencias(self):
+        """
+        Caixas abertos em que os saldos gravados em `caixas` (pelo trigger de
+        vendas e por `movimentar_caixa`) diferem do calculado. O trigger não
+        desconta vendas canceladas e roda antes dos pagamentos divididos
+        serem gravados, então é aqui que essas diferenças aparecem.
+        """
+        resultado = []
+        for turno in self.abertos():
+            gravado = {
+                "dinheiro": _centavos(turno.caixa.get('saldo_dinheiro')),
+                "pix": _centavos(turno.caixa.get('saldo_pix')),
+                "cartao": _centavos(turno.caixa.get('saldo_cartao')),
+            }
+            calculado = {"dinheiro": turno.dinheiro_esperado, "pix": turno.vendas['pix'],
+                         "cartao": turno.vendas['cartao']}
+            diferencas = {m: (calculado[m] - gravado[m]) / 100 for m in gravado if calculado[m] != gravado[m]}
+            if diferencas:
+                resultado.append({"caixa_id": turno.id, "diferencas": diferencas})
+        return resultado
+
+    def fechar(self, referencia, valor_contado, sb=None):
+        """
+        Fecha o caixa com o dinheiro contado na gaveta. A quebra (contado -
+        esperado) sai do saldo já calculado. Retorna o resumo do turno.
+        """
+        if sb is None:
+            from supabase_client import get_supabase
+            sb = get_supabase()
+        self.atualizar(sb, forcar=True)
+        turno = self.localizar(referencia)
+        if turno is None or turno.status != 'aberto':
+            raise ValueError(f"Caixa aberto '{referencia}' não encontrado.")
+        quebra = (_centavos(valor_contado) - turno.dinheiro_esperado) / 100
+        sb.rpc("fechar_caixa", {
+            "p_caixa_id": turno.id,
+            "p_valor_final_informado": float(valor_contado),
+            "p_quebra": quebra,
+        }).execute()
+        with self._lock:
+            turno.status = 'fechado'
+        resumo = turno.resumo()
+        resumo.update({"valor_contado": float(valor_contado), "quebra": quebra})
+        return resumo
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["caixas"] = len(self._turnos)
+            stats["vendas"] = len(self._contrib)
+            stats["watermark_vendas"] = self._wm_vendas
+            stats["watermark_movimentacoes"] = self._wm_movimentacoes
+        return stats
+
+_conciliacao = None
+
+def get_conciliacao() -> ConciliacaoCaixas:
+    global _conciliacao
+    if _conciliacao is None:
+        _conciliacao = ConciliacaoCaixas()
+    return _conciliacao
+
+def descrever(resumo):
+    v = resumo['vendas']
+    return (f"Caixa {resumo['caixa_id'][:8]} ({resumo['status']}, aberto em {resumo['data_abertura']}): "
+            f"{resumo['qtd_vendas']} vendas, R$ {resumo['total_vendas']:.2f} "
+            f"(dinheiro R$ {v['dinheiro']:.2f}, pix R$ {v['pix']:.2f}, cartão R$ {v['cartao']:.2f}); "
+            f"sangrias R$ {resumo['sangrias']:.2f}, suprimentos R$ {resumo['suprimentos']:.2f}; "
+            f"dinheiro na gaveta R$ {resumo['dinheiro_esperado']:.2f}")
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    conciliacao = get_conciliacao()
+
+    if comando == 'status':
+        conciliacao.atualizar(forcar=True)
+        abertos = conciliacao.abertos()
+        if not abertos:
+            print("Nenhum caixa aberto.")
+        for i, turno in enumerate(abertos, 1):
+            print(f"{i}. {descrever(turno.resumo())}")
+    elif comando == 'verificar':
+        conciliacao.atualizar(forcar=True)
+        divergencias = conciliacao.divergencias()
+        if not divergencias:
+            print("Saldos gravados em caixas conferem com as vendas e movimentações.")
+        for d in divergencias:
+            print(f"Caixa {d['caixa_id']}: " + ", ".join(f"{m} {dif:+.2f}" for m, dif in d['diferencas'].items()))
+        if divergencias:
+            sys.exit(1)
+    elif comando == 'fechar' and len(sys.argv) > 3:
+        resumo = conciliacao.fechar(sys.argv[2], float(sys.argv[3].replace(',', '.')))
+        print(descrever(resumo))
+        print(f"Contado R$ {resumo['valor_contado']:.2f}, quebra R$ {resumo['quebra']:+.2f}")
+    else:
+        print("Uso: python cash_reconciliation.py [status | verificar | fechar <caixa> <valor_contado>]")
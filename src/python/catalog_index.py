@@ -0,0 +1,238 @@
+import sys
+import time
+import heapq
+import threading
+import unicodedata
+from collections import Counter
+from itertools import chain
+from paged_reader import ler_tabela
+
+# Tempo (s) em que o índice é considerado atual antes de buscar alterações no Supabase
+CATALOGO_TTL = 15
+# A cada quanto tempo (s) recarregar tudo (pega produtos apagados, que não mudam updated_at)
+CATALOGO_RECARGA_TOTAL = 3600
+CAMPOS_PRODUTO = ("id, nome, estoque_atual, estoque_minimo, preco_unidade, preco_kg, tipo_venda, "
+                  "codigo_barras, perecivel, eh_caixa, peso_caixa, ativo, updated_at")
+TAMANHO_PAGINA = 1000
+
+def normalizar(texto: str) -> str:
+    """'  Maçã FUJI!' -> 'maca fuji' (sem acento, minúsculo, só letras/números)."""
+    sem_acento = unicodedata.normalize('NFKD', texto or '')
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    limpo = ''.join(c if c.isalnum() else ' ' for c in sem_acento.lower())
+    return ' '.join(limpo.split())
+
+def trigramas(texto: str):
+    """Trigramas do texto normalizado, com bordas de palavra ('  m', ' ma', 'mac', ...)."""
+    t = f"  {texto} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+class CatalogoProdutos:
+    """
+    Índice local do catálogo de produtos ativos.
+
+    Guarda o nome normalizado (sem acento) de cada produto, um índice de
+    trigramas e um mapa exato de código de barras. A busca roda em memória:
+    código de barras é uma consulta de dicionário, substring é a interseção
+    das listas de trigramas, e erros de digitação caem na busca aproximada
+    por trigramas em comum.
+
+    `atualizar()` só consulta o Supabase depois de `ttl` segundos e, nesse
+    caso, traz apenas os produtos com `updated_at` posterior ao último visto.
+    """
+
+    def __init__(self, ttl=CATALOGO_TTL, recarga_total=CATALOGO_RECARGA_TOTAL):
+        self.ttl = ttl
+        self.recarga_total = recarga_total
+        self._produtos = {}      # id -> produto
+        self._nomes = {}         # id -> nome normalizado
+        self._por_codigo = {}    # código de barras -> id
+        self._trigramas = {}     # trigrama -> set(ids)
+        self._watermark = None
+        self._ultima_consulta = 0.0
+        self._ultima_recarga = 0.0
+        self._lock = threading.RLock()
+        self._observadores = []
+        self.stats = {"buscas": 0, "atualizacoes": 0, "recargas": 0, "produtos_alterados": 0}
+
+    # --- Manutenção do índice ---
+
+    def _remover(self, produto_id):
+        antigo = self._produtos.pop(produto_id, None)
+        if antigo is None:
+            return
+        for tri in trigramas(self._nomes.pop(produto_id)):
+            ids = self._trigramas.get(tri)
+            if ids is not None:
+                ids.discard(produto_id)
+                if not ids:
+                    del self._trigramas[tri]
+        codigo = antigo.get('codigo_barras')
+        if codigo and self._por_codigo.get(codigo) == produto_id:
+            del self._por_codigo[codigo]
+
+    def _indexar(self, produto):
+        produto_id = produto['id']
+        self._remover(produto_id)
+        if produto.get('ativo') is False:
+            return
+        nome = normalizar(produto.get('nome'))
+        self._produtos[produto_id] = produto
+        self._nomes[produto_id] = nome
+        for tri in trigramas(nome):
+            self._trigramas.setdefault(tri, set()).add(produto_id)
+        if produto.get('codigo_barras'):
+            self._por_codigo[produto['codigo_barras']] = produto_id
+
+    def observar(self, callback):
+        """
+        Registra `callback(produtos, substituir)`, chamado depois de cada
+        `aplicar` com as linhas recebidas (só as alteradas, exceto na recarga total).
+        """
+        self._observadores.append(callback)
+
+    def aplicar(self, produtos, substituir=False):
+        """Indexa `produtos` (linhas de `produtos`); com `substituir`, descarta o índice atual antes."""
+        self._aplicar(produtos, substituir)
+        for callback in self._observadores:
+            try:
+                callback(produtos, substituir)
+            except Exception as e:
+                print(f"[Aviso] Observador do catálogo falhou: {e}")
+
+    def _aplicar(self, produtos, substituir):
+        with self._lock:
+            if substituir:
+                self._produtos.clear()
+                self._nomes.clear()
+                self._por_codigo.clear()
+                self._trigramas.clear()
+                self._watermark = None
+            for produto in produtos:
+                self._indexar(produto)
+                atualizado = produto.get('updated_at')
+                if atualizado and (self._watermark is None or atualizado > self._watermark):
+                    self._watermark = atualizado
+            self.stats["produtos_alterados"] += len(produtos)
+
+    def _buscar_linhas(self, sb, desde=None):
+        def filtros(query):
+            # gte: produtos gravados no mesmo instante do watermark não se perdem
+            return query.gte("updated_at", desde) if desde else query.eq("ativo", True)
+        # Lista completa antes de mexer no índice: uma falha no meio não o deixa pela metade
+        return list(ler_tabela(sb, "produtos", CAMPOS_PRODUTO, filtros=filtros,
+                               tamanho_pagina=TAMANHO_PAGINA))
+
+    def atualizar(self, sb=None, forcar=False):
+        """Traz do Supabase o que mudou desde o último `updated_at` visto, respeitando o TTL."""
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_consulta < self.ttl:
+            return False
+        if sb is None:
+            from supabase_client import get_supabase
+            sb = get_supabase()
+
+        with self._lock:
+            if forcar or self._watermark is None or agora - self._ultima_recarga >= self.recarga_total:
+                self.aplicar(self._buscar_linhas(sb), substituir=True)
+                self._ultima_recarga = agora
+                self.stats["recargas"] += 1
+            else:
+                self.aplicar(self._buscar_linhas(sb, desde=self._watermark))
+                self.stats["atualizacoes"] += 1
+            self._ultima_consulta = agora
+        return True
+
+    def expirar(self):
+        """Faz a próxima `atualizar()` consultar o Supabase mesmo dentro do TTL."""
+        self._ultima_consulta = 0.0
+
+    # --- Consultas ---
+
+    def por_codigo(self, codigo):
+        produto_id = self._por_codigo.get(str(codigo).strip())
+        return self._produtos.get(produto_id) if produto_id else None
+
+    def produtos(self):
+        """Cópia da lista de produtos ativos indexados."""
+        with self._lock:
+            return list(self._produtos.values())
+
+    def _candidatos(self, tris):
+        """Ids que contêm todos os trigramas (interseção começando pela menor lista)."""
+        listas = sorted((self._trigramas.get(t, ()) for t in tris), key=len)
+        if not listas or not listas[0]:
+            return set()
+        candidatos = set(listas[0])
+        for ids in listas[1:]:
+            candidatos &= ids
+            if not candidatos:
+                break
+        return candidatos
+
+    def buscar(self, termo: str, limite=5, similaridade_minima=0.4):
+        """
+        Produtos que casam com `termo`: código de barras exato, depois nomes
+        que contêm o termo (ignorando acentos), depois nomes parecidos.
+        """
+        self.stats["buscas"] += 1
+        with self._lock:
+            produto = self.por_codigo(termo)
+            if produto:
+                return [produto]
+
+            consulta = normalizar(termo)
+            if not consulta:
+                return []
+
+            if len(consulta) < 3:
+                ids = [i for i, nome in self._nomes.items()
+                       if any(p.startswith(consulta) for p in nome.split())]
+            else:
+                # Sem bordas: o termo pode estar no meio da palavra ("aca" acha "maca fuji")
+                internos = {consulta[i:i + 3] for i in range(len(consulta) - 2)}
+                ids = [i for i in self._candidatos(internos) if consulta in self._nomes[i]]
+                if not ids:
+                    ids = self._aproximados(trigramas(consulta), similaridade_minima, limite)
+                    return [self._produtos[i] for i in ids]
+
+            # Quem começa com o termo primeiro, depois os nomes mais curtos
+            nomes = self._nomes
+            ids = heapq.nsmallest(limite, ids, key=lambda i: (not nomes[i].startswith(consulta), len(nomes[i])))
+            return [self._produtos[i] for i in ids]
+
+    def _aproximados(self, tris, similaridade_minima, limite):
+        # Counter conta em C, bem mais rápido que somar num dict em Python
+        contagem = Counter(chain.from_iterable(self._trigramas.get(t, ()) for t in tris))
+        minimo = similaridade_minima * len(tris)
+        return heapq.nsmallest(limite, (i for i, c in contagem.items() if c >= minimo),
+                               key=lambda i: (-contagem[i], len(self._nomes[i])))
+
+    def __len__(self):
+        return len(self._produtos)
+
+    def estatisticas(self):
+        stats = dict(self.stats)
+        stats["produtos"] = len(self._produtos)
+        stats["trigramas"] = len(self._trigramas)
+        stats["watermark"] = self._watermark
+        return stats
+
+_catalogo = None
+
+def get_catalogo() -> CatalogoProdutos:
+    global _catalogo
+    if _catalogo is None:
+        _catalogo = CatalogoProdutos()
+    return _catalogo
+
+if __name__ == "__main__":
+    catalogo = get_catalogo()
+    inicio = time.perf_counter()
+    catalogo.atualizar(forcar=True)
+    print(f"{len(catalogo)} produtos indexados em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    for termo in sys.argv[1:]:
+        inicio = time.perf_counter()
+        achados = catalogo.buscar(termo)
+        decorrido = (time.perf_counter() - inicio) * 1e6
+        print(f"{termo!r} ({decorrido:.0f} us): " + ", ".join(p['nome'] for p in achados))
@@ -0,0 +1,159 @@
+import os
+import threading
+import google.generativeai as genai
+
+# Orçamento (tokens estimados) do histórico enviado ao modelo a cada mensagem
+ORCAMENTO_TOKENS = int(os.environ.get("AGENT_HISTORY_TOKENS", "8000"))
+# Últimas perguntas mantidas na íntegra (com os resultados das ferramentas)
+TURNOS_RECENTES = 4
+# Resultados de ferramentas mais antigos que isso são cortados neste tamanho (caracteres)
+LIMITE_RESULTADO_ANTIGO = 400
+# Tamanho máximo (caracteres) do resumo das perguntas antigas
+LIMITE_RESUMO = 2000
+
+MARCA_CORTE = " [...]"
+PREFIXO_RESUMO = "[Resumo da conversa anterior]"
+INSTRUCAO_RESUMO = (
+    "Resuma a conversa abaixo entre o dono de um hortifruti e o assistente, em portugues, "
+    f"em no maximo {LIMITE_RESUMO // 5} palavras. Guarde numeros, produtos, periodos e decisoes que "
+    "possam ser citados depois; descarte cumprimentos e repeticoes.\n\n"
+)
+
+def estimar_tokens(texto) -> int:
+    # ~4 caracteres por token em português: barato e suficiente para o orçamento
+    return len(texto) // 4 + 1
+
+def _resultado(function_response):
+    try:
+        return str(dict(function_response.response).get("result", ""))
+    except Exception:
+        return str(function_response.response)
+
+def texto_parte(parte) -> str:
+    if parte.text:
+        return parte.text
+    if parte.function_call and parte.function_call.name:
+        args = ", ".join(f"{k}={v!r}" for k, v in dict(parte.function_call.args).items())
+        return f"[ferramenta {parte.function_call.name}({args})]"
+    if parte.function_response and parte.function_response.name:
+        return f"[resultado {parte.function_response.name}: {_resultado(parte.function_response)}]"
+    return ""
+
+def _texto(conteudo) -> str:
+    return "\n".join(filter(None, (texto_parte(p) for p in conteudo.parts)))
+
+def _inicio_de_turno(conteudo) -> bool:
+    # Pergunta do usuário: role "user" com texto (resultados de ferramenta também vêm como "user")
+    return conteudo.role == "user" and any(p.text for p in conteudo.parts)
+
+class MemoriaConversa:
+    """
+    Mantém o histórico do chat dentro de um orçamento de tokens.
+
+    Depois de cada mensagem: as últimas `turnos_recentes` perguntas ficam
+    intactas; nas anteriores, os resultados de ferramentas são cortados
+    (são a maior parte do texto e raramente são citados de novo). Se ainda
+    passar do `orcamento`, as perguntas antigas viram um resumo, gerado pelo
+    modelo a partir do resumo anterior e das perguntas removidas. O resumo
+    vai no início do histórico, como um par usuário/modelo.
+    """
+
+    def __init__(self, orcamento=ORCAMENTO_TOKENS, turnos_recentes=TURNOS_RECENTES,
+                 limite_resultado=LIMITE_RESULTADO_ANTIGO, resumidor=None):
+        self.orcamento = orcamento
+        self.turnos_recentes = turnos_recentes
+        self.limite_resultado = limite_resultado
+        self.resumidor = resumidor or self._resumir_com_modelo
+        self.resumo = ""
+        self._modelo_resumo = None
+        self._lock = threading.Lock()
+        self.stats = {"compactacoes": 0, "resultados_cortados": 0, "turnos_resumidos": 0,
+                      "falhas_resumo": 0, "tokens_historico": 0}
+
+    def tokens(self, historico) -> int:
+        return sum(estimar_tokens(_texto(c)) for c in historico)
+
+    def _turnos(self, historico):
+        """Divide o histórico (sem o resumo) em turnos, cada um começando por uma pergunta."""
+        turnos = []
+        for conteudo in historico:
+            if _inicio_de_turno(conteudo) or not turnos:
+                turnos.append([])
+            turnos[-1].append(conteudo)
+        return turnos
+
+    def _cortar_resultados(self, turno):
+        novo = []
+        for conteudo in turno:
+            partes, cortou = [], False
+            for parte in conteudo.parts:
+                fr = parte.function_response
+                resultado = _resultado(fr) if fr and fr.name else ""
+                if len(resultado) > self.limite_resultado and not resultado.endswith(MARCA_CORTE):
+                    resultado = resultado[:self.limite_resultado] + MARCA_CORTE
+                    parte = genai.protos.Part(function_response=genai.protos.FunctionResponse(
+                        name=fr.name, response={"result": resultado}))
+                    cortou = True
+                    self.stats["resultados_cortados"] += 1
+                partes.append(parte)
+            novo.append(genai.protos.Content(role=conteudo.role, parts=partes) if cortou else conteudo)
+        return novo
+
+    def _resumir_com_modelo(self, texto):
+        if self._modelo_resumo is None:
+            self._modelo_resumo = genai.GenerativeModel(model_name='gemini-flash-latest')
+        return self._modelo_resumo.generate_content(INSTRUCAO_RESUMO + texto).text
+
+    def _par_resumo(self):
+        return [
+            genai.protos.Content(role="user", parts=[genai.protos.Part(text=f"{PREFIXO_RESUMO}\n{self.resumo}")]),
+            genai.protos.Content(role="model", parts=[genai.protos.Part(text="Entendido, vou considerar esse contexto.")]),
+        ]
+
+    def compactar(self, chat):
+        """Aplica o orçamento ao `chat.history`. Retorna os tokens estimados depois."""
+        with self._lock:
+            historico = list(chat.history)
+            # O par de resumo (se houver) é refeito a partir de self.resumo
+            if historico and historico[0].role == "user" and _texto(historico[0]).startswith(PREFIXO_RESUMO):
+                historico = historico[2:]
+
+            turnos = self._turnos(historico)
+            corte = max(len(turnos) - self.turnos_recentes, 0)
+            antigos, recentes = turnos[:corte], turnos[corte:]
+            antigos = [self._cortar_resultados(t) for t in antigos]
+
+            def montar():
+                return (self._par_resumo() if self.resumo else []) + [c for t in antigos + recentes for c in t]
+
+            novo = montar()
+            total = self.tokens(novo)
+            if total > self.orcamento and antigos:
+                # Resume os turnos antigos do mais velho para o mais novo até caber
+                removidos = []
+                while antigos and total > self.orcamento:
+                    turno = antigos.pop(0)
+                    removidos.append(turno)
+                    total -= self.tokens(turno)
+                texto = "\n".join(_texto(c) for t in removidos for c in t)
+                try:
+                    anterior = f"Resumo anterior:\n{self.resumo}\n\n" if self.resumo else ""
+                    self.resumo = self.resumidor(anterior + texto).strip()[:LIMITE_RESUMO]
+                except Exception as e:
+                    # Sem resumo novo: os turnos saem mesmo assim, o resumo antigo fica
+                    self.stats["falhas_resumo"] += 1
+                    print(f"[Aviso] Falha ao resumir o histórico: {e}")
+                self.stats["turnos_resumidos"] += len(removidos)
+                self.stats["compactacoes"] += 1
+                novo = montar()
+                total = self.tokens(novo)
+
+            chat.history = novo
+            self.stats["tokens_historico"] = total
+            return total
+
+    def estatisticas(self):
+        stats = dict(self.stats)
+        stats["orcamento"] = self.orcamento
+        stats["resumo_caracteres"] = len(self.resumo)
+        return stats
@@ -1,6 +1,8 @@
 import os
 import sys
-from agent import ProfessionalAgent
+import time
+import threading
+from concurrent.futures import Future
 import colorama
 from colorama import Fore, Style, Back
 
@@ -10,7 +12,83 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
+def em_background(nome, funcao) -> Future:
+    """Roda `funcao` numa thread daemon; o resultado (ou a exceção) fica no futuro."""
+    futuro = Future()
+
+    def _rodar():
+        try:
+            futuro.set_result(funcao())
+        except BaseException as e:
+            futuro.set_exception(e)
+
+    threading.Thread(target=_rodar, name=nome, daemon=True).start()
+    return futuro
+
+def iniciar_servicos():
+    """
+    Dispara em paralelo o que é caro de subir: o agente (SDK do Gemini,
+    ferramentas, NumPy) e a conexão com o Supabase seguida do vigia de
+    estoque. Os imports pesados acontecem dentro das threads, então o
+    prompt aparece antes; a primeira pergunta espera só pelo que faltar.
+    """
+    def _agente():
+        from agent import ProfessionalAgent
+        return ProfessionalAgent()
+
+    def _vigia():
+        from supabase_client import get_supabase
+        from stock_watcher import get_vigia
+        get_supabase()
+        vigia = get_vigia()
+        vigia.iniciar()
+        return vigia
+
+    return em_background("startup-agent", _agente), em_background("startup-supabase", _vigia)
+
+def aguardar(futuro, descricao):
+    if not futuro.done():
+        print(f"{Fore.CYAN}[Aguarde] {descricao}...{Style.RESET_ALL}")
+    return futuro.result()
+
+def print_cache_stats():
+    from tool_cache import get_tool_cache
+    st = get_tool_cache().estatisticas()
+    print(f"{Fore.CYAN}[Cache] {st['acertos']} acertos, {st['faltas']} faltas "
+          f"({st['taxa_acerto']:.0%}), ~{st['economizado_ms']:.0f} ms economizados{Style.RESET_ALL}")
+    for nome, s in st['por_ferramenta'].items():
+        print(f"  {nome}: {s['acertos']} acertos, {s['faltas']} faltas, ~{s['economizado_ms']:.0f} ms")
+
+def print_timing_stats(agent):
+    from agent import comparar_metricas
+    for modo, m in comparar_metricas(agent.metricas).items():
+        primeiro = f"{m['primeiro_texto_ms']:.0f} ms" if m['primeiro_texto_ms'] is not None else "-"
+        print(f"{Fore.CYAN}[Tempos] {modo}: {m['mensagens']} mensagens, 1º texto {primeiro}, "
+              f"total {m['total_ms']:.0f} ms (médias){Style.RESET_ALL}")
+
+def print_memory_stats(agent):
+    st = agent.memoria.estatisticas()
+    print(f"{Fore.CYAN}[Memoria] histórico ~{st['tokens_historico']} de {st['orcamento']} tokens; "
+          f"{st['turnos_resumidos']} perguntas resumidas, {st['resultados_cortados']} resultados cortados{Style.RESET_ALL}")
+
+def print_stock_alerts(futuro_vigia):
+    # Eventos que o vigia de estoque registrou desde a última pergunta
+    # (nada a mostrar enquanto ele ainda está subindo)
+    if not futuro_vigia.done() or futuro_vigia.exception():
+        return
+    from stock_watcher import descrever
+    for alerta in futuro_vigia.result().pendentes():
+        cor = Fore.GREEN if alerta['tipo'] == 'normalizado' else Fore.RED
+        print(f"{cor}[Estoque] {descrever(alerta)}{Style.RESET_ALL}")
+
 def main():
+    inicio = time.perf_counter()
+    # .env antes das threads: os módulos leem configurações (AGENT_*, PDV_*) no import
+    from dotenv import load_dotenv
+    load_dotenv()
+    futuro_agente, futuro_vigia = iniciar_servicos()
+    # AGENT_STREAM=0 volta ao modo antigo (resposta inteira de uma vez), para comparar
+    streaming = os.environ.get("AGENT_STREAM", "1") != "0"
     colorama.init(autoreset=True)
     clear_screen()
 
@@ -18,15 +96,19 @@ def main():
     print(f"{Fore.CYAN}Iniciando sistema...{Style.RESET_ALL}")
 
     try:
-        agent = ProfessionalAgent()
-        print(f"{Fore.GREEN}[OK] Sistema Online!{Style.RESET_ALL}")
+        print(f"{Fore.GREEN}[OK] Pronto em {(time.perf_counter() - inicio) * 1000:.0f} ms "
+              f"(agente e Supabase terminam de subir em segundo plano){Style.RESET_ALL}")
         print("--------------------------------------------------")
         print("Digite sua pergunta sobre o mercado (Vendas, Estoque, etc).")
+        print("Digite 'cache' para ver o aproveitamento do cache de consultas.")
+        print("Digite 'tempos' para comparar os tempos de resposta (stream x bloqueante).")
+        print("Digite 'memoria' para ver o tamanho do histórico da conversa.")
         print("Digite 'sair' ou 'q' para encerrar.")
         print("--------------------------------------------------\n")
 
         while True:
             try:
+                print_stock_alerts(futuro_vigia)
                 user_input = input(f"{Fore.BLUE}[Voce]: {Style.RESET_ALL}").strip()
                 
                 if not user_input:
@@ -36,11 +118,33 @@ def main():
                     print(f"\n{Fore.RED}[Saindo] Encerrando agente. Ate logo!{Style.RESET_ALL}")
                     break
 
+                if user_input.lower() == 'cache':
+                    print_cache_stats()
+                    continue
+
+                agent = aguardar(futuro_agente, "Iniciando o agente")
+
+                if user_input.lower() == 'tempos':
+                    print_timing_stats(agent)
+                    continue
+
+                if user_input.lower() == 'memoria':
+                    print_memory_stats(agent)
+                    continue
+
                 # Processamento
-                response = agent.send_message(user_input)
-                
-                print(f"\n{Fore.MAGENTA}[Agente]:{Style.RESET_ALL}")
-                print(f"{response}")
+                if streaming:
+                    print(f"\n{Fore.MAGENTA}[Agente]:{Style.RESET_ALL}")
+                    for trecho in agent.stream_message(user_input):
+                        print(trecho, end="", flush=True)
+                    print()
+                else:
+                    response = agent.send_message(user_input)
+
+                    print(f"\n{Fore.MAGENTA}[Agente]:{Style.RESET_ALL}")
+                    print(f"{response}")
+                from agent import descrever_metrica
+                print(f"{Style.DIM}[Tempo] {descrever_metrica(agent.ultima_metrica)}{Style.RESET_ALL}")
                 print("-" * 50 + "\n")
 
             except KeyboardInterrupt:
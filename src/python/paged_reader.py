@@ -0,0 +1,124 @@
+import sys
+import csv
+from concurrent.futures import ThreadPoolExecutor
+
+# Linhas por requisição (o PostgREST do Supabase corta em 1000 por padrão)
+TAMANHO_PAGINA = 1000
+
+def ler_paginas(buscar_pagina, chave=("id",), tamanho_pagina=TAMANHO_PAGINA, prefetch=False):
+    """
+    Gera as páginas de uma consulta com paginação por chave (keyset).
+
+    `buscar_pagina(apos, limite)` devolve até `limite` linhas ordenadas por
+    `chave`, começando depois de `apos` (tupla com os valores da chave da
+    última linha, ou None na primeira página). Só uma página fica em
+    memória por vez; com `prefetch`, a próxima é buscada numa thread
+    enquanto a atual é processada.
+    """
+    def proxima(pagina):
+        if len(pagina) < tamanho_pagina:
+            return None
+        ultima = pagina[-1]
+        return tuple(ultima[c] for c in chave)
+
+    if not prefetch:
+        apos = None
+        while True:
+            pagina = buscar_pagina(apos, tamanho_pagina)
+            if pagina:
+                yield pagina
+            apos = proxima(pagina or [])
+            if apos is None:
+                return
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="paged-reader") as executor:
+        futuro = executor.submit(buscar_pagina, None, tamanho_pagina)
+        while futuro is not None:
+            pagina = futuro.result()
+            apos = proxima(pagina or [])
+            futuro = executor.submit(buscar_pagina, apos, tamanho_pagina) if apos is not None else None
+            if pagina:
+                yield pagina
+
+def ler_linhas(buscar_pagina, **kwargs):
+    """Como `ler_paginas`, mas gera linha a linha."""
+    for pagina in ler_paginas(buscar_pagina, **kwargs):
+        yield from pagina
+
+def filtro_keyset(chave, apos) -> str:
+    """
+    Condição PostgREST (conteúdo de `or=(...)`) para "depois de `apos`" na
+    ordem de `chave`. ("created_at", "id") vira
+    created_at.gt."X",and(created_at.eq."X",id.gt."Y"), que desempata
+    linhas com o mesmo created_at.
+    """
+    termos = []
+    for i, coluna in enumerate(chave):
+        iguais = [f'{c}.eq."{v}"' for c, v in zip(chave[:i], apos[:i])]
+        maior = f'{coluna}.gt."{apos[i]}"'
+        termos.append(f"and({','.join(iguais + [maior])})" if iguais else maior)
+    return ",".join(termos)
+
+def buscar_supabase(sb, tabela, select="*", chave=("id",), filtros=None):
+    """
+    `buscar_pagina` para o cliente supabase-py. `filtros(query)` aplica
+    filtros extras (ex.: `lambda q: q.eq("status", "finalizada")`).
+    """
+    def buscar(apos, limite):
+        query = sb.table(tabela).select(select)
+        if filtros:
+            query = filtros(query)
+        if apos is not None:
+            query = query.or_(filtro_keyset(chave, apos))
+        for coluna in chave:
+            query = query.order(coluna)
+        return query.limit(limite).execute().data
+    return buscar
+
+def ler_tabela(sb, tabela, select="*", chave=("id",), filtros=None,
+               tamanho_pagina=TAMANHO_PAGINA, prefetch=False):
+    """Gera as linhas de `tabela` em páginas, com memória constante."""
+    return ler_linhas(buscar_supabase(sb, tabela, select, chave, filtros),
+                      chave=chave, tamanho_pagina=tamanho_pagina, prefetch=prefetch)
+
+def exportar_csv(linhas, arquivo, colunas):
+    """Escreve as linhas em CSV conforme chegam. Retorna a quantidade."""
+    escritor = csv.DictWriter(arquivo, fieldnames=colunas, extrasaction='ignore')
+    escritor.writeheader()
+    total = 0
+    for linha in linhas:
+        escritor.writerow(linha)
+        total += 1
+    return total
+
+# Exportações prontas: (tabela, colunas)
+EXPORTACOES = {
+    "vendas": ("vendas", ["id", "numero_venda", "created_at", "status", "forma_pagamento",
+                          "subtotal", "desconto", "total", "caixa_id"]),
+    "itens_venda": ("itens_venda", ["id", "venda_id", "produto_id", "quantidade",
+                                    "preco_unitario", "subtotal", "created_at"]),
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in EXPORTACOES:
+        print("Uso: python paged_reader.py [vendas | itens_venda] [desde AAAA-MM-DD] [ate AAAA-MM-DD] > arquivo.csv",
+              file=sys.stderr)
+        sys.exit(1)
+
+    from supabase_client import get_supabase
+
+    tabela, colunas = EXPORTACOES[sys.argv[1]]
+    desde = sys.argv[2] if len(sys.argv) > 2 else None
+    ate = sys.argv[3] if len(sys.argv) > 3 else None
+
+    def filtros(query):
+        if desde:
+            query = query.gte("created_at", desde)
+        if ate:
+            query = query.lt("created_at", ate)
+        return query
+
+    linhas = ler_tabela(get_supabase(), tabela, ",".join(colunas), chave=("created_at", "id"),
+                        filtros=filtros, prefetch=True)
+    total = exportar_csv(linhas, sys.stdout, colunas)
+    print(f"{total} linhas exportadas de {tabela}.", file=sys.stderr)
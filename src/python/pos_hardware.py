@@ -2,11 +2,19 @@ import os
 import sys
 import json
 import time
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from escpos.printer import Usb
-from escpos.exceptions import USBNotFoundError
+from print_queue import PrintQueue
+from raster_cache import get_raster_cache
+from sale_journal import get_journal
+
+# SDKs pesados (supabase, escpos) só são importados por quem usa: o `detect`
+# não carrega o Supabase e a simulação não carrega o driver USB
+if TYPE_CHECKING:
+    from supabase import Client
 
 # Carregar variáveis de ambiente
 # O .env está na raiz do projeto (../../.env em relação a este script)
@@ -24,6 +32,20 @@ if not SUPABASE_KEY:
 
 SUPABASE_USER_TOKEN = os.getenv("SUPABASE_USER_TOKEN") # Opcional
 
+# Tempo máximo (s) de uma chamada ao Supabase antes de a venda ficar no journal offline
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "8"))
+# O checkout espera o Supabase no máximo CHECKOUT_TIMEOUT s; depois de uma falha
+# de rede ou demora, pula o envio por CHECKOUT_PAUSA_OFFLINE s (só o replay tenta)
+CHECKOUT_TIMEOUT = float(os.getenv("PDV_CHECKOUT_TIMEOUT", "2"))
+CHECKOUT_PAUSA_OFFLINE = float(os.getenv("PDV_CHECKOUT_PAUSA_OFFLINE", "30"))
+
+# Intervalo (s) da verificação de hot-plug da impressora USB; 0 desliga
+MONITOR_IMPRESSORA_INTERVALO = float(os.getenv("PDV_MONITOR_IMPRESSORA", "15"))
+
+# Logo do cupom (PNG/JPG) e largura do papel (58 ou 80 mm); a imagem convertida fica em cache
+LOGO_PATH = os.getenv("PDV_LOGO_PATH")
+LARGURA_PAPEL_MM = int(os.getenv("PDV_LARGURA_PAPEL", "80"))
+
 # Lista de VIDs e PIDs comuns de impressoras térmicas (Exemplos: Epson, Bematech, Genéricos)
 # Formato: (idVendor, idProduct)
 KNOWN_PRINTERS = [
@@ -34,11 +56,32 @@ KNOWN_PRINTERS = [
     # Adicione mais pares conforme necessário
 ]
 
-def setup_supabase() -> Client:
+# Cliente reaproveitado entre vendas (evita refazer o handshake a cada checkout)
+_supabase_client = None
+
+def setup_supabase() -> "Client":
+    global _supabase_client
+    if _supabase_client is not None:
+        return _supabase_client
     if not SUPABASE_URL or not SUPABASE_KEY:
         print("Erro: Credenciais do Supabase não encontradas no .env")
         sys.exit(1)
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    from supabase import create_client
+    from supabase.lib.client_options import ClientOptions
+    _supabase_client = create_client(
+        SUPABASE_URL, SUPABASE_KEY,
+        options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT),
+    )
+    return _supabase_client
+
+@contextmanager
+def medir_etapa(tempos, etapa):
+    """Acumula em `tempos[etapa]` a duração (ms) do bloco."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tempos[etapa] = tempos.get(etapa, 0.0) + (time.perf_counter() - inicio) * 1000
 
 class DummyPrinter:
     """Impressora simulada para testes sem hardware."""
@@ -51,78 +94,259 @@ class DummyPrinter:
     def cut(self):
         print("[SIMULAÇÃO IMPRESSORA]: --- CORTE DE PAPEL ---")
 
-def detectar_impressora_usb(simular=False):
+    def _raw(self, dados):
+        print(f"[SIMULAÇÃO IMPRESSORA]: [imagem {len(dados)} bytes]")
+
+# Última impressora que funcionou, persistida para a próxima inicialização
+PRINTER_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.impressora_usb.json')
+
+class PrinterManager:
     """
-    Tenta detectar automaticamente uma impressora USB conectada
-    baseada em uma lista de VIDs/PIDS conhecidos.
+    Mantém o handle da impressora USB aberto entre vendas.
+
+    A varredura de `KNOWN_PRINTERS` só acontece na primeira necessidade,
+    quando uma escrita falha ou na verificação de hot-plug em background;
+    o último VID/PID que funcionou é testado primeiro.
     """
-    if simular:
-        print("Modo de simulação ativado. Usando impressora virtual.")
-        return DummyPrinter()
 
-    print("Iniciando detecção de impressora USB...")
-    
-    # Tenta conectar em impressoras conhecidas
-    for vid, pid in KNOWN_PRINTERS:
+    def __init__(self, simular=False, cache_path=PRINTER_CACHE_PATH):
+        self.simular = simular
+        self.cache_path = cache_path
+        self._printer = None
+        self._ultimo = self._carregar_cache()
+        self._lock = threading.RLock()
+        self._parar = threading.Event()
+        self._monitor = None
+        self.stats = {
+            "descobertas": 0,
+            "tempo_descoberta_ms": 0.0,
+            "ultima_descoberta_ms": 0.0,
+            "reconexoes": 0,
+            "falhas_escrita": 0,
+            "reutilizacoes": 0,
+        }
+
+    def _carregar_cache(self):
         try:
-            printer = Usb(vid, pid, timeout=5000) # Timeout curto para verificar
-            print(f"Impressora detectada: VID={hex(vid)}, PID={hex(pid)}")
-            return printer
-        except USBNotFoundError:
-            continue
-        except Exception as e:
-            print(f"Erro ao tentar conectar VID={hex(vid)} PID={hex(pid)}: {e}")
-            continue
-            
-    print("Nenhuma impressora conhecida detectada.")
-    return None
+            with open(self.cache_path) as f:
+                dados = json.load(f)
+            return (dados['vid'], dados['pid'])
+        except Exception:
+            return None
 
-# ... (rest of the file until finalize_venda)
+    def _salvar_cache(self, vid, pid):
+        try:
+            with open(self.cache_path, 'w') as f:
+                json.dump({"vid": vid, "pid": pid}, f)
+        except OSError as e:
+            print(f"Aviso: não foi possível salvar cache da impressora: {e}")
 
-if __name__ == "__main__":
-    # Argumentos
-    simular = '--simulate' in sys.argv
-    detectar_apenas = 'detect' in sys.argv
-    
-    # Se chamado com argumento 'detect', apenas detecta
-    if detectar_apenas:
-        imp = detectar_impressora_usb(simular=simular)
-        if imp:
-            print("Impressora encontrada e pronta.")
-            sys.exit(0)
-        else:
-            sys.exit(1)
-            
-    # Exemplo de uso para teste
-    exemplo_venda = {
-        "total": 50.00,
-        "metodo_pagamento": "pix",
-        "itens": [
-            {"id": 1, "nome": "Banana Prata", "quantidade": 1.5, "unidade": "KG", "preco_unitario": 10.00},
-            {"id": 2, "nome": "Maca Fuji", "quantidade": 2, "unidade": "KG", "preco_unitario": 15.00},
-            {"id": 3, "nome": "Sacola", "quantidade": 1, "unidade": "UN", "preco_unitario": 5.00},
-        ]
-    }
-    
-    # Se não for apenas detecção e tiver argumento de teste, roda venda simulada
-    if '--test-sale' in sys.argv:
-        print("Rodando teste de venda...")
-        res = finalizar_venda(exemplo_venda, simular=simular)
-        print(f"Resultado: {res}")
-    else:
-        print("Uso: python pos_hardware.py [detect] [--simulate] [--test-sale]")
+    def _candidatos(self):
+        if self._ultimo in KNOWN_PRINTERS:
+            return [self._ultimo] + [p for p in KNOWN_PRINTERS if p != self._ultimo]
+        if self._ultimo:
+            return [self._ultimo] + KNOWN_PRINTERS
+        return list(KNOWN_PRINTERS)
+
+    def _descobrir(self):
+        if self.simular:
+            print("Modo de simulação ativado. Usando impressora virtual.")
+            return DummyPrinter()
+
+        from escpos.printer import Usb
+        from escpos.exceptions import USBNotFoundError
+
+        print("Iniciando detecção de impressora USB...")
+        inicio = time.perf_counter()
+        try:
+            for vid, pid in self._candidatos():
+                try:
+                    printer = Usb(vid, pid, timeout=5000)
+                    print(f"Impressora detectada: VID={hex(vid)}, PID={hex(pid)}")
+                    if (vid, pid) != self._ultimo:
+                        self._ultimo = (vid, pid)
+                        self._salvar_cache(vid, pid)
+                    return printer
+                except USBNotFoundError:
+                    continue
+                except Exception as e:
+                    print(f"Erro ao tentar conectar VID={hex(vid)} PID={hex(pid)}: {e}")
+                    continue
+
+            print("Nenhuma impressora conhecida detectada.")
+            return None
+        finally:
+            decorrido = (time.perf_counter() - inicio) * 1000
+            self.stats["descobertas"] += 1
+            self.stats["tempo_descoberta_ms"] += decorrido
+            self.stats["ultima_descoberta_ms"] = decorrido
+
+    def _descartar(self):
+        if self._printer is not None:
+            try:
+                close = getattr(self._printer, 'close', None)
+                if close:
+                    close()
+            except Exception:
+                pass
+        self._printer = None
+
+    def obter(self):
+        """Retorna o handle aberto, descobrindo a impressora apenas se necessário."""
+        with self._lock:
+            if self._printer is not None:
+                self.stats["reutilizacoes"] += 1
+                return self._printer
+            if self.stats["descobertas"]:
+                # O handle anterior foi descartado (falha de escrita ou impressora ausente)
+                self.stats["reconexoes"] += 1
+            self._printer = self._descobrir()
+            return self._printer
+
+    def reconectar(self):
+        with self._lock:
+            self._descartar()
+            self.stats["reconexoes"] += 1
+            self._printer = self._descobrir()
+            return self._printer
+
+    def imprimir(self, funcao):
+        """
+        Executa `funcao(printer)` com o handle atual. Retorna True se imprimiu.
+        Uma falha de escrita descarta o handle e retorna False na hora, sem
+        tentar de novo: quem repete é a `PrintQueue` (com espera entre as
+        tentativas), e a próxima chamada refaz a descoberta.
+        """
+        with self._lock:
+            printer = self.obter()
+            if printer is None:
+                return False
+            try:
+                funcao(printer)
+                return True
+            except Exception as e:
+                self.stats["falhas_escrita"] += 1
+                print(f"Falha na escrita ({e}). A impressora será redetectada na próxima tentativa.")
+                self._descartar()
+                return False
+
+    def verificar(self):
+        """Checagem de hot-plug: reconecta se a impressora sumiu ou acabou de ser plugada."""
+        if self.simular:
+            return True
+        with self._lock:
+            if self._printer is None:
+                self._printer = self._descobrir()
+                return self._printer is not None
+            is_online = getattr(self._printer, 'is_online', None)
+            if is_online is None:
+                return True
+            try:
+                online = is_online()
+            except Exception:
+                online = False
+            if not online:
+                print("Impressora não responde. Refazendo detecção...")
+                return self.reconectar() is not None
+            return True
+
+    def iniciar_monitor(self, intervalo=15):
+        """Inicia a verificação de hot-plug em uma thread de background."""
+        if self._monitor and self._monitor.is_alive():
+            return
+        self._parar.clear()
+
+        def _loop():
+            while not self._parar.wait(intervalo):
+                try:
+                    self.verificar()
+                except Exception as e:
+                    print(f"Erro no monitor da impressora: {e}")
+
+        self._monitor = threading.Thread(target=_loop, name="printer-hotplug", daemon=True)
+        self._monitor.start()
+
+    def parar_monitor(self):
+        self._parar.set()
+
+    def fechar(self):
+        self.parar_monitor()
+        with self._lock:
+            self._descartar()
+
+    def estatisticas(self):
+        stats = dict(self.stats)
+        stats["conectada"] = self._printer is not None
+        stats["vid_pid"] = (
+            f"{hex(self._ultimo[0])}:{hex(self._ultimo[1])}" if self._ultimo else None
+        )
+        return stats
+
+_printer_managers = {}
+
+def get_printer_manager(simular=False) -> PrinterManager:
+    """Gerenciador compartilhado (um para hardware real, outro para simulação)."""
+    if simular not in _printer_managers:
+        _printer_managers[simular] = PrinterManager(simular=simular)
+    return _printer_managers[simular]
+
+def detectar_impressora_usb(simular=False):
+    """
+    Retorna uma impressora USB conectada, detectada automaticamente
+    a partir de uma lista de VIDs/PIDS conhecidos. O handle é mantido
+    aberto pelo `PrinterManager` e reutilizado nas chamadas seguintes.
+    """
+    return get_printer_manager(simular).obter()
+
+_logo_cupom = None
+
+def logo_cupom():
+    """
+    Logo do cupom em ESC/POS, resolvido uma vez por processo: o arquivo é
+    lido e os bytes passam pelo `RasterCache` só no primeiro cupom.
+    Sem `PDV_LOGO_PATH` ou se a leitura falhar, retorna b"".
+    """
+    global _logo_cupom
+    if _logo_cupom is None:
+        _logo_cupom = b""
+        if LOGO_PATH:
+            try:
+                with open(LOGO_PATH, 'rb') as f:
+                    conteudo = f.read()
+                _logo_cupom = get_raster_cache().imagem(conteudo, LARGURA_PAPEL_MM)
+            except Exception as e:
+                print(f"Aviso: logo do cupom indisponível ({LOGO_PATH}): {e}")
+    return _logo_cupom
+
+def imagens_cupom(dados_venda):
+    """
+    Logo e QR Code PIX do cupom já em ESC/POS, vindos do `RasterCache`
+    (convertidos só na primeira vez). Falhas viram aviso: o cupom sai sem a imagem.
+    """
+    logo, qr = logo_cupom(), None
+    try:
+        if dados_venda.get('pix_copia_e_cola'):
+            qr = get_raster_cache().qrcode(dados_venda['pix_copia_e_cola'], LARGURA_PAPEL_MM)
+    except Exception as e:
+        print(f"Aviso: imagem do cupom indisponível: {e}")
+    return logo, qr
 
 def gerar_cupom_nao_fiscal(printer, dados_venda):
     """
     Gera e imprime o cupom não fiscal.
+    Erros de escrita são propagados para que o `PrinterManager` possa reconectar.
     """
     if not printer:
         print("Erro: Impressora não inicializada para impressão.")
         return
 
+    logo, qr = imagens_cupom(dados_venda)
+
     try:
         # Cabeçalho
         printer.set(align='center', font='a', width=1, height=1)
+        if logo:
+            printer._raw(logo)
         printer.text("Hortifruti Bom Preço\n")
         printer.text("Salto de Pirapora, SP\n")
         printer.text("--------------------------------\n")
@@ -150,6 +374,12 @@ def gerar_cupom_nao_fiscal(printer, dados_venda):
         # Totais
         printer.set(align='right', width=2, height=1)
         printer.text(f"TOTAL: R$ {total_geral:.2f}\n")
+
+        if qr:
+            printer.set(align='center', width=1, height=1)
+            printer.text("Pague com PIX:\n")
+            printer._raw(qr)
+            printer.text("\n")
         
         # Rodapé
         printer.set(align='center', width=1, height=1, font='b')
@@ -163,94 +393,205 @@ def gerar_cupom_nao_fiscal(printer, dados_venda):
         
     except Exception as e:
         print(f"Erro durante a impressão: {e}")
+        raise
+
+def montar_payload_venda(dados_venda):
+    """
+    Converte os dados da venda (formato do frontend/PDV) nos parâmetros
+    da RPC `processar_venda_completa(p_venda, p_itens, p_pagamentos)`.
+    """
+    itens = dados_venda.get('itens', [])
+
+    p_itens = []
+    subtotal_venda = 0
+    for seq, item in enumerate(itens, 1):
+        qtd = item.get('quantidade', 0)
+        preco = item.get('preco_unitario', 0)
+        desconto_item = item.get('desconto_item', 0)
+        subtotal = item.get('subtotal', qtd * preco - desconto_item)
+        subtotal_venda += subtotal
+        p_itens.append({
+            "produto_id": item.get('produto_id', item.get('id')),
+            "quantidade": qtd,
+            "preco_unitario": preco,
+            "subtotal": round(subtotal, 2),
+            "desconto_item": desconto_item,
+            "sequencia": item.get('sequencia', seq),
+            "peso_liquido": item.get('peso'),
+        })
+
+    # 'metodo_pagamento' é o nome legado usado pelos scripts de teste
+    forma = dados_venda.get('forma_pagamento') or dados_venda.get('metodo_pagamento', 'dinheiro')
+    p_venda = {
+        "total": dados_venda.get('total'),
+        "subtotal": round(dados_venda.get('subtotal', subtotal_venda), 2),
+        "desconto": dados_venda.get('desconto', 0),
+        "forma_pagamento": forma,
+        "caixa_id": dados_venda.get('caixa_id'),
+        "observacoes": dados_venda.get('observacoes'),
+    }
+
+    return {
+        "p_venda": p_venda,
+        "p_itens": p_itens,
+        "p_pagamentos": dados_venda.get('pagamentos', []),
+    }
+
+def marcar_cupom_impresso(chave, sucesso):
+    """
+    Callback da fila de impressão: grava `cupom_impresso` quando o cupom sai.
+    Se a venda ainda não foi sincronizada, o flag vai junto no replay do journal.
+    """
+    if not sucesso:
+        print(f"Cupom da venda {chave} não foi impresso após as tentativas.")
+        return
+    venda_id = get_journal().marcar_cupom_impresso(chave)
+    if venda_id is None:
+        return
+    setup_supabase().rpc('marcar_venda_impressa', {'p_venda_id': venda_id}).execute()
+
+_print_queues = {}
+
+def get_print_queue(simular=False) -> PrintQueue:
+    """
+    Fila de impressão compartilhada, ligada ao `PrinterManager` correspondente.
+    Com impressora real, liga também a verificação de hot-plug do manager.
+    """
+    if simular not in _print_queues:
+        manager = get_printer_manager(simular)
+        if not simular and MONITOR_IMPRESSORA_INTERVALO > 0:
+            manager.iniciar_monitor(MONITOR_IMPRESSORA_INTERVALO)
+        _print_queues[simular] = PrintQueue(
+            imprimir=lambda dados: manager.imprimir(lambda p: gerar_cupom_nao_fiscal(p, dados)),
+            on_complete=marcar_cupom_impresso,
+        )
+    return _print_queues[simular]
+
+_checkout_offline_ate = 0.0
+
+def enviar_no_checkout(journal, supabase, chave):
+    """
+    Tenta enviar a venda recém-gravada sem segurar o caixa: não espera o
+    replay em andamento (a venda vai no lote dele) e desiste depois de
+    `CHECKOUT_TIMEOUT`, deixando o envio terminar em background. Depois de
+    um erro de rede ou de uma demora, as próximas vendas nem tentam durante
+    `CHECKOUT_PAUSA_OFFLINE` s e vão direto para o journal.
+    Retorna o resumo do envio, ou None se a venda ficou para o replay.
+    """
+    global _checkout_offline_ate
+    if time.monotonic() < _checkout_offline_ate:
+        return None
+
+    resultado = {}
+    envio = threading.Thread(
+        target=lambda: resultado.update(resumo=journal.sincronizar(supabase, chaves=[chave], bloquear=False)),
+        name="checkout-sync", daemon=True,
+    )
+    envio.start()
+    envio.join(CHECKOUT_TIMEOUT)
+    resumo = resultado.get('resumo')
+    if envio.is_alive() or (resumo and resumo['erro']):
+        _checkout_offline_ate = time.monotonic() + CHECKOUT_PAUSA_OFFLINE
+    return resumo
 
 def finalizar_venda(dados_venda, simular=False):
     """
     Orquestra o fluxo de finalizar a venda:
-    1. Gravar no Supabase
-    2. Atualizar Estoque
-    3. Imprimir
+    1. Gravar a venda no journal local (SQLite)
+    2. Enviar ao Supabase (RPC transacional: venda, itens e baixa de estoque)
+    3. Enfileirar o cupom na fila de impressão (impresso em background)
+
+    Se o Supabase estiver lento ou fora do ar, a venda fica pendente no journal
+    e é reenviada em lote pelo replay automático, sem duplicar (chave de
+    idempotência). O checkout espera o envio no máximo `CHECKOUT_TIMEOUT` s
+    (ver `enviar_no_checkout`). A impressora também não bloqueia nem rejeita
+    o checkout.
+
+    O retorno inclui `tempos_ms` com a latência de cada etapa, para acompanhar
+    se o checkout se mantém estável conforme a cesta cresce.
     """
-    supabase = setup_supabase()
-    
+    tempos = {}
+    inicio_total = time.perf_counter()
+
+    with medir_etapa(tempos, 'conexao'):
+        supabase = setup_supabase()
+        journal = get_journal()
+        journal.iniciar_replay_automatico(setup_supabase)
+
     print(f"Iniciando finalização de venda... (Simulação: {simular})")
-    
-    # 1. Tentar detectar impressora
-    printer = detectar_impressora_usb(simular=simular)
-    if not printer:
-        msg = "Impressora não detectada. Verifique o cabo USB e clique em Reconhecer."
-        print(msg)
-        return {"sucesso": False, "mensagem": msg}
 
     try:
-        # Iniciando transação ou inserções
-        # Supabase não tem transações multi-tabela via API simples, faremos sequencial
-        # Idealmente usaríamos uma RPC (Stored Procedure) no banco para garantir atomicidade.
-        # Aqui, faremos via código conforme solicitado.
-        
-        # 2. Gravar Venda
-        venda_payload = {
-            "data_venda": datetime.now().isoformat(),
-            "total": dados_venda.get('total'),
-            "metodo_pagamento": dados_venda.get('metodo_pagamento', 'dinheiro'),
-            # Adicione outros campos necessários pela sua tabela 'vendas'
-        }
-        
-        res_venda = supabase.table('vendas').insert(venda_payload).execute()
-        
-        if not res_venda.data:
-            raise Exception("Falha ao gravar venda no Supabase.")
-        
-        venda_id = res_venda.data[0].get('id')
-        print(f"Venda gravada com ID: {venda_id}")
+        with medir_etapa(tempos, 'payload'):
+            params = montar_payload_venda(dados_venda)
 
-        # 3. Gravar Itens e Atualizar Estoque
-        itens_venda = []
-        for item in dados_venda.get('itens', []):
-            # Inserir item da venda
-            itens_venda.append({
-                "venda_id": venda_id,
-                "produto_id": item.get('id'),
-                "quantidade": item.get('quantidade'),
-                "preco_unitario": item.get('preco_unitario')
-            })
-            
-            # Decrementar Estoque
-            # Nota: Isso é um ponto crítico. Se falhar, o estoque fica errado.
-            # Recomendado: Usar uma RPC 'decrementar_estoque' no Supabase.
-            # Vou fazer a chamada direta aqui mas deixo o aviso.
-            
-            # Buscando estoque atual (opcional, ou usar RPC) e decrementando
-            # Para simplificar e seguir requisito: "Decremento de estoque na tabela produtos"
-            # Vamos assumir uma RPC call seria o ideal, mas vamos tentar update direto se tiverpermissão
-            # res_estoque = supabase.rpc('decrementar_estoque', {'p_id': item['id'], 'qtd': item['quantidade']}).execute()
-            
-            # Abordagem via UPDATE direto (menos seguro p/ concorrência)
-            # Primeiro lê o atual (para evitar valores negativos cegos)
-            prod_atual = supabase.table('produtos').select('estoque').eq('id', item.get('id')).single().execute()
-            if prod_atual.data:
-                novo_estoque = prod_atual.data['estoque'] - item.get('quantidade')
-                supabase.table('produtos').update({'estoque': novo_estoque}).eq('id', item.get('id')).execute()
-
-        # Gravar itens na tabela de junção (se existir tabela itens_venda)
-        if itens_venda:
-             supabase.table('itens_venda').insert(itens_venda).execute()
-        
-        print("Venda e estoque atualizados no Supabase.")
-        
-        # 4. Imprimir Cupom
-        gerar_cupom_nao_fiscal(printer, dados_venda)
-        
-        return {"sucesso": True, "mensagem": "Venda realizada e impressa com sucesso!"}
+        # 1. Venda durável localmente antes de qualquer chamada de rede
+        with medir_etapa(tempos, 'journal'):
+            chave = journal.registrar(params)
+
+        # 2. Venda + itens + estoque numa única chamada. A RPC roda numa transação:
+        # se qualquer item falhar nada é gravado, e o decremento de estoque é feito
+        # no banco (sem o read-modify-write que perdia baixas entre caixas).
+        with medir_etapa(tempos, 'rpc_venda'):
+            resumo = enviar_no_checkout(journal, supabase, chave)
+
+        registro = journal.consultar(chave)
+        if registro['status'] == 'failed':
+            # O caixa vai ser avisado e passar a venda de novo: esta não pode voltar ao replay
+            journal.abandonar(chave)
+            raise Exception(registro['last_error'] or "Falha ao gravar venda no Supabase.")
+
+        venda_id = registro['venda_id']
+        offline = registro['status'] != 'synced'
+        if offline:
+            motivo = resumo['erro'] if resumo and resumo['erro'] else "sem resposta a tempo"
+            print(f"Supabase indisponível ({motivo}). Venda guardada no journal local.")
+        else:
+            print(f"Venda gravada com ID: {venda_id} ({len(params['p_itens'])} itens)")
 
     except Exception as e:
         print(f"Erro crítico ao finalizar venda: {e}")
-        # Aqui seria ideal implementar rollback manual se algo falhou no meio do caminho
-        return {"sucesso": False, "mensagem": f"Erro: {str(e)}"}
+        tempos['total'] = (time.perf_counter() - inicio_total) * 1000
+        return {"sucesso": False, "mensagem": f"Erro: {str(e)}", "tempos_ms": tempos}
+
+    # 3. Cupom vai para a fila; a venda já está confirmada
+    with medir_etapa(tempos, 'enfileirar_impressao'):
+        enfileirado = get_print_queue(simular).enviar(chave, dados_venda)
+
+    tempos['total'] = (time.perf_counter() - inicio_total) * 1000
+    print("Tempos (ms): " + ", ".join(f"{k}={v:.1f}" for k, v in tempos.items()))
+
+    mensagem = "Venda realizada! Cupom enviado para impressão."
+    if offline:
+        mensagem = "Venda registrada offline. Será enviada ao sistema quando a conexão voltar."
+    if not enfileirado:
+        mensagem += " Fila de impressão cheia: verifique a impressora."
+
+    return {
+        "sucesso": True,
+        "mensagem": mensagem,
+        "venda_id": venda_id,
+        "chave_idempotencia": chave,
+        "offline": offline,
+        "cupom_enfileirado": enfileirado,
+        "tempos_ms": tempos,
+    }
 
 if __name__ == "__main__":
+    # Argumentos
+    simular = '--simulate' in sys.argv
+    detectar_apenas = 'detect' in sys.argv
+    
+    # Se chamado com argumento 'detect', apenas detecta
+    if detectar_apenas:
+        imp = detectar_impressora_usb(simular=simular)
+        print(f"Estatísticas: {get_printer_manager(simular).estatisticas()}")
+        if imp:
+            print("Impressora encontrada e pronta.")
+            sys.exit(0)
+        else:
+            sys.exit(1)
+            
     # Exemplo de uso para teste
-    # Simula dados vindos do frontend
     exemplo_venda = {
         "total": 50.00,
         "metodo_pagamento": "pix",
@@ -261,15 +602,14 @@ if __name__ == "__main__":
         ]
     }
     
-    # Se chamado com argumento 'detect', apenas detecta
-    if len(sys.argv) > 1 and sys.argv[1] == 'detect':
-        imp = detectar_impressora_usb()
-        if imp:
-            print("Impressora encontrada e pronta.")
-            sys.exit(0)
-        else:
-            sys.exit(1)
-            
-    # Executa fluxo completo de teste
-    # finalizar_venda(exemplo_venda)
-    print("Script pronto para uso. Chame as funções conforme necessário.")
+    # Se não for apenas detecção e tiver argumento de teste, roda venda simulada
+    if '--test-sale' in sys.argv:
+        print("Rodando teste de venda...")
+        res = finalizar_venda(exemplo_venda, simular=simular)
+        print(f"Resultado: {res}")
+        # Espera o cupom sair antes de encerrar o processo
+        fila = get_print_queue(simular)
+        fila.aguardar(timeout=30)
+        print(f"Fila de impressão: {fila.estatisticas()}")
+    else:
+        print("Uso: python pos_hardware.py [detect] [--simulate] [--test-sale]")
@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+
+class PrintQueue:
+    """
+    Fila de impressão em memória atendida por uma thread dedicada.
+
+    A venda é gravada primeiro e o cupom entra na fila; o caixa não espera
+    pela impressora. A fila é limitada (`maxsize`): quando cheia, `enviar`
+    espera no máximo `timeout` segundos e devolve False, em vez de acumular
+    cupons indefinidamente com a impressora travada.
+    """
+
+    def __init__(self, imprimir, maxsize=50, tentativas=3, espera_inicial=0.5, on_complete=None):
+        """
+        Args:
+            imprimir: função `imprimir(dados)` que retorna True se o cupom saiu.
+            maxsize: quantidade máxima de cupons aguardando impressão.
+            tentativas: quantas vezes tentar cada cupom antes de desistir. É a
+                única camada de retentativa: `imprimir` deve falhar rápido.
+            espera_inicial: espera (s) antes da 2ª tentativa; dobra a cada falha.
+            on_complete: callback `on_complete(venda_id, sucesso)` chamado ao fim de cada job.
+        """
+        self._imprimir = imprimir
+        self._fila = queue.Queue(maxsize=maxsize)
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+        self.on_complete = on_complete
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {
+            "enfileirados": 0,
+            "impressos": 0,
+            "falhas": 0,
+            "rejeitados": 0,
+            "retentativas": 0,
+            "tempo_impressao_ms": 0.0,
+        }
+        self._worker = threading.Thread(target=self._loop, name="print-queue", daemon=True)
+        self._worker.start()
+
+    def enviar(self, venda_id, dados, timeout=0.05) -> bool:
+        """Enfileira um cupom. Retorna False se a fila continuar cheia após `timeout`."""
+        try:
+            self._fila.put((venda_id, dados), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self.stats["rejeitados"] += 1
+            return False
+        with self._lock:
+            self.stats["enfileirados"] += 1
+        return True
+
+    def _executar(self, dados) -> bool:
+        espera = self.espera_inicial
+        for tentativa in range(self.tentativas):
+            if tentativa:
+                with self._lock:
+                    self.stats["retentativas"] += 1
+                if self._parar.wait(espera):
+                    return False
+                espera *= 2
+            try:
+                if self._imprimir(dados):
+                    return True
+            except Exception as e:
+                print(f"[Fila de impressão] Erro ao imprimir: {e}")
+        return False
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                venda_id, dados = self._fila.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                sucesso = self._executar(dados)
+                with self._lock:
+                    self.stats["impressos" if sucesso else "falhas"] += 1
+                    self.stats["tempo_impressao_ms"] += (time.perf_counter() - inicio) * 1000
+                if self.on_complete:
+                    try:
+                        self.on_complete(venda_id, sucesso)
+                    except Exception as e:
+                        print(f"[Fila de impressão] Erro no callback da venda {venda_id}: {e}")
+            finally:
+                self._fila.task_done()
+
+    def aguardar(self, timeout=None) -> bool:
+        """Espera a fila esvaziar. Retorna False se `timeout` (s) expirar antes."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self._fila.unfinished_tasks:
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def parar(self):
+        self._parar.set()
+        self._worker.join(timeout=2)
+
+    def pendentes(self) -> int:
+        return self._fila.qsize()
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["pendentes"] = self.pendentes()
+        return stats
@@ -0,0 +1,238 @@
+import os
+import sys
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Cache de imagens (logo, QR Code) já convertidas para ESC/POS, persistido entre reinícios
+RASTER_CACHE_DIR = os.getenv(
+    "PDV_RASTER_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.raster_cache'),
+)
+
+# Limite do cache em memória (LRU): número de imagens e total de bytes
+RASTER_CACHE_MAX_ITENS = int(os.getenv("PDV_RASTER_CACHE_MAX_ITENS", "32"))
+RASTER_CACHE_MAX_BYTES = int(os.getenv("PDV_RASTER_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Largura útil da cabeça de impressão, em pontos (203 dpi)
+LARGURA_PONTOS = {58: 384, 80: 576}
+
+# Faixas de no máximo N linhas por comando GS v 0 (algumas impressoras limitam a altura)
+LINHAS_POR_FAIXA = 255
+
+_INVERTER = bytes(255 - b for b in range(256))
+
+def _raster(largura_bytes, linhas, dados) -> bytes:
+    """Monta comandos GS v 0 (bit 1 = ponto preto) a partir das linhas empacotadas."""
+    saida = bytearray()
+    for inicio in range(0, linhas, LINHAS_POR_FAIXA):
+        n = min(LINHAS_POR_FAIXA, linhas - inicio)
+        saida += b'\x1dv0\x00' + bytes((largura_bytes & 0xFF, largura_bytes >> 8, n & 0xFF, n >> 8))
+        saida += dados[inicio * largura_bytes:(inicio + n) * largura_bytes]
+    return bytes(saida)
+
+def _qr_nativo(dados: str, modulo: int) -> bytes:
+    """QR Code desenhado pela própria impressora (GS ( k), usado quando `qrcode` não está instalado."""
+    payload = dados.encode('utf-8')
+    tamanho = len(payload) + 3
+    return (b'\x1d(k\x04\x001A2\x00'                        # modelo 2
+            + b'\x1d(k\x03\x001C' + bytes((min(modulo, 16),))  # tamanho do módulo
+            + b'\x1d(k\x03\x001E1'                          # correção de erro M
+            + b'\x1d(k' + bytes((tamanho & 0xFF, tamanho >> 8)) + b'1P0' + payload
+            + b'\x1d(k\x03\x001Q0')                         # imprime
+
+class RasterCache:
+    """
+    Cache de imagens ESC/POS pré-codificadas (comandos GS v 0).
+
+    Só imagens fixas (logo) entram no cache. A chave é o hash do conteúdo
+    mais a largura da impressora (58 ou 80 mm). A conversão acontece uma
+    única vez: depois o resultado fica em memória e em `RASTER_CACHE_DIR`,
+    então incluir o logo num cupom é só anexar um `bytes` já pronto, mesmo
+    após reiniciar. A memória é um LRU limitado por `max_itens` e `max_bytes`.
+
+    O QR Code PIX muda a cada venda, então é convertido na hora e não é
+    guardado nem em memória nem em disco.
+
+    Imagens precisam do Pillow; QR Codes usam o pacote `qrcode` se existir
+    ou, sem ele, o comando nativo da impressora. Ambos já vêm com o
+    python-escpos.
+    """
+
+    def __init__(self, diretorio=RASTER_CACHE_DIR, max_itens=RASTER_CACHE_MAX_ITENS,
+                 max_bytes=RASTER_CACHE_MAX_BYTES):
+        self.diretorio = diretorio
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self._memoria = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "acertos_memoria": 0,
+            "acertos_disco": 0,
+            "conversoes": 0,
+            "tempo_conversao_ms": 0.0,
+            "descartes": 0,
+        }
+
+    @staticmethod
+    def _chave(tipo, conteudo: bytes, largura_mm, *extra) -> str:
+        h = hashlib.sha256(conteudo)
+        h.update(f"|{tipo}|{largura_mm}|{'|'.join(map(str, extra))}".encode())
+        return f"{tipo}-{largura_mm}mm-{h.hexdigest()[:32]}"
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave + '.bin')
+
+    def _converter(self, gerar) -> bytes:
+        inicio = time.perf_counter()
+        dados = gerar()
+        self.stats["conversoes"] += 1
+        self.stats["tempo_conversao_ms"] += (time.perf_counter() - inicio) * 1000
+        return dados
+
+    def _obter(self, chave, gerar) -> bytes:
+        with self._lock:
+            dados = self._memoria.get(chave)
+            if dados is not None:
+                self._memoria.move_to_end(chave)
+                self.stats["acertos_memoria"] += 1
+                return dados
+            try:
+                with open(self._caminho(chave), 'rb') as f:
+                    dados = f.read()
+                self.stats["acertos_disco"] += 1
+            except OSError:
+                dados = self._converter(gerar)
+                self._salvar(chave, dados)
+            self._guardar(chave, dados)
+            return dados
+
+    def _guardar(self, chave, dados):
+        """Põe no LRU em memória, descartando as menos usadas acima dos limites."""
+        self._memoria[chave] = dados
+        self._bytes += len(dados)
+        while len(self._memoria) > 1 and (len(self._memoria) > self.max_itens
+                                          or self._bytes > self.max_bytes):
+            _, antigo = self._memoria.popitem(last=False)
+            self._bytes -= len(antigo)
+            self.stats["descartes"] += 1
+
+    def _salvar(self, chave, dados):
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            with open(temporario, 'wb') as f:
+                f.write(dados)
+            os.replace(temporario, caminho)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar o cache de imagem {chave}: {e}")
+
+    def imagem(self, origem, largura_mm=80, largura_max=None) -> bytes:
+        """
+        Retorna a imagem (caminho ou bytes) em ESC/POS, reduzida para caber
+        na largura da impressora (ou em `largura_max` pontos).
+        """
+        if isinstance(origem, (bytes, bytearray)):
+            conteudo = bytes(origem)
+        else:
+            with open(origem, 'rb') as f:
+                conteudo = f.read()
+        largura = min(largura_max or LARGURA_PONTOS[largura_mm], LARGURA_PONTOS[largura_mm])
+        chave = self._chave('img', conteudo, largura_mm, largura)
+        return self._obter(chave, lambda: self._converter_imagem(conteudo, largura))
+
+    @staticmethod
+    def _converter_imagem(conteudo, largura_max) -> bytes:
+        from io import BytesIO
+        from PIL import Image
+
+        img = Image.open(BytesIO(conteudo))
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Transparência vira branco (papel)
+            img = img.convert('RGBA')
+            fundo = Image.new('RGBA', img.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(fundo, img)
+        img = img.convert('L')
+        # Largura múltipla de 8: cada linha ocupa bytes inteiros, sem bits de preenchimento
+        largura = min(img.width, largura_max) // 8 * 8
+        altura = max(1, round(img.height * largura / img.width))
+        if (largura, altura) != img.size:
+            img = img.resize((largura, altura), Image.LANCZOS)
+        # Modo '1' (com dithering): bit 1 = branco, ao contrário do ESC/POS
+        dados = img.convert('1').tobytes().translate(_INVERTER)
+        return _raster(largura // 8, altura, dados)
+
+    def qrcode(self, dados: str, largura_mm=80, modulo=6) -> bytes:
+        """Retorna o QR Code de `dados` (ex.: PIX copia e cola) em ESC/POS, sem cache."""
+        return self._converter(lambda: self._converter_qrcode(dados, largura_mm, modulo))
+
+    @staticmethod
+    def _converter_qrcode(dados, largura_mm, modulo) -> bytes:
+        try:
+            import qrcode
+        except ImportError:
+            return _qr_nativo(dados, modulo)
+
+        qr = qrcode.QRCode(border=2, error_correction=qrcode.constants.ERROR_CORRECT_M)
+        qr.add_data(dados)
+        qr.make(fit=True)
+        matriz = qr.get_matrix()
+        modulo = max(1, min(modulo, LARGURA_PONTOS[largura_mm] // len(matriz)))
+
+        largura = len(matriz) * modulo
+        largura_bytes = (largura + 7) // 8
+        linhas = bytearray()
+        for linha in matriz:
+            bits = 0
+            for preto in linha:
+                bits = (bits << modulo) | ((1 << modulo) - 1 if preto else 0)
+            bits <<= largura_bytes * 8 - largura
+            linhas += bits.to_bytes(largura_bytes, 'big') * modulo
+        return _raster(largura_bytes, len(matriz) * modulo, bytes(linhas))
+
+    def limpar(self):
+        """Apaga o cache em memória e em disco."""
+        with self._lock:
+            self._memoria.clear()
+            self._bytes = 0
+            if os.path.isdir(self.diretorio):
+                for nome in os.listdir(self.diretorio):
+                    if nome.endswith('.bin'):
+                        os.remove(os.path.join(self.diretorio, nome))
+
+    def estatisticas(self):
+        stats = dict(self.stats)
+        stats["em_memoria"] = len(self._memoria)
+        stats["bytes_em_memoria"] = self._bytes
+        return stats
+
+_cache = None
+
+def get_raster_cache() -> RasterCache:
+    global _cache
+    if _cache is None:
+        _cache = RasterCache()
+    return _cache
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    cache = get_raster_cache()
+
+    if comando == 'aquecer' and len(sys.argv) > 2:
+        largura_mm = int(sys.argv[3]) if len(sys.argv) > 3 else 80
+        dados = cache.imagem(sys.argv[2], largura_mm)
+        print(f"{sys.argv[2]}: {len(dados)} bytes ESC/POS ({largura_mm} mm)")
+        print(cache.estatisticas())
+    elif comando == 'status':
+        print(cache.estatisticas())
+        if os.path.isdir(cache.diretorio):
+            arquivos = [n for n in os.listdir(cache.diretorio) if n.endswith('.bin')]
+            print(f"{len(arquivos)} imagens em {cache.diretorio}")
+    elif comando == 'limpar':
+        cache.limpar()
+        print("Cache de imagens apagado.")
+    else:
+        print("Uso: python raster_cache.py [status | aquecer <imagem> [58|80] | limpar]")
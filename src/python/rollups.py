@@ -0,0 +1,91 @@
+import sys
+import time
+from datetime import date, datetime, timedelta
+from supabase_client import get_supabase
+
+# Intervalo mínimo (s) entre duas atualizações incrementais disparadas pelo agente
+INTERVALO_ATUALIZACAO = 30
+
+# --- ROLLUPS DE VENDAS (migration 20260212000000_vendas_rollups.sql) ---
+
+_ultima_atualizacao = 0.0
+
+def atualizar(sb=None, forcar=False):
+    """
+    Aplica aos rollups as vendas alteradas desde o último watermark.
+    Chamadas seguidas dentro de `INTERVALO_ATUALIZACAO` são ignoradas,
+    a menos que `forcar` seja True. Retorna o resumo da RPC ou None.
+    """
+    global _ultima_atualizacao
+    if not forcar and time.monotonic() - _ultima_atualizacao < INTERVALO_ATUALIZACAO:
+        return None
+    sb = sb or get_supabase()
+    resultado = sb.rpc("atualizar_rollups", {}).execute().data
+    _ultima_atualizacao = time.monotonic()
+    return resultado
+
+def resumo(inicio: date, fim: date = None, sb=None):
+    """Totais do período [inicio, fim) no formato de `resumo_vendas`, lidos dos rollups."""
+    sb = sb or get_supabase()
+    atualizar(sb)
+    return sb.rpc("resumo_vendas_rollup", {
+        "p_inicio": inicio.isoformat(),
+        "p_fim": fim.isoformat() if fim else None,
+    }).execute().data
+
+def top_produtos(inicio: date, fim: date = None, limite=10, sb=None):
+    """Produtos com maior faturamento em [inicio, fim), lidos dos rollups."""
+    sb = sb or get_supabase()
+    atualizar(sb)
+    return sb.rpc("top_produtos_rollup", {
+        "p_inicio": inicio.isoformat(),
+        "p_fim": fim.isoformat() if fim else None,
+        "p_limite": limite,
+    }).execute().data
+
+def backfill(inicio: date = None, fim: date = None, sb=None):
+    """Reconstrói os rollups dos dias [inicio, fim) a partir das vendas (tudo, se sem datas)."""
+    sb = sb or get_supabase()
+    return sb.rpc("backfill_rollups", {
+        "p_inicio": inicio.isoformat() if inicio else None,
+        "p_fim": fim.isoformat() if fim else None,
+    }).execute().data
+
+def verificar(inicio: date, fim: date, sb=None):
+    """Dias em que os rollups divergem das tabelas de vendas (lista vazia = consistente)."""
+    sb = sb or get_supabase()
+    return sb.rpc("verificar_rollups", {
+        "p_inicio": inicio.isoformat(),
+        "p_fim": fim.isoformat(),
+    }).execute().data
+
+def _data(txt):
+    return datetime.strptime(txt, "%Y-%m-%d").date()
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'atualizar'
+    hoje = date.today()
+
+    if comando == 'atualizar':
+        r = atualizar(forcar=True)
+        print(f"Vendas lidas: {r['lidas']}, alteradas: {r['alteradas']}, watermark: {r['watermark']}")
+    elif comando == 'backfill':
+        inicio = _data(sys.argv[2]) if len(sys.argv) > 2 else None
+        fim = _data(sys.argv[3]) if len(sys.argv) > 3 else None
+        r = backfill(inicio, fim)
+        print(f"Rollups reconstruídos: {r['vendas']} vendas ({inicio or 'início'} a {fim or 'hoje'})")
+    elif comando == 'verificar':
+        inicio = _data(sys.argv[2]) if len(sys.argv) > 2 else hoje - timedelta(days=30)
+        fim = _data(sys.argv[3]) if len(sys.argv) > 3 else hoje + timedelta(days=1)
+        atualizar(forcar=True)
+        divergencias = verificar(inicio, fim)
+        if not divergencias:
+            print(f"Rollups consistentes de {inicio} a {fim}.")
+        for d in divergencias:
+            print(f"{d['dia']}: vendas={d['qtd_vendas']} (R$ {float(d['total_vendas']):.2f})"
+                  f" rollup={d['qtd_rollup']} (R$ {float(d['total_rollup']):.2f})")
+        if divergencias:
+            print("Corrija com: python rollups.py backfill <inicio> <fim>")
+            sys.exit(1)
+    else:
+        print("Uso: python rollups.py [atualizar | backfill [inicio] [fim] | verificar [inicio] [fim]]")
@@ -0,0 +1,365 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+
+# Journal local de vendas do caixa (mesma ideia de src/offline/sync.ts no frontend)
+JOURNAL_PATH = os.getenv(
+    "PDV_JOURNAL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vendas_journal.db'),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vendas_journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    chave TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    criado_em REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempt_count INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    venda_id TEXT,
+    sincronizado_em REAL,
+    cupom_impresso INTEGER NOT NULL DEFAULT 0,
+    cupom_enviado INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_journal_status ON vendas_journal(status, seq);
+
+CREATE TABLE IF NOT EXISTS replays (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    inicio REAL NOT NULL,
+    duracao_ms REAL NOT NULL,
+    enviadas INTEGER NOT NULL,
+    sincronizadas INTEGER NOT NULL,
+    falhas INTEGER NOT NULL,
+    erro TEXT
+);
+"""
+
+class SaleJournal:
+    """
+    Journal append-only de vendas em SQLite (modo WAL).
+
+    `registrar` grava a venda localmente antes de qualquer chamada de rede;
+    `sincronizar` reenvia as pendentes em lotes para a RPC
+    `processar_vendas_lote`, usando a chave de idempotência de cada venda.
+    O payload gravado nunca é alterado; só o estado de sincronização muda.
+
+    Estados (os mesmos do frontend): pending -> synced | failed. Uma venda
+    recusada durante o próprio checkout vai de failed para abandoned: o
+    caixa já foi avisado e vai passar a venda de novo, então ela nunca
+    volta para o replay (seria duplicada, com baixa de estoque em dobro).
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL no WAL: um fsync por commit, a venda sobrevive a queda de energia
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(SCHEMA)
+        self._replay_thread = None
+        self._parar = threading.Event()
+
+    def registrar(self, params) -> str:
+        """Grava a venda (parâmetros da RPC) no journal e retorna sua chave de idempotência."""
+        chave = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO vendas_journal (chave, payload, criado_em) VALUES (?, ?, ?)",
+                (chave, json.dumps(params), time.time()),
+            )
+        return chave
+
+    def marcar_cupom_impresso(self, chave):
+        """
+        Registra que o cupom saiu. Retorna o `venda_id` se a venda já estiver
+        no Supabase (o chamador marca lá); senão o flag segue no próximo replay.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE vendas_journal SET cupom_impresso = 1 WHERE chave = ?", (chave,)
+            )
+            row = self._conn.execute(
+                "SELECT venda_id, status FROM vendas_journal WHERE chave = ?", (chave,)
+            ).fetchone()
+        if row and row['status'] == 'synced':
+            self.confirmar_cupom_enviado([chave])
+            return row['venda_id']
+        return None
+
+    def confirmar_cupom_enviado(self, chaves):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE vendas_journal SET cupom_enviado = 1 WHERE chave = ?",
+                [(c,) for c in chaves],
+            )
+
+    def consultar(self, chave):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM vendas_journal WHERE chave = ?", (chave,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def pendentes(self, limite=50, chaves=None):
+        sql = "SELECT * FROM vendas_journal WHERE status = 'pending'"
+        args = []
+        if chaves:
+            sql += f" AND chave IN ({','.join('?' * len(chaves))})"
+            args.extend(chaves)
+        sql += " ORDER BY seq LIMIT ?"
+        args.append(limite)
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def _montar_lote(self, rows):
+        lote = []
+        for row in rows:
+            params = json.loads(row['payload'])
+            venda = dict(params['p_venda'])
+            if row['cupom_impresso']:
+                venda['cupom_impresso'] = True
+            lote.append({
+                "chave": row['chave'],
+                "venda": venda,
+                "itens": params.get('p_itens', []),
+                "pagamentos": params.get('p_pagamentos', []),
+            })
+        return lote
+
+    def sincronizar(self, supabase, lote=50, max_lotes=None, chaves=None, bloquear=True):
+        """
+        Reenvia as vendas pendentes em lotes (ou só as de `chaves`). Para no
+        primeiro erro de rede (as vendas continuam pendentes). Retorna um
+        resumo do replay. Com `bloquear=False`, retorna None na hora se
+        outro replay estiver em andamento.
+        """
+        if not self._sync_lock.acquire(blocking=bloquear):
+            return None
+        try:
+            return self._sincronizar(supabase, lote, max_lotes, chaves)
+        finally:
+            self._sync_lock.release()
+
+    def _sincronizar(self, supabase, lote, max_lotes, chaves):
+        resumo = {"enviadas": 0, "sincronizadas": 0, "falhas": 0, "duracao_ms": 0.0, "erro": None}
+        inicio = time.time()
+        t0 = time.perf_counter()
+        lotes = 0
+
+        while max_lotes is None or lotes < max_lotes:
+            rows = self.pendentes(lote, chaves)
+            if not rows:
+                break
+            lotes += 1
+            payload = self._montar_lote(rows)
+            resumo["enviadas"] += len(rows)
+
+            try:
+                res = supabase.rpc('processar_vendas_lote', {'p_vendas': payload}).execute()
+            except Exception as e:
+                resumo["erro"] = str(e)
+                with self._lock:
+                    self._conn.executemany(
+                        "UPDATE vendas_journal SET attempt_count = attempt_count + 1, last_error = ? WHERE chave = ?",
+                        [(str(e), r['chave']) for r in rows],
+                    )
+                break
+
+            enviados_impressos = {r['chave'] for r in rows if r['cupom_impresso']}
+            agora = time.time()
+            with self._lock:
+                self._conn.execute("BEGIN")
+                for item in res.data or []:
+                    if item.get('status') in ('criada', 'duplicada'):
+                        resumo["sincronizadas"] += 1
+                        self._conn.execute(
+                            "UPDATE vendas_journal SET status = 'synced', venda_id = ?, sincronizado_em = ?,"
+                            " last_error = NULL, cupom_enviado = ? WHERE chave = ?",
+                            (item.get('venda_id'), agora,
+                             1 if item['chave'] in enviados_impressos else 0, item['chave']),
+                        )
+                    else:
+                        resumo["falhas"] += 1
+                        self._conn.execute(
+                            "UPDATE vendas_journal SET status = 'failed', attempt_count = attempt_count + 1,"
+                            " last_error = ? WHERE chave = ?",
+                            (item.get('erro', 'Erro desconhecido'), item['chave']),
+                        )
+                self._conn.execute("COMMIT")
+
+            # Cupons impressos enquanto o lote estava em trânsito
+            for row in self._cupons_nao_enviados():
+                try:
+                    supabase.rpc('marcar_venda_impressa', {'p_venda_id': row['venda_id']}).execute()
+                    self.confirmar_cupom_enviado([row['chave']])
+                except Exception as e:
+                    print(f"[Journal] Falha ao marcar cupom da venda {row['venda_id']}: {e}")
+                    break
+
+        resumo["duracao_ms"] = (time.perf_counter() - t0) * 1000
+        if resumo["enviadas"]:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO replays (inicio, duracao_ms, enviadas, sincronizadas, falhas, erro)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (inicio, resumo["duracao_ms"], resumo["enviadas"], resumo["sincronizadas"],
+                     resumo["falhas"], resumo["erro"]),
+                )
+        return resumo
+
+    def _cupons_nao_enviados(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chave, venda_id FROM vendas_journal"
+                " WHERE status = 'synced' AND cupom_impresso = 1 AND cupom_enviado = 0"
+            ).fetchall()
+
+    def abandonar(self, chave) -> bool:
+        """
+        Marca como 'abandoned' uma venda recusada cuja falha já foi informada
+        ao caixa. Fica no journal para consulta, fora do `reenviar_falhas`.
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE vendas_journal SET status = 'abandoned' WHERE chave = ? AND status = 'failed'", (chave,)
+            )
+        return cur.rowcount > 0
+
+    def reenviar_falhas(self) -> int:
+        """
+        Volta as vendas com erro para 'pending' (após corrigir a causa no banco).
+        Só as que falharam no replay em background; as abandonadas não voltam.
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE vendas_journal SET status = 'pending' WHERE status = 'failed'"
+            )
+        return cur.rowcount
+
+    def iniciar_replay_automatico(self, supabase_factory, intervalo=15, lote=50):
+        """Thread de background que tenta esvaziar o backlog a cada `intervalo` segundos."""
+        if self._replay_thread and self._replay_thread.is_alive():
+            return
+        self._parar.clear()
+
+        def _loop():
+            while not self._parar.wait(intervalo):
+                if not self.pendentes(1):
+                    continue
+                try:
+                    resumo = self.sincronizar(supabase_factory(), lote=lote)
+                    if resumo["sincronizadas"]:
+                        print(f"[Journal] {resumo['sincronizadas']} vendas sincronizadas.")
+                except Exception as e:
+                    print(f"[Journal] Erro no replay automático: {e}")
+
+        self._replay_thread = threading.Thread(target=_loop, name="journal-replay", daemon=True)
+        self._replay_thread.start()
+
+    def parar_replay_automatico(self):
+        self._parar.set()
+
+    def status(self):
+        with self._lock:
+            contagem = {
+                r['status']: r['n'] for r in self._conn.execute(
+                    "SELECT status, COUNT(*) AS n FROM vendas_journal GROUP BY status"
+                )
+            }
+            mais_antiga = self._conn.execute(
+                "SELECT MIN(criado_em) FROM vendas_journal WHERE status = 'pending'"
+            ).fetchone()[0]
+            ultimos = self._conn.execute(
+                "SELECT SUM(sincronizadas) AS s, SUM(duracao_ms) AS d FROM"
+                " (SELECT sincronizadas, duracao_ms FROM replays ORDER BY id DESC LIMIT 20)"
+            ).fetchone()
+            ultimo = self._conn.execute(
+                "SELECT * FROM replays ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+
+        vazao = None
+        if ultimos['d']:
+            vazao = ultimos['s'] / (ultimos['d'] / 1000)
+        return {
+            "pendentes": contagem.get('pending', 0),
+            "sincronizadas": contagem.get('synced', 0),
+            "falhas": contagem.get('failed', 0),
+            "abandonadas": contagem.get('abandoned', 0),
+            "pendente_mais_antiga_s": (time.time() - mais_antiga) if mais_antiga else None,
+            "vazao_replay_vendas_s": vazao,
+            "ultimo_replay": dict(ultimo) if ultimo else None,
+        }
+
+    def listar(self, status=None, limite=20):
+        sql = "SELECT seq, chave, status, attempt_count, last_error, venda_id, criado_em FROM vendas_journal"
+        args = []
+        if status:
+            sql += " WHERE status = ?"
+            args.append(status)
+        sql += " ORDER BY seq DESC LIMIT ?"
+        args.append(limite)
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, args)]
+
+    def fechar(self):
+        self.parar_replay_automatico()
+        self._conn.close()
+
+_journal = None
+
+def get_journal() -> SaleJournal:
+    global _journal
+    if _journal is None:
+        _journal = SaleJournal()
+    return _journal
+
+def _imprimir_status(journal):
+    st = journal.status()
+    print(f"Pendentes:      {st['pendentes']}")
+    print(f"Sincronizadas:  {st['sincronizadas']}")
+    print(f"Com falha:      {st['falhas']}")
+    print(f"Abandonadas:    {st['abandonadas']} (recusadas no checkout, o caixa foi avisado)")
+    if st['pendente_mais_antiga_s'] is not None:
+        print(f"Mais antiga:    {st['pendente_mais_antiga_s'] / 60:.1f} min aguardando")
+    if st['vazao_replay_vendas_s'] is not None:
+        print(f"Vazão replay:   {st['vazao_replay_vendas_s']:.1f} vendas/s (últimos 20 replays)")
+    if st['ultimo_replay']:
+        r = st['ultimo_replay']
+        quando = datetime.fromtimestamp(r['inicio']).strftime('%d/%m/%Y %H:%M:%S')
+        print(f"Último replay:  {quando} - {r['sincronizadas']}/{r['enviadas']} em {r['duracao_ms']:.0f} ms"
+              + (f" (erro: {r['erro']})" if r['erro'] else ""))
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    journal = get_journal()
+
+    if comando == 'status':
+        _imprimir_status(journal)
+    elif comando == 'listar':
+        status = sys.argv[2] if len(sys.argv) > 2 else None
+        for r in journal.listar(status=status):
+            quando = datetime.fromtimestamp(r['criado_em']).strftime('%d/%m %H:%M:%S')
+            print(f"#{r['seq']} {quando} {r['status']:<8} tentativas={r['attempt_count']}"
+                  f" venda={r['venda_id'] or '-'} {r['last_error'] or ''}")
+    elif comando == 'replay':
+        from pos_hardware import setup_supabase
+        lote = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+        resumo = journal.sincronizar(setup_supabase(), lote=lote)
+        print(f"Replay: {resumo['sincronizadas']}/{resumo['enviadas']} sincronizadas,"
+              f" {resumo['falhas']} falhas, {resumo['duracao_ms']:.0f} ms")
+        if resumo['erro']:
+            print(f"Interrompido: {resumo['erro']}")
+        _imprimir_status(journal)
+    elif comando == 'reenviar-falhas':
+        print(f"{journal.reenviar_falhas()} vendas voltaram para a fila de replay.")
+    else:
+        print("Uso: python sale_journal.py [status | listar [pending|synced|failed|abandoned] | replay [lote] | reenviar-falhas]")
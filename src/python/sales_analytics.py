@@ -0,0 +1,178 @@
+import time
+import threading
+from datetime import date
+import numpy as np
+from paged_reader import ler_paginas, buscar_supabase
+
+# Brasília não tem horário de verão desde 2019: hora local = UTC - 3
+FUSO_HORAS = -3
+# Por quanto tempo (s) os itens carregados de um período são reaproveitados
+DADOS_TTL = 120
+
+CAMPOS_ITENS = "id, produto_id, quantidade, subtotal, created_at, vendas!inner(status)"
+CAMPOS_PRODUTOS = "id, nome, tipo_venda, preco_custo, margem_lucro, margem_perda, preco_kg, preco_unidade"
+
+class DadosVendas:
+    """
+    Itens vendidos em forma colunar (um array NumPy por coluna).
+
+    `produto` guarda o índice do produto nos arrays de produtos
+    (`nomes`, `peso`, `custo`), então agrupar por produto é um
+    `np.bincount` em vez de um laço em Python.
+    """
+
+    def __init__(self, produtos, produto_ids, quantidade, subtotal, instante, inicio, fim):
+        self.inicio = inicio
+        self.fim = fim
+        self.produto_ids = [p['id'] for p in produtos]
+        indice = {pid: i for i, pid in enumerate(self.produto_ids)}
+        self.nomes = np.array([p.get('nome') or '?' for p in produtos], dtype=object)
+        self.peso = np.array([p.get('tipo_venda') == 'peso' for p in produtos], dtype=bool)
+        self.custo = np.array([_custo_unitario(p) for p in produtos], dtype=np.float64)
+
+        # Itens de produtos que não existem mais ficam de fora
+        produto = np.fromiter((indice.get(pid, -1) for pid in produto_ids), dtype=np.int32,
+                              count=len(produto_ids))
+        validos = produto >= 0
+        self.produto = produto[validos]
+        self.quantidade = np.asarray(quantidade, dtype=np.float64)[validos]
+        self.subtotal = np.asarray(subtotal, dtype=np.float64)[validos]
+        self.instante = np.asarray(instante, dtype='datetime64[s]')[validos]
+        local = self.instante + np.timedelta64(FUSO_HORAS, 'h')
+        self.dia = local.astype('datetime64[D]')
+        self.hora = ((local - self.dia).astype('timedelta64[h]').astype(np.int64)).astype(np.int8)
+        self.carregado_em = time.monotonic()
+
+    @property
+    def n_produtos(self):
+        return len(self.produto_ids)
+
+    def __len__(self):
+        return len(self.produto)
+
+    def por_produto(self, valores):
+        return np.bincount(self.produto, weights=valores, minlength=self.n_produtos)
+
+def _custo_unitario(produto):
+    """
+    Custo por kg/unidade como na tela de Precificação: custo da nota com a
+    quebra (`margem_perda`). Sem `preco_custo`, deduz do preço e da margem.
+    """
+    perda = float(produto.get('margem_perda') or 0)
+    custo = produto.get('preco_custo')
+    if custo is not None:
+        custo = float(custo)
+        return custo / (1 - perda / 100) if perda < 100 else custo
+    margem = produto.get('margem_lucro')
+    preco = produto.get('preco_kg') if produto.get('tipo_venda') == 'peso' else produto.get('preco_unidade')
+    if margem is None or preco is None:
+        return np.nan
+    return float(preco) / (1 + float(margem) / 100)
+
+def _instantes(textos):
+    # '2026-02-10T12:30:00.123+00:00' -> datetime64 (o PostgREST devolve em UTC)
+    return np.array([t[:19] for t in textos], dtype='datetime64[s]')
+
+def carregar(sb, inicio: date, fim: date = None, tamanho_pagina=1000):
+    """Lê produtos e os itens vendidos (vendas finalizadas) de [inicio, fim) em colunas."""
+    produtos = [linha for pagina in ler_paginas(buscar_supabase(sb, "produtos", CAMPOS_PRODUTOS))
+                for linha in pagina]
+
+    inicio_utc = f"{inicio.isoformat()}T{-FUSO_HORAS:02d}:00:00+00:00"
+    fim_utc = f"{fim.isoformat()}T{-FUSO_HORAS:02d}:00:00+00:00" if fim else None
+
+    def filtros(query):
+        query = query.eq("vendas.status", "finalizada").gte("created_at", inicio_utc)
+        return query.lt("created_at", fim_utc) if fim_utc else query
+
+    # Página a página direto para listas de colunas: nada de guardar os dicts
+    produto_ids, quantidade, subtotal, instante = [], [], [], []
+    buscar = buscar_supabase(sb, "itens_venda", CAMPOS_ITENS, chave=("created_at", "id"), filtros=filtros)
+    for pagina in ler_paginas(buscar, chave=("created_at", "id"), tamanho_pagina=tamanho_pagina, prefetch=True):
+        produto_ids.extend(i['produto_id'] for i in pagina)
+        quantidade.extend(i['quantidade'] for i in pagina)
+        subtotal.extend(i['subtotal'] for i in pagina)
+        instante.append(_instantes([i['created_at'] for i in pagina]))
+
+    instante = np.concatenate(instante) if instante else np.array([], dtype='datetime64[s]')
+    return DadosVendas(produtos, produto_ids, quantidade, subtotal, instante, inicio, fim)
+
+_dados = {}
+_dados_lock = threading.Lock()
+
+def obter_dados(sb, inicio: date, fim: date = None, ttl=DADOS_TTL) -> DadosVendas:
+    """`carregar` com reaproveitamento: várias análises do mesmo período leem o banco uma vez."""
+    chave = (inicio, fim)
+    with _dados_lock:
+        dados = _dados.get(chave)
+        if dados is not None and time.monotonic() - dados.carregado_em < ttl:
+            return dados
+    dados = carregar(sb, inicio, fim)
+    with _dados_lock:
+        _dados[chave] = dados
+    return dados
+
+def expirar():
+    """Descarta os itens carregados: a próxima análise relê o banco (ex.: depois de uma venda)."""
+    with _dados_lock:
+        _dados.clear()
+
+# --- Análises (vetorizadas) ---
+
+def curva_abc(dados: DadosVendas, corte_a=0.80, corte_b=0.95):
+    """
+    Curva ABC (Pareto) por faturamento. Retorna uma lista ordenada do maior
+    para o menor com receita, participação, acumulado e classe A/B/C.
+    """
+    receita = dados.por_produto(dados.subtotal)
+    vendidos = np.flatnonzero(receita > 0)
+    ordem = vendidos[np.argsort(-receita[vendidos], kind='stable')]
+    total = receita[ordem].sum()
+    if not total:
+        return []
+    participacao = receita[ordem] / total
+    acumulado = np.cumsum(participacao)
+    # O produto que cruza o corte ainda entra na classe de cima
+    anterior = acumulado - participacao
+    classe = np.where(anterior < corte_a, 'A', np.where(anterior < corte_b, 'B', 'C'))
+    return [
+        {"produto": dados.nomes[i], "receita": float(receita[i]), "participacao": float(p),
+         "acumulado": float(a), "classe": str(c)}
+        for i, p, a, c in zip(ordem, participacao, acumulado, classe)
+    ]
+
+def receita_por_hora(dados: DadosVendas):
+    """Receita e quantidade de itens por hora do dia (arrays de 24 posições)."""
+    receita = np.bincount(dados.hora, weights=dados.subtotal, minlength=24)
+    itens = np.bincount(dados.hora, minlength=24)
+    return receita, itens
+
+def peso_vs_unidade(dados: DadosVendas):
+    """Faturamento, itens e volume vendido separados entre produtos por kg e por unidade."""
+    por_peso = dados.peso[dados.produto]
+    resultado = {}
+    for nome, mascara in (("peso", por_peso), ("unidade", ~por_peso)):
+        resultado[nome] = {
+            "receita": float(dados.subtotal[mascara].sum()),
+            "itens": int(mascara.sum()),
+            "quantidade": float(dados.quantidade[mascara].sum()),
+        }
+    return resultado
+
+def margens(dados: DadosVendas):
+    """
+    Receita, custo estimado e margem bruta por produto (custo unitário x
+    quantidade). Produtos sem custo cadastrado ficam com custo NaN.
+    """
+    receita = dados.por_produto(dados.subtotal)
+    quantidade = dados.por_produto(dados.quantidade)
+    custo = quantidade * dados.custo
+    lucro = receita - custo
+    with np.errstate(invalid='ignore', divide='ignore'):
+        margem = np.where(receita > 0, lucro / receita, np.nan)
+    vendidos = np.flatnonzero(receita > 0)
+    return [
+        {"produto": dados.nomes[i], "receita": float(receita[i]), "custo": float(custo[i]),
+         "lucro": float(lucro[i]), "margem": float(margem[i])}
+        for i in vendidos[np.argsort(-receita[vendidos], kind='stable')]
+    ]
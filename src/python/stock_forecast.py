@@ -0,0 +1,173 @@
+import sys
+import math
+import time
+import threading
+from datetime import date, timedelta
+import numpy as np
+import sales_analytics
+from catalog_index import get_catalogo
+
+# Dias de histórico usados para velocidade e sazonalidade semanal (8 semanas)
+JANELA_HISTORICO_DIAS = 56
+# Meia-vida (dias) do peso das vendas: as semanas recentes contam mais
+MEIA_VIDA_DIAS = 14
+# Quantas semanas "fictícias" com fator 1 entram na média do dia da semana
+# (com pouco histórico, o fator fica perto de 1 em vez de seguir o ruído)
+SUAVIZACAO_SEMANAS = 2
+# Dias entre fazer o pedido e a mercadoria chegar
+PRAZO_ENTREGA_DIAS = 1
+# Dias de venda que o pedido deve cobrir depois de chegar
+COBERTURA_PERECIVEL_DIAS = 2
+COBERTURA_PADRAO_DIAS = 7
+# Até quantos dias à frente a ruptura é procurada
+HORIZONTE_DIAS = 30
+# Estoque de segurança: z * desvio diário * raiz(dias cobertos); 1.65 ~ 95% de serviço
+Z_SEGURANCA = 1.65
+
+def _dia_semana(dias):
+    """Segunda = 0 ... domingo = 6 para um array datetime64[D] (1970-01-01 foi quinta)."""
+    return (dias.astype(np.int64) + 3) % 7
+
+class PerfilVendas:
+    """
+    Agregados de vendas por produto, calculados uma vez por dia.
+
+    A partir do histórico [inicio, fim) monta a matriz produto x dia com
+    a quantidade vendida (um `np.bincount`) e guarda só o que a previsão
+    usa: velocidade diária ponderada, fator por dia da semana e desvio.
+    A matriz e os itens brutos são descartados.
+    """
+
+    def __init__(self, dados, inicio: date, fim: date, meia_vida=MEIA_VIDA_DIAS,
+                 suavizacao=SUAVIZACAO_SEMANAS):
+        self.inicio = inicio
+        self.fim = fim
+        self.produto_ids = dados.produto_ids
+        self.indice = {pid: i for i, pid in enumerate(self.produto_ids)}
+        n_produtos, n_dias = dados.n_produtos, (fim - inicio).days
+
+        dia = (dados.dia - np.datetime64(inicio, 'D')).astype(np.int64)
+        dentro = (dia >= 0) & (dia < n_dias)
+        matriz = np.bincount(dados.produto[dentro] * n_dias + dia[dentro],
+                             weights=dados.quantidade[dentro],
+                             minlength=n_produtos * n_dias).reshape(n_produtos, n_dias)
+
+        idade = n_dias - 1 - np.arange(n_dias)
+        pesos = 0.5 ** (idade / meia_vida)
+        self.velocidade = matriz @ pesos / pesos.sum()
+        self.desvio = matriz.std(axis=1)
+
+        # Média por dia da semana / média geral, puxada para 1 com `suavizacao` semanas
+        semana = _dia_semana(np.datetime64(inicio, 'D') + np.arange(n_dias))
+        contagem = np.bincount(semana, minlength=7)
+        soma_semana = np.stack([matriz[:, semana == d].sum(axis=1) for d in range(7)], axis=1)
+        media = matriz.mean(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            bruto = np.where(media > 0, soma_semana / np.maximum(contagem, 1) / media, 1.0)
+        self.fator_semana = (bruto * contagem + suavizacao) / (contagem + suavizacao)
+        self.calculado_em = time.monotonic()
+
+    def projetar(self, indices, inicio: date, dias: int):
+        """Demanda prevista (produtos x dias) a partir de `inicio`."""
+        semana = _dia_semana(np.datetime64(inicio, 'D') + np.arange(dias))
+        return self.velocidade[indices, None] * self.fator_semana[indices][:, semana]
+
+_perfil = None
+_perfil_lock = threading.Lock()
+
+def obter_perfil(sb, hoje: date = None) -> PerfilVendas:
+    """Perfil das últimas `JANELA_HISTORICO_DIAS` até ontem; recalculado quando o dia muda."""
+    global _perfil
+    hoje = hoje or date.today()
+    with _perfil_lock:
+        if _perfil is not None and _perfil.fim == hoje:
+            return _perfil
+        inicio = hoje - timedelta(days=JANELA_HISTORICO_DIAS)
+        # carregar direto (sem o cache de sales_analytics): só os agregados ficam em memória
+        _perfil = PerfilVendas(sales_analytics.carregar(sb, inicio, hoje), inicio, hoje)
+        return _perfil
+
+def expirar():
+    global _perfil
+    with _perfil_lock:
+        _perfil = None
+
+def _arredondar(quantidade, produto):
+    """Pedido em caixas fechadas quando o produto vem em caixa; senão kg (0,1) ou unidades."""
+    peso_caixa = float(produto.get('peso_caixa') or 0)
+    if produto.get('eh_caixa') and peso_caixa > 0:
+        return math.ceil(quantidade / peso_caixa - 1e-9) * peso_caixa
+    if produto.get('tipo_venda') == 'peso':
+        return math.ceil(quantidade * 10 - 1e-9) / 10
+    return float(math.ceil(quantidade - 1e-9))
+
+def prever(produtos, perfil: PerfilVendas, hoje: date = None, horizonte=HORIZONTE_DIAS):
+    """
+    Previsão para `produtos` (linhas do catálogo, com estoque atual) de uma vez:
+    dias até zerar o estoque e quantidade sugerida para o próximo pedido.
+    `dias_ate_ruptura` é None quando o estoque passa do horizonte (ou não há vendas).
+    """
+    hoje = hoje or date.today()
+    if not produtos:
+        return []
+    indices = np.array([perfil.indice.get(p['id'], -1) for p in produtos])
+    conhecidos = indices >= 0
+    indices = np.where(conhecidos, indices, 0)
+    estoque = np.array([max(float(p.get('estoque_atual') or 0), 0.0) for p in produtos])
+    minimo = np.array([float(p.get('estoque_minimo') or 0) for p in produtos])
+    cobertura = np.array([PRAZO_ENTREGA_DIAS + (COBERTURA_PERECIVEL_DIAS if p.get('perecivel')
+                          else COBERTURA_PADRAO_DIAS) for p in produtos])
+
+    horizonte = max(horizonte, int(cobertura.max()))
+    demanda = perfil.projetar(indices, hoje, horizonte)
+    demanda[~conhecidos] = 0.0
+    acumulada = np.cumsum(demanda, axis=1)
+
+    # Primeiro dia em que a demanda acumulada passa do estoque; fração pelo que sobra no dia
+    acaba = acumulada > estoque[:, None]
+    rompe = acaba.any(axis=1)
+    dia = acaba.argmax(axis=1)
+    linhas = np.arange(len(produtos))
+    antes = np.where(dia > 0, acumulada[linhas, dia - 1], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fracao = (estoque - antes) / demanda[linhas, dia]
+    dias_ate_ruptura = np.where(rompe, dia + np.nan_to_num(fracao), np.inf)
+
+    # Precisa cobrir prazo + cobertura, com margem de segurança, sem descer do mínimo
+    necessidade = acumulada[linhas, cobertura - 1]
+    necessidade += Z_SEGURANCA * perfil.desvio[indices] * np.sqrt(cobertura) * conhecidos
+    necessidade = np.maximum(necessidade, acumulada[linhas, PRAZO_ENTREGA_DIAS - 1] + minimo)
+    sugestao = np.maximum(necessidade - estoque, 0.0)
+
+    resultado = []
+    for i, p in enumerate(produtos):
+        resultado.append({
+            "produto": p,
+            "estoque": float(estoque[i]),
+            "venda_diaria": float(perfil.velocidade[indices[i]]) if conhecidos[i] else 0.0,
+            "dias_ate_ruptura": float(dias_ate_ruptura[i]) if conhecidos[i] and np.isfinite(dias_ate_ruptura[i]) else None,
+            "sugestao_pedido": _arredondar(sugestao[i], p) if sugestao[i] > 1e-9 else 0.0,
+        })
+    return resultado
+
+def previsao_catalogo(sb=None, hoje: date = None):
+    """Previsão para todo o catálogo ativo, ordenada pelos que acabam primeiro."""
+    if sb is None:
+        from supabase_client import get_supabase
+        sb = get_supabase()
+    catalogo = get_catalogo()
+    catalogo.atualizar(sb)
+    perfil = obter_perfil(sb, hoje)
+    previsao = prever(catalogo.produtos(), perfil, hoje)
+    previsao.sort(key=lambda r: (r["dias_ate_ruptura"] is None, r["dias_ate_ruptura"] or 0))
+    return previsao
+
+if __name__ == "__main__":
+    inicio = time.perf_counter()
+    previsao = previsao_catalogo()
+    print(f"{len(previsao)} produtos previstos em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    limite = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for r in previsao[:limite]:
+        dias = r["dias_ate_ruptura"]
+        print(f"{r['produto']['nome']:<40} estoque {r['estoque']:>8.2f}  venda/dia {r['venda_diaria']:>7.2f}  "
+              f"acaba em {'-' if dias is None else f'{dias:.1f}d':>6}  pedir {r['sugestao_pedido']:.2f}")
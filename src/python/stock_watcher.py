@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import heapq
+import queue
+import threading
+from datetime import datetime
+from catalog_index import get_catalogo, CATALOGO_TTL
+
+# URL que recebe os alertas em POST JSON (ex.: um webhook do WhatsApp/Slack); vazio = só a fila local
+ALERTA_WEBHOOK_URL = os.environ.get("PDV_ALERTA_WEBHOOK", "")
+# Alertas guardados na fila local antes de descartar os mais antigos
+TAMANHO_FILA_ALERTAS = 1000
+
+def nivel_estoque(produto):
+    """'zerado', 'baixo' (no mínimo ou abaixo, como em useEstoque.ts) ou 'ok'."""
+    estoque = float(produto.get('estoque_atual') or 0)
+    if estoque <= 0:
+        return 'zerado'
+    if estoque <= float(produto.get('estoque_minimo') or 0):
+        return 'baixo'
+    return 'ok'
+
+def _proximidade(produto):
+    """Estoque atual / mínimo: quanto menor, mais perto de faltar. None = sem mínimo e com estoque."""
+    estoque = float(produto.get('estoque_atual') or 0)
+    minimo = float(produto.get('estoque_minimo') or 0)
+    if minimo > 0:
+        return estoque / minimo
+    return 0.0 if estoque <= 0 else None
+
+def notificador_webhook(url, timeout=5):
+    """Notificador que envia cada alerta em POST JSON para `url`."""
+    import requests
+
+    def enviar(alerta):
+        requests.post(url, json={**alerta, "produto": {k: alerta["produto"].get(k) for k in
+                                 ("id", "nome", "estoque_atual", "estoque_minimo", "tipo_venda")}},
+                      timeout=timeout)
+    return enviar
+
+class VigiaEstoque:
+    """
+    Acompanha o estoque do catálogo e avisa quando um produto cruza o mínimo.
+
+    Não relê a tabela: é um observador do `CatalogoProdutos`, que já traz
+    do Supabase só os produtos com `updated_at` posterior ao watermark.
+    Cada atualização custa proporcional às linhas alteradas. Um heap
+    mínimo ordena os produtos por estoque/mínimo (remoção preguiçosa por
+    versão), e o conjunto de alertas ativos fica em memória para consulta
+    imediata.
+
+    Mudanças de nível ('ok' -> 'baixo' -> 'zerado' e a volta para 'ok')
+    viram eventos na `fila` local e são passadas aos `notificadores`. Na
+    primeira carga os produtos já abaixo do mínimo entram nos alertas
+    ativos sem notificar, para um reinício não repetir tudo.
+    """
+
+    def __init__(self, catalogo=None, notificadores=None, tamanho_fila=TAMANHO_FILA_ALERTAS):
+        self.catalogo = catalogo or get_catalogo()
+        self.notificadores = list(notificadores or [])
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        self._estado = {}        # id -> (proximidade, nivel, produto)
+        self._versao = {}        # id -> versão da entrada válida no heap
+        self._heap = []          # (proximidade, versão, id)
+        self._alertas = {}       # id -> alerta ativo
+        self._carregado = False
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self.stats = {"produtos_processados": 0, "alertas": 0, "normalizados": 0,
+                      "verificacoes": 0, "notificacoes_falhas": 0}
+
+    # --- Processamento das alterações ---
+
+    def processar(self, produtos, substituir=False):
+        """Aplica linhas alteradas de `produtos`; com `substituir`, o que não veio foi apagado."""
+        eventos = []
+        with self._lock:
+            notificar = self._carregado
+            vistos = set()
+            for produto in produtos:
+                vistos.add(produto['id'])
+                eventos.extend(self._atualizar(produto, notificar))
+            if substituir:
+                for produto_id in [i for i in self._estado if i not in vistos]:
+                    eventos.extend(self._atualizar({"id": produto_id, "ativo": False}, notificar))
+            self._carregado = True
+            self.stats["produtos_processados"] += len(produtos)
+            if len(self._heap) > 2 * len(self._estado) + 64:
+                self._compactar()
+        for evento in eventos:
+            self._emitir(evento)
+
+    def _atualizar(self, produto, notificar):
+        produto_id = produto['id']
+        anterior = self._estado.get(produto_id)
+        nivel_anterior = anterior[1] if anterior else 'ok'
+        self._versao[produto_id] = self._versao.get(produto_id, 0) + 1
+
+        if produto.get('ativo') is False:
+            # A versão continua: entradas antigas no heap ficam inválidas
+            self._estado.pop(produto_id, None)
+            self._alertas.pop(produto_id, None)
+            return []
+
+        proximidade = _proximidade(produto)
+        nivel = nivel_estoque(produto)
+        self._estado[produto_id] = (proximidade, nivel, produto)
+        if proximidade is not None:
+            heapq.heappush(self._heap, (proximidade, self._versao[produto_id], produto_id))
+
+        if nivel == nivel_anterior:
+            if nivel != 'ok':
+                self._alertas[produto_id]["produto"] = produto
+            return []
+
+        alerta = {"tipo": nivel if nivel != 'ok' else 'normalizado', "produto": produto,
+                  "nivel_anterior": nivel_anterior, "em": datetime.now().isoformat(timespec='seconds')}
+        if nivel == 'ok':
+            self._alertas.pop(produto_id, None)
+            self.stats["normalizados"] += 1
+        else:
+            self._alertas[produto_id] = alerta
+            self.stats["alertas"] += 1
+        return [alerta] if notificar else []
+
+    def _compactar(self):
+        self._heap = [e for e in self._heap if self._versao.get(e[2]) == e[1]]
+        heapq.heapify(self._heap)
+
+    def _emitir(self, alerta):
+        try:
+            self.fila.put_nowait(alerta)
+        except queue.Full:
+            # Ninguém está lendo: descarta o mais antigo
+            try:
+                self.fila.get_nowait()
+            except queue.Empty:
+                pass
+            self.fila.put_nowait(alerta)
+        for notificar in self.notificadores:
+            try:
+                notificar(alerta)
+            except Exception as e:
+                self.stats["notificacoes_falhas"] += 1
+                print(f"[Aviso] Falha ao notificar alerta de estoque: {e}")
+
+    # --- Consultas (memória) ---
+
+    def alertas(self):
+        """Alertas ativos, zerados primeiro e depois os mais abaixo do mínimo."""
+        with self._lock:
+            ativos = list(self._alertas.values())
+        return sorted(ativos, key=lambda a: (a["tipo"] != 'zerado', _proximidade(a["produto"]) or 0))
+
+    def mais_proximos(self, n=10):
+        """Os `n` produtos com menor estoque/mínimo, tirados do topo do heap."""
+        with self._lock:
+            achados, validos = [], []
+            while self._heap and len(achados) < n:
+                entrada = heapq.heappop(self._heap)
+                if self._versao.get(entrada[2]) != entrada[1]:
+                    continue
+                validos.append(entrada)
+                achados.append(self._estado[entrada[2]][2])
+            for entrada in validos:
+                heapq.heappush(self._heap, entrada)
+            return achados
+
+    def pendentes(self):
+        """Esvazia a fila local e retorna os eventos que estavam nela."""
+        eventos = []
+        while True:
+            try:
+                eventos.append(self.fila.get_nowait())
+            except queue.Empty:
+                return eventos
+
+    # --- Polling ---
+
+    def verificar(self, sb=None):
+        """Traz as alterações do catálogo (incremental); o observador faz o resto."""
+        self.stats["verificacoes"] += 1
+        # expirar + atualizar = consulta incremental agora (forcar recarregaria tudo)
+        self.catalogo.expirar()
+        self.catalogo.atualizar(sb)
+
+    def iniciar(self, sb=None, intervalo=CATALOGO_TTL):
+        """Inicia o polling numa thread de background."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+
+        def _loop():
+            while True:
+                try:
+                    self.verificar(sb)
+                except Exception as e:
+                    print(f"Erro no vigia de estoque: {e}")
+                if self._parar.wait(intervalo):
+                    return
+
+        self._thread = threading.Thread(target=_loop, name="stock-watcher", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["produtos"] = len(self._estado)
+            stats["alertas_ativos"] = len(self._alertas)
+            stats["heap"] = len(self._heap)
+        stats["fila"] = self.fila.qsize()
+        return stats
+
+_vigia = None
+_vigia_lock = threading.Lock()
+
+def get_vigia() -> VigiaEstoque:
+    """Vigia compartilhado, já observando o catálogo local."""
+    global _vigia
+    with _vigia_lock:
+        if _vigia is None:
+            notificadores = [notificador_webhook(ALERTA_WEBHOOK_URL)] if ALERTA_WEBHOOK_URL else []
+            vigia = VigiaEstoque(notificadores=notificadores)
+            vigia.catalogo.observar(vigia.processar)
+            if len(vigia.catalogo):
+                vigia.processar(vigia.catalogo.produtos(), substituir=True)
+            _vigia = vigia
+        return _vigia
+
+def descrever(alerta):
+    p = alerta["produto"]
+    unidade = 'kg' if p.get('tipo_venda') == 'peso' else 'un'
+    textos = {"zerado": "SEM ESTOQUE", "baixo": "estoque baixo", "normalizado": "estoque normalizado"}
+    return (f"{textos[alerta['tipo']]}: {p.get('nome')} ({float(p.get('estoque_atual') or 0):.1f} {unidade}, "
+            f"mínimo {float(p.get('estoque_minimo') or 0):.1f})")
+
+if __name__ == "__main__":
+    intervalo = float(sys.argv[1]) if len(sys.argv) > 1 else CATALOGO_TTL
+    vigia = get_vigia()
+    vigia.iniciar(intervalo=intervalo)
+    time.sleep(1)
+    print(f"{len(vigia.alertas())} alertas ativos:")
+    for alerta in vigia.alertas():
+        print(f"  {descrever(alerta)}")
+    print("Acompanhando alterações (Ctrl+C para sair)...")
+    try:
+        while True:
+            alerta = vigia.fila.get()
+            print(f"[{alerta['em']}] {descrever(alerta)}")
+    except KeyboardInterrupt:
+        vigia.parar()
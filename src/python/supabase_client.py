@@ -1,20 +1,32 @@
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import threading
+from typing import TYPE_CHECKING
 
-# Carrega variáveis de ambiente do arquivo .env (se existir)
-load_dotenv()
+if TYPE_CHECKING:
+    from supabase import Client
 
 class SupabaseManager:
     _instance = None
+    _lock = threading.Lock()
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(SupabaseManager, cls).__new__(cls)
-            cls._instance._init_client()
+        # Criado na primeira necessidade (ou por aquecer()), nunca no import;
+        # quem chegar durante a criação espera por ela em vez de criar outro
+        with cls._lock:
+            if cls._instance is None:
+                instancia = super(SupabaseManager, cls).__new__(cls)
+                instancia._init_client()
+                cls._instance = instancia
         return cls._instance
 
     def _init_client(self):
+        # O SDK do Supabase (httpx, postgrest, gotrue...) é o import mais caro do
+        # agente: só é carregado aqui
+        from dotenv import load_dotenv
+        from supabase import create_client
+
+        # Carrega variáveis de ambiente do arquivo .env (se existir)
+        load_dotenv()
         url = os.environ.get("SUPABASE_URL")
         key = os.environ.get("SUPABASE_SERVICE_KEY") or os.environ.get("SUPABASE_KEY")
         
@@ -24,15 +36,23 @@ class SupabaseManager:
             self.client = None
         else:
             try:
-                self.client: Client = create_client(url, key)
-                print("[OK] Conexao com Supabase inicializada.")
+                self.client: "Client" = create_client(url, key)
             except Exception as e:
                 print(f"[ERRO] ao conectar Supabase: {e}")
                 self.client = None
 
-    def get_client(self) -> Client:
+    def get_client(self) -> "Client":
         return self.client
 
 # Singleton Usage
-def get_supabase() -> Client:
+def get_supabase() -> "Client":
     return SupabaseManager().get_client()
+
+def aquecer() -> threading.Thread:
+    """
+    Cria o cliente numa thread de background. Um get_supabase() feito antes
+    de ela terminar espera pela mesma criação.
+    """
+    thread = threading.Thread(target=SupabaseManager, name="supabase-init", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,149 @@
+import time
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+# TTL (s) por ferramenta; as que não estão aqui usam TTL_PADRAO
+TTL_FERRAMENTAS = {
+    "get_vendas_resumo": 60,
+    "get_top_produtos": 300,
+    "check_stock": 15,
+    "get_curva_abc": 300,
+    "get_vendas_por_hora": 300,
+    "get_vendas_peso_unidade": 300,
+    "get_margens": 300,
+    "get_previsao_estoque": 60,
+}
+TTL_PADRAO = 30
+TAMANHO_MAXIMO = 256
+
+def _normalizar(valor):
+    # As ferramentas ignoram caixa e espaços extras nos textos, então a chave também
+    if isinstance(valor, str):
+        return " ".join(valor.lower().split())
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+def _deve_guardar(resultado):
+    # Mensagens de erro das ferramentas não são guardadas: a próxima chamada tenta de novo
+    return not (isinstance(resultado, str) and resultado.startswith("Erro"))
+
+class ToolCache:
+    """
+    Cache LRU com TTL para as ferramentas do agente (`TOOL_MAP`).
+
+    A chave é o nome da ferramenta mais os argumentos normalizados
+    ("Hoje " e "hoje" são a mesma consulta). Cada ferramenta tem seu TTL,
+    e o total de entradas é limitado a `tamanho_maximo` (sai a menos usada).
+
+    As vendas são gravadas por outro processo (o PDV), então o frescor vem
+    só do TTL: as ferramentas do agente apenas leem. `invalidar` descarta
+    as entradas de uma ou mais ferramentas, ex.: depois de uma correção
+    manual no banco.
+
+    O tempo economizado é estimado pela duração média das chamadas reais
+    de cada ferramenta.
+    """
+
+    def __init__(self, ttls=None, ttl_padrao=TTL_PADRAO, tamanho_maximo=TAMANHO_MAXIMO):
+        self.ttls = dict(TTL_FERRAMENTAS if ttls is None else ttls)
+        self.ttl_padrao = ttl_padrao
+        self.tamanho_maximo = tamanho_maximo
+        self._entradas = OrderedDict()  # (ferramenta, args) -> (expira_em, resultado)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _stats_de(self, nome):
+        if nome not in self._stats:
+            self._stats[nome] = {"acertos": 0, "faltas": 0, "tempo_real_ms": 0.0, "economizado_ms": 0.0}
+        return self._stats[nome]
+
+    def _obter(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return False, None
+            expira_em, resultado = entrada
+            if time.monotonic() >= expira_em:
+                del self._entradas[chave]
+                return False, None
+            self._entradas.move_to_end(chave)
+            stats = self._stats_de(chave[0])
+            stats["acertos"] += 1
+            chamadas = stats["faltas"]
+            if chamadas:
+                stats["economizado_ms"] += stats["tempo_real_ms"] / chamadas
+            return True, resultado
+
+    def _guardar(self, chave, resultado):
+        ttl = self.ttls.get(chave[0], self.ttl_padrao)
+        with self._lock:
+            self._entradas[chave] = (time.monotonic() + ttl, resultado)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+    def envolver(self, nome, funcao):
+        """
+        Retorna `funcao` com cache. `functools.wraps` preserva nome, docstring
+        e assinatura, que o SDK do Gemini usa para declarar a ferramenta.
+        """
+        assinatura = inspect.signature(funcao)
+
+        @functools.wraps(funcao)
+        def com_cache(*args, **kwargs):
+            ligados = assinatura.bind(*args, **kwargs)
+            ligados.apply_defaults()
+            chave = (nome, tuple((k, _normalizar(v)) for k, v in ligados.arguments.items()))
+
+            achou, resultado = self._obter(chave)
+            if achou:
+                return resultado
+
+            inicio = time.perf_counter()
+            resultado = funcao(*args, **kwargs)
+            decorrido = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                stats = self._stats_de(nome)
+                stats["faltas"] += 1
+                stats["tempo_real_ms"] += decorrido
+            if _deve_guardar(resultado):
+                self._guardar(chave, resultado)
+            return resultado
+
+        com_cache.cache = self
+        return com_cache
+
+    def invalidar(self, *ferramentas):
+        """Descarta as entradas das ferramentas informadas (todas, se nenhuma for passada)."""
+        with self._lock:
+            if not ferramentas:
+                self._entradas.clear()
+                return
+            for chave in [c for c in self._entradas if c[0] in ferramentas]:
+                del self._entradas[chave]
+
+    def estatisticas(self):
+        with self._lock:
+            por_ferramenta = {nome: dict(s) for nome, s in self._stats.items()}
+            entradas = len(self._entradas)
+        acertos = sum(s["acertos"] for s in por_ferramenta.values())
+        faltas = sum(s["faltas"] for s in por_ferramenta.values())
+        return {
+            "entradas": entradas,
+            "acertos": acertos,
+            "faltas": faltas,
+            "taxa_acerto": acertos / (acertos + faltas) if acertos + faltas else 0.0,
+            "economizado_ms": sum(s["economizado_ms"] for s in por_ferramenta.values()),
+            "por_ferramenta": por_ferramenta,
+        }
+
+_cache = None
+
+def get_tool_cache() -> ToolCache:
+    global _cache
+    if _cache is None:
+        _cache = ToolCache()
+    return _cache
@@ -1,55 +1,71 @@
 from datetime import datetime, timedelta
 from supabase_client import get_supabase
+import rollups
+from catalog_index import get_catalogo
+from tool_cache import get_tool_cache
+import sales_analytics
+import stock_forecast
+from stock_watcher import get_vigia, descrever
+import cash_reconciliation
 
 # --- FERRAMENTAS DE CONSULTA E AÇÃO ---
 
+def _intervalo_periodo(periodo: str):
+    """
+    Converte o período em dias (inicio, fim).
+    `fim` é exclusivo; None significa "até agora".
+    """
+    hoje = datetime.now().date()
+    dias = {"hoje": 0, "ontem": 1, "semana": 7, "mes": 30, "trimestre": 90, "ano": 365}
+    if periodo not in dias:
+        return None
+    inicio = hoje - timedelta(days=dias[periodo])
+    fim = hoje if periodo == "ontem" else None
+    return inicio, fim
+
+def _resumo_periodo(sb, inicio, fim):
+    """Lê dos rollups; sem eles (migration não aplicada), agrega as vendas no banco."""
+    try:
+        return rollups.resumo(inicio, fim, sb=sb)
+    except Exception as e:
+        print(f"[Aviso] Rollups indisponiveis ({e}). Usando resumo_vendas.")
+    return sb.rpc("resumo_vendas", {
+        "p_inicio": f"{inicio.isoformat()}T00:00:00",
+        "p_fim": f"{fim.isoformat()}T00:00:00" if fim else None,
+    }).execute().data
+
 def get_vendas_resumo(periodo: str = "hoje"):
     """
     Obtém um resumo das vendas para um determinado período.
     Args:
-        periodo: "hoje", "ontem", "semana", "mes"
+        periodo: "hoje", "ontem", "semana", "mes", "trimestre", "ano"
     """
     sb = get_supabase()
     if not sb:
         return "Erro: Falha na conexão com banco de dados."
 
-    now = datetime.now()
-    
-    if periodo == "hoje":
-        start_date = now.strftime("%Y-%m-%d")
-    elif periodo == "ontem":
-        start_date = (now - timedelta(days=1)).strftime("%Y-%m-%d")
-    elif periodo == "semana":
-        start_date = (now - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif periodo == "mes":
-        start_date = (now - timedelta(days=30)).strftime("%Y-%m-%d")
-    else:
-        return f"Período '{periodo}' desconhecido. Use hoje, ontem, semana ou mes."
+    periodo = periodo.strip().lower()
+    intervalo = _intervalo_periodo(periodo)
+    if intervalo is None:
+        return f"Período '{periodo}' desconhecido. Use hoje, ontem, semana, mes, trimestre ou ano."
+    inicio, fim = intervalo
 
     # Query no Supabase
     try:
-        # Busca vendas finalizadas no periodo
-        response = sb.table("vendas") \
-            .select("total, forma_pagamento, status") \
-            .eq("status", "finalizada") \
-            .gte("created_at", f"{start_date}T00:00:00") \
-            .execute()
-        
-        vendas = response.data
-        if not vendas:
-            return f"Nenhuma venda encontrada para o período: {periodo}."
+        # Totais já agregados (rollups diários): custo proporcional aos dias, não às vendas
+        resumo = _resumo_periodo(sb, inicio, fim)
 
-        total_valor = sum([v['total'] for v in vendas])
-        qtd_vendas = len(vendas)
-        ticket_medio = total_valor / qtd_vendas if qtd_vendas > 0 else 0
+        qtd_vendas = int(resumo['qtd_vendas']) if resumo else 0
+        if not qtd_vendas:
+            return f"Nenhuma venda encontrada para o período: {periodo}."
 
-        # Agrupamento por pagamento
-        pagamentos = {}
-        for v in vendas:
-            forma = v.get('forma_pagamento') or 'desconhecido'
-            pagamentos[forma] = pagamentos.get(forma, 0) + v['total']
+        total_valor = float(resumo['total'])
+        ticket_medio = float(resumo['ticket_medio'])
 
-        resumo_pag = ", ".join([f"{k}: R$ {v:.2f}" for k, v in pagamentos.items()])
+        resumo_pag = ", ".join(
+            f"{p['forma_pagamento']}: R$ {float(p['total']):.2f} ({p['qtd']})"
+            for p in resumo['por_pagamento']
+        )
 
         return (
             f"**Resumo de Vendas ({periodo})**\n"
@@ -62,6 +78,38 @@ def get_vendas_resumo(periodo: str = "hoje"):
     except Exception as e:
         return f"Erro ao consultar vendas: {str(e)}"
 
+def get_top_produtos(periodo: str = "semana", limite: int = 10):
+    """
+    Lista os produtos com maior faturamento no período.
+    Args:
+        periodo: "hoje", "ontem", "semana", "mes", "trimestre", "ano"
+        limite: quantidade de produtos no ranking
+    """
+    sb = get_supabase()
+    if not sb:
+        return "Erro: Falha na conexão com banco de dados."
+
+    periodo = periodo.strip().lower()
+    intervalo = _intervalo_periodo(periodo)
+    if intervalo is None:
+        return f"Período '{periodo}' desconhecido. Use hoje, ontem, semana, mes, trimestre ou ano."
+
+    try:
+        produtos = rollups.top_produtos(*intervalo, limite=int(limite), sb=sb)
+        if not produtos:
+            return f"Nenhuma venda encontrada para o período: {periodo}."
+
+        linhas = [f"**Produtos mais vendidos ({periodo})**"]
+        for i, p in enumerate(produtos, 1):
+            linhas.append(
+                f"{i}. {p.get('nome') or p['produto_id']}: R$ {float(p['total']):.2f}"
+                f" ({float(p['quantidade']):.3f} un/kg em {p['qtd_vendas']} vendas)"
+            )
+        return "\n".join(linhas)
+
+    except Exception as e:
+        return f"Erro ao consultar produtos vendidos: {str(e)}"
+
 def check_stock(produto_nome: str):
     """
     Verifica o estoque de um produto pelo nome ou código.
@@ -70,17 +118,11 @@ def check_stock(produto_nome: str):
     if not sb: return "Erro de conexão."
 
     try:
-        # Busca por nome (ilike) ou codigo de barras
-        # Supabase Python SDK não tem 'or' complexo fácil numa linha só as vezes, vamos tentar query direta ou filtro
-        # Vamos buscar por nome generico
-        response = sb.table("produtos") \
-            .select("nome, estoque_atual, preco_unidade, preco_kg, tipo_venda, codigo_barras") \
-            .ilike("nome", f"%{produto_nome}%") \
-            .eq("ativo", True) \
-            .limit(5) \
-            .execute()
-
-        produtos = response.data
+        # Índice local do catálogo: aceita código de barras, parte do nome e nomes
+        # sem acento ("maca" acha "Maçã Fuji"); só vai ao banco quando o TTL vence
+        catalogo = get_catalogo()
+        catalogo.atualizar(sb)
+        produtos = catalogo.buscar(produto_nome, limite=5)
         if not produtos:
             return f"Não encontrei nenhum produto com o nome '{produto_nome}'."
 
@@ -95,8 +137,266 @@ def check_stock(produto_nome: str):
     except Exception as e:
         return f"Erro ao buscar produto: {str(e)}"
 
+# --- ANÁLISES (sales_analytics.py: itens do período em arrays NumPy) ---
+
+def _dados_periodo(periodo: str):
+    """(periodo normalizado, DadosVendas) ou (None, mensagem de erro)."""
+    sb = get_supabase()
+    if not sb:
+        return None, "Erro: Falha na conexão com banco de dados."
+    periodo = periodo.strip().lower()
+    intervalo = _intervalo_periodo(periodo)
+    if intervalo is None:
+        return None, f"Período '{periodo}' desconhecido. Use hoje, ontem, semana, mes, trimestre ou ano."
+    return periodo, sales_analytics.obter_dados(sb, *intervalo)
+
+def get_curva_abc(periodo: str = "mes"):
+    """
+    Classifica os produtos na curva ABC (Pareto) pelo faturamento do período:
+    A = 80% da receita, B = os 15% seguintes, C = o restante.
+    Args:
+        periodo: "hoje", "ontem", "semana", "mes", "trimestre", "ano"
+    """
+    try:
+        periodo, dados = _dados_periodo(periodo)
+        if periodo is None:
+            return dados
+        curva = sales_analytics.curva_abc(dados)
+        if not curva:
+            return f"Nenhuma venda encontrada para o período: {periodo}."
+
+        linhas = [f"**Curva ABC ({periodo}, {len(curva)} produtos vendidos)**"]
+        for classe in "ABC":
+            produtos = [c for c in curva if c['classe'] == classe]
+            if not produtos:
+                continue
+            receita = sum(c['receita'] for c in produtos)
+            nomes = ", ".join(c['produto'] for c in produtos[:8])
+            if len(produtos) > 8:
+                nomes += f" e mais {len(produtos) - 8}"
+            linhas.append(f"- Classe {classe}: {len(produtos)} produtos, R$ {receita:.2f} ({nomes})")
+        return "\n".join(linhas)
+
+    except Exception as e:
+        return f"Erro ao calcular curva ABC: {str(e)}"
+
+def get_vendas_por_hora(periodo: str = "semana"):
+    """
+    Mostra o faturamento por hora do dia no período (horários de pico).
+    Args:
+        periodo: "hoje", "ontem", "semana", "mes", "trimestre", "ano"
+    """
+    try:
+        periodo, dados = _dados_periodo(periodo)
+        if periodo is None:
+            return dados
+        receita, itens = sales_analytics.receita_por_hora(dados)
+        total = receita.sum()
+        if not total:
+            return f"Nenhuma venda encontrada para o período: {periodo}."
+
+        linhas = [f"**Vendas por hora ({periodo})**"]
+        for hora in range(24):
+            if itens[hora]:
+                linhas.append(f"- {hora:02d}h: R$ {receita[hora]:.2f} ({receita[hora] / total:.0%}, {itens[hora]} itens)")
+        pico = int(receita.argmax())
+        linhas.append(f"Pico: {pico:02d}h")
+        return "\n".join(linhas)
+
+    except Exception as e:
+        return f"Erro ao consultar vendas por hora: {str(e)}"
+
+def get_vendas_peso_unidade(periodo: str = "mes"):
+    """
+    Compara as vendas de produtos a granel (por kg) com as de produtos por unidade.
+    Args:
+        periodo: "hoje", "ontem", "semana", "mes", "trimestre", "ano"
+    """
+    try:
+        periodo, dados = _dados_periodo(periodo)
+        if periodo is None:
+            return dados
+        r = sales_analytics.peso_vs_unidade(dados)
+        total = r['peso']['receita'] + r['unidade']['receita']
+        if not total:
+            return f"Nenhuma venda encontrada para o período: {periodo}."
+
+        return (
+            f"**Peso x Unidade ({periodo})**\n"
+            f"- Por kg: R$ {r['peso']['receita']:.2f} ({r['peso']['receita'] / total:.0%}), "
+            f"{r['peso']['quantidade']:.3f} kg em {r['peso']['itens']} itens\n"
+            f"- Por unidade: R$ {r['unidade']['receita']:.2f} ({r['unidade']['receita'] / total:.0%}), "
+            f"{r['unidade']['quantidade']:.0f} un em {r['unidade']['itens']} itens"
+        )
+
+    except Exception as e:
+        return f"Erro ao comparar peso e unidade: {str(e)}"
+
+def get_margens(periodo: str = "mes", limite: int = 10):
+    """
+    Estima a margem bruta do período (receita menos custo com quebra) e lista
+    os produtos de maior faturamento com sua margem.
+    Args:
+        periodo: "hoje", "ontem", "semana", "mes", "trimestre", "ano"
+        limite: quantidade de produtos listados
+    """
+    try:
+        periodo, dados = _dados_periodo(periodo)
+        if periodo is None:
+            return dados
+        produtos = sales_analytics.margens(dados)
+        if not produtos:
+            return f"Nenhuma venda encontrada para o período: {periodo}."
+
+        # Só entra no total quem tem custo cadastrado
+        com_custo = [p for p in produtos if p['custo'] == p['custo']]
+        receita = sum(p['receita'] for p in com_custo)
+        lucro = sum(p['lucro'] for p in com_custo)
+        linhas = [f"**Margens ({periodo})**"]
+        if receita:
+            linhas.append(f"- Margem bruta: R$ {lucro:.2f} ({lucro / receita:.1%} de R$ {receita:.2f})")
+        if len(com_custo) < len(produtos):
+            linhas.append(f"- {len(produtos) - len(com_custo)} produtos vendidos sem custo cadastrado")
+        for p in produtos[:int(limite)]:
+            margem = f"{p['margem']:.1%}" if p['custo'] == p['custo'] else "sem custo"
+            linhas.append(f"- {p['produto']}: R$ {p['receita']:.2f}, margem {margem}")
+        return "\n".join(linhas)
+
+    except Exception as e:
+        return f"Erro ao calcular margens: {str(e)}"
+
+def _linha_previsao(r):
+    p = r['produto']
+    unidade = 'kg' if p.get('tipo_venda') == 'peso' else 'un'
+    dias = r['dias_ate_ruptura']
+    if dias is None and not r['venda_diaria']:
+        acaba = "sem vendas recentes"
+    elif dias is None:
+        acaba = f"dura mais de {stock_forecast.HORIZONTE_DIAS} dias"
+    elif dias < 1:
+        acaba = "acaba hoje"
+    else:
+        acaba = f"acaba em ~{dias:.1f} dias"
+    pedido = f"pedir {r['sugestao_pedido']:.1f} {unidade}" if r['sugestao_pedido'] else "sem pedido"
+    return (f"- {p['nome']}: {r['estoque']:.1f} {unidade} em estoque, "
+            f"vende ~{r['venda_diaria']:.1f} {unidade}/dia, {acaba}; {pedido}")
+
+def get_previsao_estoque(produto_nome: str = "", dias: int = 3):
+    """
+    Prevê quando o estoque vai acabar (velocidade de venda e dia da semana das
+    últimas 8 semanas) e sugere a quantidade do próximo pedido.
+    Args:
+        produto_nome: produto a consultar; vazio lista os que acabam em até `dias` dias
+        dias: horizonte da lista de reposição
+    """
+    sb = get_supabase()
+    if not sb:
+        return "Erro: Falha na conexão com banco de dados."
+
+    try:
+        # Uma passada no catálogo inteiro; o histórico agregado é recalculado uma vez por dia
+        previsao = stock_forecast.previsao_catalogo(sb)
+        if produto_nome.strip():
+            ids = {p['id'] for p in get_catalogo().buscar(produto_nome, limite=5)}
+            previsao = [r for r in previsao if r['produto']['id'] in ids]
+            if not previsao:
+                return f"Não encontrei nenhum produto com o nome '{produto_nome}'."
+            return "\n".join(_linha_previsao(r) for r in previsao)
+
+        dias = int(dias)
+        repor = [r for r in previsao
+                 if r['sugestao_pedido'] and r['dias_ate_ruptura'] is not None and r['dias_ate_ruptura'] <= dias]
+        if not repor:
+            return f"Nenhum produto deve acabar nos próximos {dias} dias."
+        linhas = [f"**Reposição ({len(repor)} produtos acabam em até {dias} dias)**"]
+        linhas += [_linha_previsao(r) for r in repor]
+        return "\n".join(linhas)
+
+    except Exception as e:
+        return f"Erro ao prever estoque: {str(e)}"
+
+def get_alertas_estoque(limite: int = 10):
+    """
+    Lista os produtos sem estoque ou abaixo do estoque mínimo agora, e os que
+    estão mais perto do mínimo.
+    Args:
+        limite: quantidade de produtos em cada lista
+    """
+    sb = get_supabase()
+    if not sb:
+        return "Erro: Falha na conexão com banco de dados."
+
+    try:
+        # O vigia observa o catálogo: esta atualização (incremental, com TTL) já alimenta os alertas
+        vigia = get_vigia()
+        get_catalogo().atualizar(sb)
+        limite = int(limite)
+        alertas = vigia.alertas()
+        linhas = [f"**Alertas de estoque ({len(alertas)})**"]
+        linhas += [f"- {descrever(a)}" for a in alertas[:limite]]
+        if len(alertas) > limite:
+            linhas.append(f"- e mais {len(alertas) - limite}")
+        if not alertas:
+            linhas.append("- Nenhum produto abaixo do mínimo.")
+
+        proximos = [p for p in vigia.mais_proximos(limite + len(alertas))
+                    if p['id'] not in {a['produto']['id'] for a in alertas}][:limite]
+        if proximos:
+            linhas.append("**Mais perto do mínimo**")
+            for p in proximos:
+                unidade = 'kg' if p.get('tipo_venda') == 'peso' else 'un'
+                linhas.append(f"- {p['nome']}: {float(p.get('estoque_atual') or 0):.1f} {unidade} "
+                              f"(mínimo {float(p.get('estoque_minimo') or 0):.1f})")
+        return "\n".join(linhas)
+
+    except Exception as e:
+        return f"Erro ao consultar alertas de estoque: {str(e)}"
+
+def get_saldo_caixa(caixa: str = ""):
+    """
+    Mostra quanto entrou em cada caixa aberto (dinheiro, pix, cartão), sangrias,
+    suprimentos e o dinheiro que deve estar na gaveta.
+    Args:
+        caixa: número do caixa (1 = aberto há mais tempo) ou início do id; vazio lista todos os abertos
+    """
+    sb = get_supabase()
+    if not sb:
+        return "Erro: Falha na conexão com banco de dados."
+
+    try:
+        # Saldos correntes em memória; a atualização só traz vendas/movimentações novas
+        conciliacao = cash_reconciliation.get_conciliacao()
+        conciliacao.atualizar(sb)
+        if caixa.strip():
+            turno = conciliacao.localizar(caixa)
+            if turno is None:
+                return f"Caixa '{caixa}' não encontrado. Há {len(conciliacao.abertos())} caixa(s) aberto(s)."
+            return cash_reconciliation.descrever(turno.resumo())
+
+        abertos = conciliacao.abertos()
+        if not abertos:
+            return "Nenhum caixa aberto."
+        return "\n".join(f"{i}. {cash_reconciliation.descrever(t.resumo())}" for i, t in enumerate(abertos, 1))
+
+    except Exception as e:
+        return f"Erro ao consultar caixas: {str(e)}"
+
 # Dicionário de Ferramentas disponíveis para o Agente (Mapping)
+# Cada ferramenta passa pelo cache (TTL por ferramenta, LRU); ver tool_cache.py
+_cache = get_tool_cache()
 TOOL_MAP = {
-    'get_vendas_resumo': get_vendas_resumo,
-    'check_stock': check_stock
+    nome: _cache.envolver(nome, funcao)
+    for nome, funcao in {
+        'get_vendas_resumo': get_vendas_resumo,
+        'get_top_produtos': get_top_produtos,
+        'check_stock': check_stock,
+        'get_curva_abc': get_curva_abc,
+        'get_vendas_por_hora': get_vendas_por_hora,
+        'get_vendas_peso_unidade': get_vendas_peso_unidade,
+        'get_margens': get_margens,
+        'get_previsao_estoque': get_previsao_estoque,
+    }.items()
 }
+# Respondidas da memória (stock_watcher.py, cash_reconciliation.py): sem cache
+TOOL_MAP['get_alertas_estoque'] = get_alertas_estoque
+TOOL_MAP['get_saldo_caixa'] = get_saldo_caixa
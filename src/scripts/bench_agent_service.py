@@ -0,0 +1,168 @@
+"""
+Load test: the multi-session agent service in api/index.py, with a stubbed model.
+
+    python bench_agent_service.py [--clients 32] [--sessions 400] [--messages 3]
+                                  [--latency-ms 80] [--workers 8] [--max-sessions 100]
+
+Starts the real handler on a local ThreadingHTTPServer, with the shared
+model replaced by a stub that answers after `latency-ms` (no Gemini call,
+no tools). `clients` threads open `sessions` chat sessions in total and
+send `messages` messages in each one, passing the session_id back like
+AgentChat would. Reports completed sessions per second, requests per
+second, p50 and p99 latency and the runtime counters (sessions created,
+evicted, timeouts). Exits with 1 if any request did not return 200.
+
+`--one-per-request` repeats the run building a new model per session
+(what a per-request agent would cost), for comparison.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import threading
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'api'))
+# No warm-up of a real model on import: the stub is installed below
+os.environ.pop("GEMINI_API_KEY", None)
+import index
+
+# The endpoint requires a bearer token; the bench uses the shared secret
+SECRET = "bench-secret"
+index.AGENT_API_SECRET = SECRET
+
+class StubChat:
+    """Just enough of a Gemini ChatSession for ProfessionalAgent and MemoriaConversa."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.history = []
+
+    def send_message(self, content, stream=False):
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+        texto = f"Resposta para: {content}"
+        parte = SimpleNamespace(text=texto, function_call=None, function_response=None)
+        self.history.append(SimpleNamespace(role="user", parts=[
+            SimpleNamespace(text=str(content), function_call=None, function_response=None)]))
+        self.history.append(SimpleNamespace(role="model", parts=[parte]))
+        return SimpleNamespace(parts=[parte], text=texto, usage_metadata=None)
+
+class StubModel:
+    def __init__(self, latency, build_seconds=0.0):
+        # A real GenerativeModel build (SDK configure, tool declarations) is not free
+        time.sleep(build_seconds)
+        self.latency = latency
+
+    def start_chat(self):
+        return StubChat(self.latency)
+
+class QuietHandler(index.handler):
+    def log_message(self, *args):
+        pass
+
+def percentile(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p), len(ordenados) - 1)]
+
+def run(opts, runtime):
+    index._runtime = runtime
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    latencias, erros = [], {}
+    completas = [0]
+    lock = threading.Lock()
+    proximas = iter(range(opts.sessions))
+
+    def cliente():
+        http = requests.Session()
+        http.headers["Authorization"] = f"Bearer {SECRET}"
+        while True:
+            with lock:
+                if next(proximas, None) is None:
+                    return
+            session_id = None
+            for m in range(opts.messages):
+                corpo = {"message": f"Pergunta {m}"}
+                if session_id:
+                    corpo["session_id"] = session_id
+                inicio = time.perf_counter()
+                resp = http.post(url, data=json.dumps(corpo), timeout=opts.timeout + 5)
+                ms = (time.perf_counter() - inicio) * 1000
+                with lock:
+                    if resp.status_code == 200:
+                        latencias.append(ms)
+                    else:
+                        erros[resp.status_code] = erros.get(resp.status_code, 0) + 1
+                if resp.status_code != 200:
+                    break
+                session_id = resp.json()["session_id"]
+            else:
+                with lock:
+                    completas[0] += 1
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=cliente) for _ in range(opts.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+    server.shutdown()
+
+    stats = runtime.stats_snapshot()
+    # Only sessions whose every message was answered count
+    print(f"  {completas[0] / total:8.1f} sessions/s  {len(latencias) / total:8.1f} requests/s  "
+          f"({completas[0]}/{opts.sessions} sessions, {len(latencias)} requests ok in {total:.2f} s)")
+    if latencias:
+        print(f"  latency p50 {statistics.median(latencias):.0f} ms  p99 {percentile(latencias, 0.99):.0f} ms  "
+              f"max {max(latencias):.0f} ms")
+    print(f"  errors by status: {erros or '-'}")
+    print(f"  runtime: {stats['created']} sessions created, {stats['evicted']} evicted, "
+          f"{stats['sessions']} in pool, {stats['timeouts']} timeouts, {stats['busy']} busy")
+    return sum(erros.values())
+
+class PerSessionModelRuntime(index.AgentRuntime):
+    """Baseline: every new session builds its own model, as one agent per request would."""
+
+    def _shared_clients(self, deadline):
+        model, tools = super()._shared_clients(deadline)
+        return self.model_factory(), tools
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--sessions", type=int, default=400)
+    parser.add_argument("--messages", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--build-ms", type=float, default=150, help="stub model build time")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-sessions", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--one-per-request", action="store_true")
+    opts = parser.parse_args()
+
+    fabrica = lambda: StubModel(opts.latency_ms / 1000, opts.build_ms / 1000)
+    config = dict(model_factory=fabrica, max_sessions=opts.max_sessions, workers=opts.workers,
+                  timeout=opts.timeout)
+    print(f"{opts.clients} clients, {opts.sessions} sessions x {opts.messages} messages, "
+          f"model {opts.latency_ms:g} ms, {opts.workers} workers, pool {opts.max_sessions}")
+    print("shared model:")
+    erros = run(opts, index.AgentRuntime(**config))
+    if opts.one_per_request:
+        print("model per session:")
+        erros += run(opts, PerSessionModelRuntime(**config))
+    if erros:
+        print(f"FAILED: {erros} requests did not return 200")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark: sales analytics over a year of line items, before (Python loops
+over the row dicts) and after (sales_analytics, NumPy columns).
+
+    python bench_analytics.py [itens]
+
+Generates a synthetic year of itens_venda (default 500k rows, ~1400 per day)
+over 1000 products and times the ABC curve, revenue by hour, weight vs unit
+and margins. Loading from Supabase is left out: both sides start from rows
+already in memory.
+"""
+import os
+import sys
+import time
+import random
+from datetime import date, datetime, timedelta, timezone
+from collections import defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+import numpy as np
+import sales_analytics as sa
+
+N_PRODUTOS = 1000
+INICIO = date(2025, 1, 1)
+
+def make_produtos():
+    rnd = random.Random(1)
+    produtos = []
+    for i in range(N_PRODUTOS):
+        peso = rnd.random() < 0.6
+        custo = round(rnd.uniform(1, 30), 2)
+        produtos.append({
+            "id": f"p{i}", "nome": f"Produto {i}", "tipo_venda": "peso" if peso else "unidade",
+            "preco_custo": custo if rnd.random() < 0.9 else None, "margem_perda": 10 if peso else 0,
+            "margem_lucro": 40, "preco_kg": custo * 1.6 if peso else None,
+            "preco_unidade": None if peso else custo * 1.5,
+        })
+    return produtos
+
+def make_itens(n, produtos):
+    rnd = random.Random(n)
+    # Poucos produtos concentram a maior parte das vendas (como na loja de verdade)
+    pesos = [1 / (i + 1) for i in range(len(produtos))]
+    escolhidos = rnd.choices(produtos, weights=pesos, k=n)
+    base = datetime(INICIO.year, INICIO.month, INICIO.day, 10, tzinfo=timezone.utc)
+    itens = []
+    for p in escolhidos:
+        quantidade = round(rnd.uniform(0.1, 3), 3) if p["tipo_venda"] == "peso" else rnd.randint(1, 5)
+        instante = base + timedelta(days=rnd.randrange(365), minutes=rnd.randrange(12 * 60))
+        itens.append({
+            "produto_id": p["id"], "quantidade": quantidade,
+            "subtotal": round(quantidade * (p["preco_kg"] or p["preco_unidade"]), 2),
+            "created_at": instante.isoformat(),
+        })
+    return itens
+
+def antes(itens, produtos):
+    """The same four analyses with dicts and loops."""
+    por_id = {p["id"]: p for p in produtos}
+    receita, quantidade = defaultdict(float), defaultdict(float)
+    por_hora = [0.0] * 24
+    tipos = {"peso": 0.0, "unidade": 0.0}
+    for item in itens:
+        receita[item["produto_id"]] += item["subtotal"]
+        quantidade[item["produto_id"]] += item["quantidade"]
+        hora = (datetime.fromisoformat(item["created_at"]) + timedelta(hours=sa.FUSO_HORAS)).hour
+        por_hora[hora] += item["subtotal"]
+        tipos[por_id[item["produto_id"]]["tipo_venda"]] += item["subtotal"]
+    total = sum(receita.values())
+    acumulado, curva = 0.0, []
+    for pid, valor in sorted(receita.items(), key=lambda kv: -kv[1]):
+        classe = "A" if acumulado / total < 0.8 else "B" if acumulado / total < 0.95 else "C"
+        acumulado += valor
+        curva.append((pid, classe))
+    margens = {pid: receita[pid] - quantidade[pid] * sa._custo_unitario(por_id[pid]) for pid in receita}
+    return curva, por_hora, tipos, margens
+
+def depois(itens, produtos):
+    dados = sa.DadosVendas(
+        produtos,
+        [i["produto_id"] for i in itens],
+        [i["quantidade"] for i in itens],
+        [i["subtotal"] for i in itens],
+        sa._instantes([i["created_at"] for i in itens]),
+        INICIO, None,
+    )
+    colunas = time.perf_counter()
+    resultado = (sa.curva_abc(dados), sa.receita_por_hora(dados),
+                 sa.peso_vs_unidade(dados), sa.margens(dados))
+    return dados, resultado, time.perf_counter() - colunas
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    produtos = make_produtos()
+    itens = make_itens(n, produtos)
+    print(f"{n} itens, {N_PRODUTOS} produtos, 365 dias")
+
+    start = time.perf_counter()
+    curva_antes, hora_antes, tipos_antes, _ = antes(itens, produtos)
+    t_antes = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dados, (curva, (receita_hora, _), tipos, _), t_analises = depois(itens, produtos)
+    t_depois = time.perf_counter() - start
+
+    assert [c["produto"] for c in curva] == [f"Produto {pid[1:]}" for pid, _ in curva_antes]
+    assert [c["classe"] for c in curva] == [classe for _, classe in curva_antes]
+    assert np.allclose(receita_hora, hora_antes)
+    assert abs(tipos["peso"]["receita"] - tipos_antes["peso"]) < 1e-3 * tipos_antes["peso"]
+
+    print(f"{'':>24} {'ms':>10}")
+    print(f"{'antes (loops)':>24} {t_antes * 1000:>10.0f}")
+    print(f"{'depois (colunas+analises)':>24} {t_depois * 1000:>10.0f}")
+    print(f"{'so as 4 analises':>24} {t_analises * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
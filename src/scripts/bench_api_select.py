@@ -0,0 +1,101 @@
+"""
+Benchmark: api/index.py Supabase reads, before and after the shared session
+and the read-through cache.
+
+    python bench_api_select.py [requests] [threads]
+
+Starts a local HTTP/1.1 stand-in for PostgREST that serves a 300-row,
+gzip-compressed catalog with an ETag and answers If-None-Match with 304.
+The same hot read (limit=500) is done `requests` times:
+
+  before   requests.get per call (new connection, headers rebuilt)
+  session  supabase_select over the shared keep-alive session
+  cache    the same with cache_ttl=0.005 s: served from memory, with an
+           ETag revalidation (304, no body) whenever the entry expires
+
+and the number of requests that reached the server is reported for each.
+The server is local plain HTTP: against Supabase the TLS handshake and the
+network round trip make the difference larger.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'api'))
+os.environ.pop("GEMINI_API_KEY", None)
+import index
+
+CATALOGO = json.dumps([{"id": i, "nome": f"Produto {i}", "preco_kg": 9.9, "estoque_atual": 12.5,
+                        "ativo": True} for i in range(300)]).encode()
+CATALOGO_GZ = gzip.compress(CATALOGO)
+ETAG = '"' + hashlib.md5(CATALOGO).hexdigest() + '"'
+
+class PostgrestStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    hits = 0
+
+    def do_GET(self):
+        PostgrestStandIn.hits += 1
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        gz = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        body = CATALOGO_GZ if gz else CATALOGO
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", ETAG)
+        if gz:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def before(url, key):
+    """The old supabase_select: URL built by hand and a bare requests.get."""
+    headers = {"apikey": key, "Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+    resp = requests.get(f"{url}/rest/v1/produtos?select=*&ativo=eq.true&limit=500", headers=headers)
+    return resp.json()
+
+def run(nome, one, n, threads):
+    PostgrestStandIn.hits = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(lambda _: one(), range(n)))
+    total = time.perf_counter() - start
+    print(f"{nome:<8} {n / total:9.0f} reads/s  {PostgrestStandIn.hits:6d} server requests")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PostgrestStandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    index.SUPABASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    index.SUPABASE_KEY = "bench"
+
+    filtros = {"ativo": "eq.true"}
+    print(f"{n} reads of a {len(CATALOGO) // 1024} KB catalog ({len(CATALOGO_GZ) // 1024} KB gzip), {threads} threads")
+    run("before", lambda: before(index.SUPABASE_URL, index.SUPABASE_KEY), n, threads)
+    run("session", lambda: index.supabase_select("produtos", "*", filtros, limit=500, cache_ttl=0), n, threads)
+    run("cache", lambda: index.supabase_select("produtos", "*", filtros, limit=500, cache_ttl=0.005), n, threads)
+    print(f"cache: {index.select_cache.stats_snapshot()}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: product lookup, before (linear ilike-style scan) and after (CatalogoProdutos).
+
+    python bench_catalog.py [buscas]
+
+Builds catalogs of 10k and 100k synthetic products (the generate_sql.py
+produce names with variants) and times index build, barcode, name and partial lookups.
+The "before" column scans every name in memory, which is a lower bound for
+the old ilike query (it leaves out the network round trip).
+"""
+import os
+import ast
+import sys
+import time
+import random
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+from catalog_index import CatalogoProdutos, normalizar
+
+SIZES = [10_000, 100_000]
+
+def produce_names():
+    """The 106 produce names from generate_sql.py (read without running the script)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'generate_sql.py')
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], 'id', None) == 'items':
+            return ast.literal_eval(node.value)
+    raise RuntimeError("items not found in generate_sql.py")
+
+BASE = produce_names()
+VARIANTES = ["Orgânico", "Bandeja", "Granel", "Selecionado", "Extra", "Miúdo", "Graúdo", "Importado"]
+QUERIES = ["maca", "limao taiti", "pessego", "tomate ital", "brocolis", "morngo", "ceja"]
+
+def make_produtos(n):
+    rnd = random.Random(n)
+    return [{
+        "id": f"p{i}",
+        "nome": f"{BASE[i % len(BASE)]} {rnd.choice(VARIANTES)} {i}",
+        "codigo_barras": f"789{i:010d}",
+        "ativo": True,
+        "updated_at": "2026-02-10T12:00:00+00:00",
+    } for i in range(n)]
+
+def scan(produtos, termo):
+    consulta = normalizar(termo)
+    return [p for p in produtos if consulta in normalizar(p["nome"])][:5]
+
+def timeit(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps * 1e6
+
+def main():
+    reps = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for n in SIZES:
+        produtos = make_produtos(n)
+        catalogo = CatalogoProdutos()
+        start = time.perf_counter()
+        catalogo.aplicar(produtos, substituir=True)
+        print(f"\n{n} produtos: indice montado em {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        codigo = produtos[n // 2]["codigo_barras"]
+        assert catalogo.buscar(codigo)[0]["codigo_barras"] == codigo
+        print(f"{'busca':>14} {'antes (us)':>12} {'depois (us)':>12}")
+        after = timeit(lambda: catalogo.buscar(codigo), reps)
+        before = timeit(lambda: [p for p in produtos if p["codigo_barras"] == codigo], max(1, reps // 20))
+        print(f"{'cod. barras':>14} {before:>12.1f} {after:>12.1f}")
+        for termo in QUERIES:
+            after = timeit(lambda: catalogo.buscar(termo), reps)
+            before = timeit(lambda: scan(produtos, termo), max(1, reps // 100))
+            print(f"{termo:>14} {before:>12.1f} {after:>12.1f}")
+
+        # Atualização incremental: 100 produtos renomeados
+        alterados = [dict(p, nome=p["nome"] + " Promo", updated_at="2026-02-10T12:05:00+00:00")
+                     for p in produtos[:100]]
+        start = time.perf_counter()
+        catalogo.aplicar(alterados)
+        print(f"100 produtos alterados reindexados em {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
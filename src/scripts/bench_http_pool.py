@@ -0,0 +1,93 @@
+"""
+Microbenchmark: SupabaseClient with keep-alive pool vs one urlopen per request.
+
+Starts a local HTTP/1.1 server that mimics PostgREST (/rest/v1/vendas) and
+measures requests per second for both transports.
+
+    python bench_http_pool.py [requests] [threads]
+
+The local server is plain HTTP, so these numbers cover only the TCP
+handshake saved. Against Supabase (HTTPS) the gain is larger, because
+each new connection also pays a TLS handshake.
+"""
+import sys
+import json
+import time
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from printer_service import SupabaseClient
+
+PAYLOAD = json.dumps([{"id": i, "numero_venda": i, "total": 10.5} for i in range(5)]).encode()
+
+class PostgrestStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    do_GET = _reply
+    do_PATCH = _reply
+
+    def log_message(self, *args):
+        pass
+
+class UrlopenClient:
+    """Transport before the pool: a new connection per request."""
+
+    def __init__(self, url, key):
+        self.url = url
+        self.headers = {"apikey": key, "Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+
+    def _request(self, method, endpoint, data=None):
+        body = json.dumps(data).encode('utf-8') if data else None
+        req = urllib.request.Request(f"{self.url}/rest/v1{endpoint}", data=body,
+                                     headers=self.headers, method=method)
+        with urllib.request.urlopen(req) as response:
+            return json.loads(response.read())
+
+def run(client, n, threads):
+    def one(i):
+        if i % 2:
+            return client._request("PATCH", f"/vendas?id=eq.{i}", {"cupom_impresso": True})
+        return client._request("GET", "/vendas?select=*&cupom_impresso=is.false&limit=5")
+
+    start = time.perf_counter()
+    if threads == 1:
+        for i in range(n):
+            one(i)
+    else:
+        with ThreadPoolExecutor(threads) as ex:
+            list(ex.map(one, range(n)))
+    return n / (time.perf_counter() - start)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PostgrestStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    before = run(UrlopenClient(url, "bench"), n, threads)
+    pooled = SupabaseClient(url, "bench", pool_size=max(threads, 1))
+    after = run(pooled, n, threads)
+    server.shutdown()
+
+    print(f"{n} requests, {threads} thread(s)")
+    print(f"  urlopen per request : {before:8.0f} req/s")
+    print(f"  keep-alive pool     : {after:8.0f} req/s  ({after / before:.1f}x)")
+    print(f"  pool stats          : {pooled.pool.stats}")
+
+if __name__ == "__main__":
+    main()
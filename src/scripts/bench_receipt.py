@@ -0,0 +1,95 @@
+"""
+Benchmark: receipt rendering, before (bytes += per line) and after (ReceiptRenderer).
+
+    python bench_receipt.py [repeticoes]
+
+Renders sales with 5 to 500 items, checks both outputs match byte for byte,
+and prints the time per receipt.
+"""
+import sys
+import time
+from datetime import datetime
+
+from printer_service import EscPosPrinter, ReceiptRenderer
+
+SIZES = [5, 20, 50, 100, 200, 500]
+NOW = datetime(2026, 2, 10, 12, 30, 0)
+
+class LegacyEscPosPrinter(EscPosPrinter):
+    """generate_receipt as it was before ReceiptRenderer (immutable bytes +=)."""
+
+    def text(self, txt):
+        self.buffer += txt.encode('cp850', errors='replace')
+
+    def generate_receipt(self, venda):
+        self.buffer = b''
+        self.buffer += self.INIT
+        self.buffer += self.ALIGN_CENTER + self.BOLD_ON + self.SIZE_LARGE
+        self.text_ln("HORTIFRUTI BOM PRECO")
+        self.buffer += self.SIZE_NORMAL + self.BOLD_OFF
+        self.text_ln("Salto de Pirapora, SP")
+        self.text_ln(f"Data: {NOW.strftime('%d/%m/%Y %H:%M:%S')}")
+        self.text_ln(f"Venda: #{venda.get('numero_venda', '???')}")
+        self.separator()
+        self.buffer += self.ALIGN_LEFT
+        self.text_ln(f"{'ITEM':<20} {'QTD':<5} {'UN':<8} {'TOTAL':>10}")
+        self.separator()
+        for item in venda.get('itens_venda', []):
+            nome = item.get('produtos', {}).get('nome', 'Item')[:20]
+            qtd = float(item.get('quantidade', 0))
+            preco = float(item.get('preco_unitario', 0))
+            subtotal = float(item.get('subtotal', 0))
+            self.text_ln(f"{nome}")
+            line = f"   {qtd:.3f} x {self.format_money(preco):<8} = {self.format_money(subtotal)}"
+            self.buffer += self.ALIGN_RIGHT
+            self.text_ln(line)
+        self.separator()
+        self.buffer += self.BOLD_ON + self.SIZE_LARGE
+        total = float(venda.get('total', 0))
+        forma = venda.get('forma_pagamento', 'Dinheiro')
+        self.text_ln(f"TOTAL: {self.format_money(total)}")
+        self.buffer += self.SIZE_NORMAL + self.BOLD_OFF
+        self.text_ln(f"Pagamento: {forma.upper()}")
+        self.padding(2)
+        self.buffer += self.ALIGN_CENTER
+        self.text_ln("Nao e documento fiscal")
+        self.text_ln("Agradecemos a preferencia!")
+        self.padding(4)
+        self.buffer += self.CUT
+        return self.buffer
+
+def make_venda(n):
+    nomes = ["Banana Prata", "Maçã Fuji", "Limão Taiti", "Tomate Italiano", "Pêssego"]
+    itens = [{
+        "quantidade": 1.234 + i % 3,
+        "preco_unitario": 7.99,
+        "subtotal": (1.234 + i % 3) * 7.99,
+        "produtos": {"nome": nomes[i % len(nomes)]},
+    } for i in range(n)]
+    return {"numero_venda": 1234, "total": sum(i["subtotal"] for i in itens),
+            "forma_pagamento": "pix", "itens_venda": itens}
+
+def timeit(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps * 1e6
+
+def main():
+    reps = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    legacy = LegacyEscPosPrinter()
+    renderer = ReceiptRenderer()
+
+    print(f"{'itens':>6} {'antes (us)':>12} {'depois (us)':>12} {'ganho':>7} {'bytes':>8}")
+    for n in SIZES:
+        venda = make_venda(n)
+        expected = legacy.generate_receipt(venda)
+        got = renderer.render(venda, now=NOW)
+        assert got == expected, f"saida diferente para {n} itens"
+
+        before = timeit(lambda: legacy.generate_receipt(venda), reps)
+        after = timeit(lambda: renderer.render(venda, now=NOW), reps)
+        print(f"{n:>6} {before:>12.1f} {after:>12.1f} {before / after:>6.1f}x {len(got):>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: cold start of the Python entry points, as a regression metric.
+
+    python bench_startup.py [--runs N] [--save baseline.json] [--baseline baseline.json] [--tolerance 0.25]
+
+Each target runs in a fresh interpreter under `python -X importtime`:
+
+  import main      what `python main.py` pays before the prompt
+  import agent     the agent module (now imported in a background thread)
+  detect           `pos_hardware.py detect --simulate`
+  prompt           `main.py` wall time until "[Voce]" is printed
+
+For each target it reports the median wall time over N runs, the import
+time summed from the importtime tree, the heaviest top-level imports and
+which heavy SDKs got loaded. `detect` and `import main` must not load the
+Supabase SDK, Gemini or escpos: that is checked on every run and fails the
+script, as does any median slower than the baseline by more than the
+tolerance.
+
+Targets whose dependencies are not installed are reported and skipped.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python')
+
+# Packages that dominate the import time and that each target may or may not load
+HEAVY = ("supabase", "google.generativeai", "numpy", "escpos", "PIL", "httpx")
+
+TARGETS = {
+    "import main": {"args": ["-c", "import main"], "module": "main", "forbidden": ("supabase", "google.generativeai", "escpos")},
+    "import agent": {"args": ["-c", "import agent"], "module": "agent", "forbidden": ()},
+    "detect": {"args": ["pos_hardware.py", "detect", "--simulate"], "forbidden": ("supabase", "numpy", "escpos")},
+}
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from the -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+    return rows
+
+def direct_imports(rows, module=None):
+    """Imports made by the target: top-level ones for a script, the children of `module` otherwise."""
+    if module is None:
+        return [(m, cum) for m, _, cum, depth in rows if depth == 0]
+    filhos = []
+    for m, _, cum, depth in rows:
+        # -X importtime lists children before their parent
+        if depth == 0:
+            if m == module:
+                return filhos
+            filhos = []
+        elif depth == 1:
+            filhos.append((m, cum))
+    return []
+
+def run_importtime(args):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    inicio = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=PYTHON_DIR, env=env,
+                          capture_output=True, text=True, timeout=120)
+    wall_ms = (time.perf_counter() - inicio) * 1000
+    return proc, wall_ms
+
+def measure_prompt(timeout=60):
+    """Wall time (ms) from starting main.py until the input prompt shows up; None if it never does."""
+    env = dict(os.environ, PYTHONUNBUFFERED="1", TERM=os.environ.get("TERM", "dumb"))
+    inicio = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=PYTHON_DIR, env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    lido = b""
+    try:
+        while time.perf_counter() - inicio < timeout:
+            bloco = os.read(proc.stdout.fileno(), 4096)
+            if not bloco:
+                return None
+            lido += bloco
+            if b"[Voce]" in lido:
+                return (time.perf_counter() - inicio) * 1000
+        return None
+    finally:
+        try:
+            proc.stdin.write(b"sair\n")
+            proc.stdin.close()
+            proc.wait(timeout=5)
+        except Exception:
+            proc.kill()
+
+def bench_target(nome, spec, runs):
+    walls, imports, rows = [], [], []
+    for _ in range(runs):
+        proc, wall_ms = run_importtime(spec["args"])
+        rows = parse_importtime(proc.stderr)
+        if proc.returncode != 0:
+            saida = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+            return {"erro": (saida or [f"exit code {proc.returncode}"])[-1]}
+        walls.append(wall_ms)
+        imports.append(sum(cum for _, _, cum, depth in rows if depth == 0) / 1000)
+
+    carregados = {m for m, _, _, _ in rows}
+    pesados = [h for h in HEAVY if h in carregados]
+    topo = sorted(((cum, m) for m, cum in direct_imports(rows, spec.get("module"))), reverse=True)[:5]
+    return {
+        "wall_ms": statistics.median(walls),
+        "import_ms": statistics.median(imports),
+        "modulos": len(rows),
+        "pesados": pesados,
+        "proibidos": [h for h in spec["forbidden"] if h in carregados],
+        "topo": [(m, cum / 1000) for cum, m in topo],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save", help="write the medians to this JSON file")
+    parser.add_argument("--baseline", help="compare against a JSON written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    opts = parser.parse_args()
+
+    resultados, falhas = {}, []
+    for nome, spec in TARGETS.items():
+        r = bench_target(nome, spec, opts.runs)
+        if "erro" in r:
+            print(f"{nome:<14} skipped: {r['erro']}")
+            continue
+        resultados[nome] = r["wall_ms"]
+        print(f"{nome:<14} wall {r['wall_ms']:7.1f} ms  imports {r['import_ms']:7.1f} ms  "
+              f"{r['modulos']:4d} modules  heavy: {', '.join(r['pesados']) or '-'}")
+        for modulo, ms in r["topo"]:
+            print(f"{'':<16}{modulo:<32}{ms:7.1f} ms")
+        if r["proibidos"]:
+            falhas.append(f"{nome} loaded {', '.join(r['proibidos'])}")
+
+    prompts = [p for p in (measure_prompt() for _ in range(opts.runs)) if p is not None]
+    if prompts:
+        resultados["prompt"] = statistics.median(prompts)
+        print(f"{'prompt':<14} wall {resultados['prompt']:7.1f} ms  (main.py until '[Voce]')")
+    else:
+        print(f"{'prompt':<14} skipped: main.py did not reach the prompt")
+
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            base = json.load(f)
+        for nome, ms in resultados.items():
+            if nome in base and ms > base[nome] * (1 + opts.tolerance):
+                falhas.append(f"{nome}: {ms:.1f} ms vs baseline {base[nome]:.1f} ms")
+    if opts.save:
+        with open(opts.save, "w") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"Saved to {opts.save}")
+
+    for falha in falhas:
+        print(f"REGRESSION: {falha}")
+    sys.exit(1 if falhas else 0)
+
+if __name__ == "__main__":
+    main()
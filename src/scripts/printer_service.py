@@ -1,65 +1,247 @@
 
 import os
+import sys
 import json
+import time
 import ssl
-import urllib.request
+import socket
+import queue
+import select
+import threading
+import http.client
 import urllib.parse
+from concurrent.futures import Future
 from datetime import datetime
 
+# Shared ESC/POS image cache (src/python/raster_cache.py); receipts print without images if missing
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+try:
+    from raster_cache import get_raster_cache
+except ImportError:
+    get_raster_cache = None
+
 # ==========================================
 # CONFIGURATION
 # ==========================================
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://juhiiwsxrzhxprgbpeia.supabase.co")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "") # Use Service Role for backend scripts
 
+# HTTP keep-alive pool
+HTTP_POOL_SIZE = int(os.environ.get("SUPABASE_POOL_SIZE", "4"))
+HTTP_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "10"))
+
 # Printer Config (Change as needed)
 PRINTER_IP = "192.168.1.200" # Network Printer
 PRINTER_PORT = 9100
+# Several network printers, each with its own queue: "balcao=192.168.1.200,cozinha=192.168.1.201:9100"
+PRINTERS = os.environ.get("PRINTERS", "")
+PRINTER_TIMEOUT = float(os.environ.get("PRINTER_TIMEOUT", "5"))
+PRINTER_QUEUE_SIZE = int(os.environ.get("PRINTER_QUEUE_SIZE", "100"))
+PRINTER_HEALTH_INTERVAL = float(os.environ.get("PRINTER_HEALTH_INTERVAL", "30"))
+# Receipt logo (PNG/JPG) and paper width in mm (58 or 80)
+PRINT_LOGO = os.environ.get("PRINT_LOGO")
+PRINT_PAPER_MM = int(os.environ.get("PRINT_PAPER_MM", "80"))
+
+# Daemon mode: page size and adaptive polling bounds (seconds)
+PAGE_SIZE = int(os.environ.get("PRINT_PAGE_SIZE", "50"))
+POLL_MIN_INTERVAL = float(os.environ.get("PRINT_POLL_MIN", "0.5"))
+POLL_MAX_INTERVAL = float(os.environ.get("PRINT_POLL_MAX", "15"))
+STATS_INTERVAL = float(os.environ.get("PRINT_STATS_INTERVAL", "60"))
+
+# Lease-based claiming: each worker gets disjoint batches; crashed workers' leases expire
+WORKER_ID = os.environ.get("PRINT_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_SECONDS = int(os.environ.get("PRINT_LEASE_SECONDS", "120"))
 
 # ==========================================
 # 1. SUPABASE CLIENT (Standard Lib)
 # ==========================================
+class HTTPConnectionPool:
+    """
+    Keep-alive connection pool for a single host (http.client only).
+    Connections are reused across requests, so polling and acknowledgements
+    don't pay a TCP+TLS handshake every time.
+    """
+
+    def __init__(self, base_url: str, maxsize: int = HTTP_POOL_SIZE,
+                 timeout: float = HTTP_TIMEOUT, ssl_context=None):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self._idle = queue.LifoQueue(maxsize=maxsize)
+        # Caps concurrent connections; extra callers wait for a free one
+        self._slots = threading.BoundedSemaphore(maxsize)
+        self.stats = {"connections_opened": 0, "requests": 0, "reused": 0, "retries": 0}
+
+    def _new_connection(self):
+        self.stats["connections_opened"] += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _checkout(self):
+        try:
+            conn = self._idle.get_nowait()
+            self.stats["reused"] += 1
+            return conn
+        except queue.Empty:
+            return self._new_connection()
+
+    def _checkin(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method: str, path: str, body: bytes = None, headers: dict = None):
+        """Returns (status, headers, body). Retries once on a stale keep-alive connection."""
+        self._slots.acquire()
+        try:
+            self.stats["requests"] += 1
+            for attempt in range(2):
+                conn = self._checkout()
+                try:
+                    conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                        ConnectionResetError, BrokenPipeError):
+                    # Server closed an idle connection; reconnect once
+                    conn.close()
+                    if attempt:
+                        raise
+                    self.stats["retries"] += 1
+                    continue
+                except Exception:
+                    conn.close()
+                    raise
+
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._checkin(conn)
+                return resp.status, resp.headers, data
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
 class SupabaseClient:
-    def __init__(self, url: str, key: str):
+    def __init__(self, url: str, key: str, pool_size: int = HTTP_POOL_SIZE, timeout: float = HTTP_TIMEOUT):
         self.url = url
         self.key = key
         self.headers = {
             "apikey": key,
             "Authorization": f"Bearer {key}",
             "Content-Type": "application/json",
-            "Prefer": "return=representation"
+            "Prefer": "return=representation",
+            "Connection": "keep-alive",
         }
         # SSL Context to avoid certification errors on some legacy OS
         self.ctx = ssl.create_default_context()
         self.ctx.check_hostname = False
         self.ctx.verify_mode = ssl.CERT_NONE
+        self.pool = HTTPConnectionPool(url, maxsize=pool_size, timeout=timeout, ssl_context=self.ctx)
+
+    def _send(self, method: str, endpoint: str, data: dict = None, extra_headers: dict = None):
+        """Returns (status, headers, parsed_body). Raises on connection errors."""
+        body = json.dumps(data).encode('utf-8') if data else None
+        headers = dict(self.headers, **extra_headers) if extra_headers else self.headers
+        status, resp_headers, resp_body = self.pool.request(
+            method, f"/rest/v1{endpoint}", body=body, headers=headers)
+        if not 200 <= status < 300:
+            print(f"Error {status}: {resp_body.decode(errors='replace')}")
+            return status, resp_headers, None
+        return status, resp_headers, (json.loads(resp_body) if resp_body else None)
 
     def _request(self, method: str, endpoint: str, data: dict = None):
         try:
-            full_url = f"{self.url}/rest/v1{endpoint}"
-            body = json.dumps(data).encode('utf-8') if data else None
-            
-            req = urllib.request.Request(full_url, data=body, headers=self.headers, method=method)
-            
-            with urllib.request.urlopen(req, context=self.ctx) as response:
-                if 200 <= response.status < 300:
-                    resp_body = response.read()
-                    return json.loads(resp_body) if resp_body else None
-                else:
-                    print(f"Error {response.status}: {response.read().decode()}")
-                    return None
+            return self._send(method, endpoint, data)[2]
         except Exception as e:
             print(f"Connection Error: {e}")
             return None
 
-    def get_vendas_abertas(self):
-        # Fetch sales that haven't printed cupom yet
-        # Uses 'eq' filter notation for PostgREST
-        query = "/vendas?select=*,itens_venda(*,produtos(nome))&cupom_impresso=is.false&status=eq.finalizada&limit=5"
-        return self._request("GET", query)
+    PENDING_FILTER = "cupom_impresso=is.false&status=eq.finalizada"
 
-    def mark_printed(self, venda_id):
-        return self._request("PATCH", f"/vendas?id=eq.{venda_id}", {"cupom_impresso": True})
+    def count_vendas_abertas(self):
+        """Queue depth via PostgREST exact count (Content-Range: 0-0/N)."""
+        try:
+            status, headers, _ = self._send(
+                "GET", f"/vendas?select=id&{self.PENDING_FILTER}&limit=1",
+                extra_headers={"Prefer": "count=exact"})
+        except Exception as e:
+            print(f"Connection Error: {e}")
+            return None
+        content_range = headers.get("Content-Range", "") if status < 300 else ""
+        total = content_range.rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else None
+
+    def claim_vendas(self, worker_id: str = WORKER_ID, limit: int = PAGE_SIZE,
+                     lease_seconds: int = LEASE_SECONDS):
+        """
+        Atomically claims up to `limit` unprinted sales for this worker
+        (RPC reivindicar_vendas_impressao, FOR UPDATE SKIP LOCKED).
+        Returns None on error.
+        """
+        return self._request("POST", "/rpc/reivindicar_vendas_impressao", {
+            "p_worker": worker_id,
+            "p_limite": limit,
+            "p_lease_segundos": lease_seconds,
+        })
+
+    def iter_claims(self, worker_id: str = WORKER_ID, page_size: int = PAGE_SIZE):
+        """Yields claimed batches until nothing is left to claim."""
+        while True:
+            batch = self.claim_vendas(worker_id, page_size)
+            if not batch:
+                return
+            yield batch
+            if len(batch) < page_size:
+                return
+
+    def _patch_own(self, venda_ids, worker_id, data) -> bool:
+        """PATCH only rows still leased by `worker_id` (a lease lost to expiry is left alone)."""
+        if not venda_ids:
+            return True
+        ids = ",".join(str(v) for v in venda_ids)
+        try:
+            status, _, _ = self._send(
+                "PATCH", f"/vendas?id=in.({ids})&impressao_worker=eq.{urllib.parse.quote(worker_id)}",
+                data, extra_headers={"Prefer": "return=minimal"})
+            return 200 <= status < 300
+        except Exception as e:
+            print(f"Connection Error: {e}")
+            return False
+
+    def ack_claimed(self, venda_ids, worker_id: str = WORKER_ID) -> bool:
+        # impressoras_ok is cleared so a sale flagged for reprint goes to every printer again
+        return self._patch_own(venda_ids, worker_id,
+                               {"cupom_impresso": True, "impressao_lease_ate": None, "impressoras_ok": []})
+
+    def release_claimed(self, progress, worker_id: str = WORKER_ID) -> bool:
+        """
+        Gives failed sales back to the pool right away instead of waiting for
+        the lease. `progress` maps venda id -> names of the printers that did
+        print it; they are saved in impressoras_ok so the retry skips them.
+        One PATCH per distinct set of printers.
+        """
+        groups = {}
+        for venda_id, done in progress.items():
+            groups.setdefault(tuple(sorted(done)), []).append(venda_id)
+        ok = True
+        for done, ids in groups.items():
+            ok &= self._patch_own(ids, worker_id,
+                                  {"impressoras_ok": list(done), "impressao_lease_ate": None})
+        return ok
 
 # ==========================================
 # 2. ESC/POS PRINTER LOGIC
@@ -82,10 +264,18 @@ class EscPosPrinter:
     SIZE_NORMAL = GS + b'!\x00'
     SIZE_LARGE = GS + b'!\x11'
 
-    def __init__(self, ip=None, port=9100):
+    def __init__(self, ip=None, port=9100, name=None):
         self.ip = ip
         self.port = port
-        self.buffer = b''
+        self.name = name or (f"{ip}:{port}" if ip else "arquivo")
+        self.buffer = bytearray()
+        self.renderer = ReceiptRenderer()
+        self.transport = NetworkPrinterTransport(ip, port) if self.is_network else None
+        self._queue = None
+
+    @property
+    def is_network(self) -> bool:
+        return bool(self.ip) and self.ip != "0.0.0.0"
 
     def text(self, txt: str):
         # Convert to CP850 (Western) or fallback to ascii
@@ -104,77 +294,494 @@ class EscPosPrinter:
         return f"R$ {float(val):.2f}".replace('.', ',')
 
     def generate_receipt(self, venda):
-        self.buffer = b''
-        self.buffer += self.INIT
-        
-        # HEADER
-        self.buffer += self.ALIGN_CENTER + self.BOLD_ON + self.SIZE_LARGE
-        self.text_ln("HORTIFRUTI BOM PRECO")
-        self.buffer += self.SIZE_NORMAL + self.BOLD_OFF
-        self.text_ln("Salto de Pirapora, SP")
-        self.text_ln(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
-        self.text_ln(f"Venda: #{venda.get('numero_venda', '???')}")
-        self.separator()
-
-        # BODY
-        self.buffer += self.ALIGN_LEFT
-        self.text_ln(f"{'ITEM':<20} {'QTD':<5} {'UN':<8} {'TOTAL':>10}")
-        self.separator()
-
-        itens = venda.get('itens_venda', [])
-        for item in itens:
-            nome = item.get('produtos', {}).get('nome', 'Item')[:20]
-            qtd = float(item.get('quantidade', 0))
-            preco = float(item.get('preco_unitario', 0))
-            subtotal = float(item.get('subtotal', 0))
-            
-            # Line 1: Name
-            self.text_ln(f"{nome}")
-            # Line 2: Values
-            line = f"   {qtd:.3f} x {self.format_money(preco):<8} = {self.format_money(subtotal)}"
-            self.buffer += self.ALIGN_RIGHT
-            self.text_ln(line)
-
-        # FOOTER
-        self.separator()
-        self.buffer += self.BOLD_ON + self.SIZE_LARGE
-        
-        total = float(venda.get('total', 0))
-        forma = venda.get('forma_pagamento', 'Dinheiro')
-        
-        self.text_ln(f"TOTAL: {self.format_money(total)}")
-        self.buffer += self.SIZE_NORMAL + self.BOLD_OFF
-        self.text_ln(f"Pagamento: {forma.upper()}")
-        
-        self.padding(2)
-        self.buffer += self.ALIGN_CENTER
-        self.text_ln("Nao e documento fiscal")
-        self.text_ln("Agradecemos a preferencia!")
-        self.padding(4)
-        
-        # CUT
-        self.buffer += self.CUT
-
-        return self.buffer
+        self.buffer = bytearray()
+        self.renderer.render_into(self.buffer, venda)
+        return bytes(self.buffer)
 
     def padding(self, lines):
         self.text('\n' * lines)
 
     def print_network(self, data):
-        import socket
+        """Sends `data` (bytes or a list of chunks from ReceiptRenderer.chunks) over the persistent connection."""
+        return self.transport.send(data)
+
+    def submit(self, data) -> Future:
+        """Queues `data` on this printer's own worker; the Future resolves to True if it printed."""
+        if self._queue is None:
+            self._queue = PrinterQueue(self.name, self.transport)
+        return self._queue.submit(data)
+
+    def report(self):
+        return self._queue.report() if self._queue else f"[{self.name}] sem fila"
+
+    def close(self):
+        if self._queue:
+            self._queue.close()
+        elif self.transport:
+            self.transport.close()
+
+class NetworkPrinterTransport:
+    """
+    Keeps one TCP connection (port 9100) open per network printer.
+
+    Before each write, bytes the printer sent on its own are drained and a
+    connection it closed while idle is detected and reopened. A failed write
+    reconnects and retries once. health_check() queries the real-time status
+    (DLE EOT 1) so a dead link is noticed while the printer is idle.
+    """
+    STATUS_QUERY = b'\x10\x04\x01' # DLE EOT 1: printer status
+    STATUS_OFFLINE = 0x08
+
+    def __init__(self, ip, port=PRINTER_PORT, timeout=PRINTER_TIMEOUT):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+        self.stats = {"connects": 0, "reconnects": 0, "send_errors": 0,
+                      "health_checks": 0, "health_failures": 0}
+
+    def _connect(self):
+        sock = socket.create_connection((self.ip, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.stats["connects"] += 1
+        self._sock = sock
+        return sock
+
+    def _is_stale(self, sock) -> bool:
+        """True if the printer closed the connection (pending status bytes are discarded)."""
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(5)
-                sock.connect((self.ip, self.port))
-                sock.sendall(data)
-                return True
-        except Exception as e:
-            print(f"Print Error: {e}")
+            while select.select([sock], [], [], 0)[0]:
+                if not sock.recv(1024):
+                    return True
+            return False
+        except OSError:
+            return True
+
+    def _socket(self):
+        if self._sock is not None and self._is_stale(self._sock):
+            self._close()
+            self.stats["reconnects"] += 1
+        return self._sock or self._connect()
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+
+    def send(self, data) -> bool:
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    sock = self._socket()
+                    if isinstance(data, (bytes, bytearray)):
+                        sock.sendall(data)
+                    else:
+                        send_chunks(sock, data)
+                    return True
+                except OSError as e:
+                    self.stats["send_errors"] += 1
+                    self._close()
+                    if attempt:
+                        print(f"Print Error ({self.ip}:{self.port}): {e}")
+                        return False
+                    self.stats["reconnects"] += 1
             return False
 
+    def health_check(self) -> bool:
+        """Opens the connection if needed and checks the printer reports itself online."""
+        with self._lock:
+            self.stats["health_checks"] += 1
+            try:
+                sock = self._socket()
+                sock.sendall(self.STATUS_QUERY)
+                status = sock.recv(1)
+                healthy = bool(status) and not status[0] & self.STATUS_OFFLINE
+            except OSError:
+                healthy = False
+            if not healthy:
+                self.stats["health_failures"] += 1
+                self._close()
+            return healthy
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+class PrinterQueue:
+    """
+    FIFO job queue with a dedicated worker thread for one printer, so
+    several printers (kitchen, front counter) print in parallel while each
+    keeps its receipts in order. When idle for `health_interval` seconds
+    the worker runs the transport health check.
+    """
+
+    def __init__(self, name, transport, maxsize=PRINTER_QUEUE_SIZE,
+                 health_interval=PRINTER_HEALTH_INTERVAL):
+        self.name = name
+        self.transport = transport
+        self.health_interval = health_interval
+        self._jobs = queue.Queue(maxsize=maxsize)
+        self.healthy = None
+        self.stats = {"jobs": 0, "printed": 0, "failed": 0,
+                      "latency_ms_total": 0.0, "latency_ms_max": 0.0, "send_ms_total": 0.0}
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._loop, name=f"printer-{name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, data) -> Future:
+        """Blocks while the queue is full (backpressure on the claim loop)."""
+        future = Future()
+        self._jobs.put((data, future, time.monotonic()))
+        return future
+
+    def _loop(self):
+        while True:
+            try:
+                job = self._jobs.get(timeout=self.health_interval)
+            except queue.Empty:
+                healthy = self.transport.health_check()
+                if healthy != self.healthy:
+                    print(f"[{self.name}] impressora {'online' if healthy else 'sem resposta'}")
+                self.healthy = healthy
+                continue
+            if job is None:
+                return
+
+            data, future, queued = job
+            started = time.monotonic()
+            try:
+                ok = self.transport.send(data)
+            except Exception as e:
+                # The future must always resolve, or drain() would wait on it forever
+                print(f"[{self.name}] erro inesperado ao imprimir: {e}")
+                ok = False
+            done = time.monotonic()
+            with self._lock:
+                self.stats["jobs"] += 1
+                self.stats["printed" if ok else "failed"] += 1
+                latency = (done - queued) * 1000
+                self.stats["latency_ms_total"] += latency
+                self.stats["latency_ms_max"] = max(self.stats["latency_ms_max"], latency)
+                self.stats["send_ms_total"] += (done - started) * 1000
+            future.set_result(ok)
+
+    def depth(self) -> int:
+        return self._jobs.qsize()
+
+    def report(self):
+        with self._lock:
+            s = dict(self.stats)
+        jobs = s["jobs"] or 1
+        return (f"[{self.name}] fila={self.depth()} impressos={s['printed']} falhas={s['failed']} "
+                f"latencia_media={s['latency_ms_total'] / jobs:.1f}ms "
+                f"latencia_max={s['latency_ms_max']:.1f}ms envio_medio={s['send_ms_total'] / jobs:.1f}ms "
+                f"reconexoes={self.transport.stats['reconnects']}")
+
+    def close(self, timeout=10):
+        """Finishes queued jobs, then closes the connection."""
+        self._jobs.put(None)
+        self._worker.join(timeout)
+        self.transport.close()
+
+class ReceiptRenderer:
+    """
+    Renders a sale into ESC/POS bytes without repeated bytes concatenation.
+
+    Static parts (header, separators, column titles, footer and commands)
+    are encoded once in __init__. Per sale, the variable text is joined as
+    a single str and encoded to cp850 in one call. ESC/POS commands are
+    plain ASCII, so they can be embedded in that str unchanged. The result
+    is a short list of byte chunks that can be joined once or sent
+    directly with sendmsg (scatter/gather, no intermediate copy).
+
+    The logo comes pre-rasterized from the shared RasterCache, so once
+    warm it is one more shared chunk. PIX QR codes differ per sale and
+    are rasterized on each receipt without being cached.
+    """
+    ENCODING = 'cp850'
+    WIDTH = 48 # 48 chars is standard for 80mm
+
+    def __init__(self, store_name="HORTIFRUTI BOM PRECO", store_city="Salto de Pirapora, SP",
+                 logo=PRINT_LOGO, paper_mm=PRINT_PAPER_MM):
+        P = EscPosPrinter
+        enc = self._encode
+        separator = enc("-" * self.WIDTH + "\n")
+        self.paper_mm = paper_mm
+        self._images = get_raster_cache() if get_raster_cache else None
+        self._header = (P.INIT + P.ALIGN_CENTER + self._logo(logo) + P.BOLD_ON + P.SIZE_LARGE
+                        + enc(store_name + "\n") + P.SIZE_NORMAL + P.BOLD_OFF
+                        + enc(store_city + "\n"))
+        self._columns = (separator + P.ALIGN_LEFT
+                         + enc(f"{'ITEM':<20} {'QTD':<5} {'UN':<8} {'TOTAL':>10}\n")
+                         + separator)
+        self._total_prefix = separator + P.BOLD_ON + P.SIZE_LARGE
+        self._footer = (enc("\n" * 2) + P.ALIGN_CENTER
+                        + enc("Nao e documento fiscal\nAgradecemos a preferencia!\n")
+                        + enc("\n" * 4) + P.CUT)
+        self._align_right = P.ALIGN_RIGHT.decode('ascii')
+        self._normal = (P.SIZE_NORMAL + P.BOLD_OFF).decode('ascii')
+        self._pix_prefix = P.ALIGN_CENTER + enc("Pague com PIX:\n")
+
+    def _logo(self, path) -> bytes:
+        if not path:
+            return b""
+        if not self._images:
+            print("Logo ignorado: raster_cache nao disponivel")
+            return b""
+        try:
+            return self._images.imagem(path, self.paper_mm)
+        except Exception as e:
+            print(f"Logo indisponivel ({path}): {e}")
+            return b""
+
+    def _pix(self, venda) -> bytes:
+        payload = venda.get('pix_copia_e_cola')
+        if not payload or not self._images:
+            return b""
+        try:
+            return self._images.qrcode(payload, self.paper_mm)
+        except Exception as e:
+            print(f"QR PIX indisponivel: {e}")
+            return b""
+
+    @classmethod
+    def _encode(cls, txt: str) -> bytes:
+        return txt.encode(cls.ENCODING, errors='replace')
+
+    @staticmethod
+    def _money(val: float) -> str:
+        return f"R$ {val:.2f}".replace('.', ',')
+
+    def _items(self, itens) -> bytes:
+        money = self._money
+        align_right = self._align_right
+        parts = []
+        append = parts.append
+        for item in itens:
+            # LEFT JOIN in reivindicar_vendas_impressao: produtos or nome may come back null
+            nome = ((item.get('produtos') or {}).get('nome') or 'Item')[:20]
+            qtd = float(item.get('quantidade') or 0)
+            preco = float(item.get('preco_unitario') or 0)
+            subtotal = float(item.get('subtotal') or 0)
+            append(f"{nome}\n{align_right}   {qtd:.3f} x {money(preco):<8} = {money(subtotal)}\n")
+        return self._encode("".join(parts))
+
+    def chunks(self, venda, now=None):
+        """Returns the receipt as a list of byte chunks (static ones are shared, not copied)."""
+        now = now or datetime.now()
+        total = float(venda.get('total') or 0)
+        forma = venda.get('forma_pagamento') or 'Dinheiro'
+        chunks = [
+            self._header,
+            self._encode(f"Data: {now.strftime('%d/%m/%Y %H:%M:%S')}\n"
+                         f"Venda: #{venda.get('numero_venda', '???')}\n"),
+            self._columns,
+            self._items(venda.get('itens_venda') or []),
+            self._total_prefix,
+            self._encode(f"TOTAL: {self._money(total)}\n{self._normal}Pagamento: {forma.upper()}\n"),
+        ]
+        pix = self._pix(venda)
+        if pix:
+            chunks += [self._pix_prefix, pix]
+        chunks.append(self._footer)
+        return chunks
+
+    def render(self, venda, now=None) -> bytes:
+        return b"".join(self.chunks(venda, now))
+
+    def render_into(self, buffer: bytearray, venda, now=None) -> bytearray:
+        """Appends the receipt to an existing growable buffer."""
+        for chunk in self.chunks(venda, now):
+            buffer += chunk
+        return buffer
+
+def send_chunks(sock, chunks):
+    """Writes chunks straight to the socket (sendmsg gather where available)."""
+    if hasattr(sock, "sendmsg"):
+        pending = [memoryview(c) for c in chunks if c]
+        while pending:
+            sent = sock.sendmsg(pending)
+            while pending and sent >= len(pending[0]):
+                sent -= len(pending[0])
+                pending.pop(0)
+            if sent:
+                pending[0] = pending[0][sent:]
+    else:
+        sock.sendall(b"".join(chunks))
+
 # ==========================================
 # 3. MAIN LOOP
 # ==========================================
+def save_receipt_file(printer, venda) -> bool:
+    # Generate Binary
+    cupom_data = printer.generate_receipt(venda)
+
+    # Save to file for testing/USB spooler pick-up
+    filename = f"cupom_{venda['id']}.bin"
+    with open(filename, "wb") as f:
+        f.write(cupom_data)
+    print(f"Cupom salvo em arquivo: {filename}")
+    return True # Assume success for local file
+
+def submit_venda(printers, venda):
+    """Queues the receipt on every printer; returns one Future (True if printed) per printer."""
+    print(f"Processando venda #{venda.get('numero_venda')}...")
+    futures = []
+    for printer in printers:
+        # Print (Simulated check if IP is set): chunks stream straight to the socket
+        if printer.is_network:
+            futures.append(printer.submit(printer.renderer.chunks(venda)))
+        else:
+            done = Future()
+            done.set_result(save_receipt_file(printer, venda))
+            futures.append(done)
+    return futures
+
+def print_venda(printer, venda) -> bool:
+    return all(f.result() for f in submit_venda([printer], venda))
+
+def parse_printers(spec: str = PRINTERS):
+    """'balcao=192.168.1.200,cozinha=192.168.1.201:9100' -> [EscPosPrinter, ...]"""
+    printers = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        name, _, addr = entry.rpartition("=")
+        ip, _, port = addr.partition(":")
+        printers.append(EscPosPrinter(ip=ip, port=int(port or PRINTER_PORT), name=name or None))
+    return printers or [EscPosPrinter(ip=PRINTER_IP, port=PRINTER_PORT)]
+
+class DaemonStats:
+    """Throughput and queue-depth counters for the long-running mode."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.printed = 0
+        self.failed = 0
+        self.ack_batches = 0
+        self.ack_failures = 0
+        self.polls = 0
+        self.errors = 0
+        self.queue_depth = None
+        self.interval = POLL_MIN_INTERVAL
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.printed / elapsed if elapsed else 0.0
+        return (f"[stats] impressos={self.printed} falhas={self.failed} "
+                f"vazao={rate * 60:.1f}/min fila={self.queue_depth} "
+                f"acks={self.ack_batches} acks_falhos={self.ack_failures} "
+                f"polls={self.polls} erros={self.errors} intervalo={self.interval:.1f}s")
+
+def drain(client, printers, stats=None, page_size=PAGE_SIZE, worker_id=WORKER_ID) -> int:
+    """
+    Claims and prints pending sales until none are left, acknowledging each
+    batch with one PATCH. Safe to run in several workers at once.
+    A whole page is queued before waiting, so each printer works through it
+    in parallel with the others. A sale is acked once every printer has
+    printed it; when only some did, they are recorded in impressoras_ok and
+    the retry goes to the remaining printers only, so no printer prints the
+    same receipt twice. A sale that cannot be rendered is logged and
+    released like a failed print; if anything else goes wrong mid-page,
+    the page's unacked sales are released before the error propagates.
+    Returns receipts printed.
+    """
+    printed_total = 0
+    for page in client.iter_claims(worker_id, page_size):
+        # venda id -> printers done; every claimed sale stays here until it is fully printed
+        progress = {venda['id']: set(venda.get('impressoras_ok') or ()) for venda in page}
+        printed_ids = []
+        try:
+            jobs = []
+            for venda in page:
+                done = progress[venda['id']]
+                pending = [p for p in printers if p.name not in done]
+                try:
+                    jobs.append((venda, pending, submit_venda(pending, venda)))
+                except Exception as e:
+                    print(f"Erro ao gerar cupom da venda #{venda.get('numero_venda')}: {e}")
+                    if stats:
+                        stats.failed += 1
+            for venda, pending, futures in jobs:
+                done = progress[venda['id']]
+                done |= {p.name for p, f in zip(pending, futures) if f.result()}
+                if all(p.name in done for p in printers):
+                    printed_ids.append(venda['id'])
+                    del progress[venda['id']]
+                elif stats:
+                    stats.failed += 1
+        except Exception:
+            client.release_claimed(progress, worker_id)
+            raise
+
+        client.release_claimed(progress, worker_id)
+        if client.ack_claimed(printed_ids, worker_id):
+            print(f" >> {len(printed_ids)} venda(s) marcada(s) como impressa(s).")
+            if stats:
+                stats.ack_batches += 1
+        else:
+            print(" >> Erro ao atualizar status no banco.")
+            if stats:
+                stats.ack_failures += 1
+
+        printed_total += len(printed_ids)
+        if stats:
+            stats.printed += len(printed_ids)
+        if not printed_ids:
+            # Printer is down: stop re-claiming the same released sales, let polling back off
+            break
+    return printed_total
+
+def run_daemon(client, printers):
+    """
+    Long-running mode: drains the whole backlog, then polls again.
+    Polling stays tight while there is work and backs off (x2, up to
+    POLL_MAX_INTERVAL) while idle. An error in one poll is logged and
+    counted, and the daemon backs off and keeps running.
+    """
+    stats = DaemonStats()
+    last_report = time.monotonic()
+    print(f">>> Modo continuo worker={WORKER_ID} (pagina={PAGE_SIZE}, lease={LEASE_SECONDS}s, "
+          f"intervalo {POLL_MIN_INTERVAL}-{POLL_MAX_INTERVAL}s)")
+
+    try:
+        while True:
+            stats.polls += 1
+            try:
+                stats.queue_depth = client.count_vendas_abertas()
+                printed = drain(client, printers, stats) if stats.queue_depth != 0 else 0
+            except Exception as e:
+                stats.errors += 1
+                print(f"Erro no ciclo de impressao: {e!r}")
+                printed = 0
+
+            if printed:
+                stats.interval = POLL_MIN_INTERVAL
+            else:
+                stats.interval = min(stats.interval * 2, POLL_MAX_INTERVAL)
+
+            if time.monotonic() - last_report >= STATS_INTERVAL:
+                print(stats.report())
+                for printer in printers:
+                    print(printer.report())
+                last_report = time.monotonic()
+
+            time.sleep(stats.interval)
+    except KeyboardInterrupt:
+        print("\n>>> Encerrando servico de impressao")
+    finally:
+        print(stats.report())
+        for printer in printers:
+            printer.close()
+            print(printer.report())
+        client.pool.close()
+
 def main():
     print(">>> Servico de Impressao Iniciado")
     
@@ -184,41 +791,20 @@ def main():
         return
 
     client = SupabaseClient(SUPABASE_URL, SUPABASE_KEY)
-    printer = EscPosPrinter(ip=PRINTER_IP) # Set IP here or via env var
+    printers = parse_printers() # PRINTER_IP, or several printers via PRINTERS env var
 
-    # Simulated Loop (In production, use time.sleep)
-    # 1. Fetch sales
-    print("Buscando vendas para impressao...")
-    vendas = client.get_vendas_abertas()
-    
-    if not vendas:
-        print("Nenhuma venda pendente.")
+    if '--daemon' in sys.argv:
+        run_daemon(client, printers)
         return
 
-    for venda in vendas:
-        print(f"Processando venda #{venda.get('numero_venda')}...")
-        
-        # 2. Generate Binary
-        cupom_data = printer.generate_receipt(venda)
-        
-        # 3. Print (Simulated check if IP is set)
-        if printer.ip and printer.ip != "0.0.0.0":
-            success = printer.print_network(cupom_data)
-        else:
-            # Save to file for testing/USB spooler pick-up
-            filename = f"cupom_{venda['id']}.bin"
-            with open(filename, "wb") as f:
-                f.write(cupom_data)
-            print(f"Cupom salvo em arquivo: {filename}")
-            success = True # Assume success for local file
-
-        # 4. Update Database
-        if success:
-            res = client.mark_printed(venda['id'])
-            if res:
-                print(" >> Venda marcada como impressa.")
-            else:
-                print(" >> Erro ao atualizar status no banco.")
+    # Single pass: print everything pending and exit
+    print("Buscando vendas para impressao...")
+    try:
+        if not drain(client, printers):
+            print("Nenhuma venda pendente.")
+    finally:
+        for printer in printers:
+            printer.close()
 
 if __name__ == "__main__":
     main()
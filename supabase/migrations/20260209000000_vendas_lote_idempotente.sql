@@ -0,0 +1,76 @@
+-- ============================================================================
+-- REPLAY IDEMPOTENTE DE VENDAS OFFLINE (caixas Python / journal local)
+-- Cada venda gravada offline carrega uma chave de idempotência gerada no caixa.
+-- Reenviar o mesmo lote (ex.: a resposta se perdeu na rede) não duplica vendas
+-- nem baixa o estoque duas vezes.
+-- ============================================================================
+
+-- 1. Chave de idempotência na venda
+ALTER TABLE public.vendas ADD COLUMN IF NOT EXISTS chave_idempotencia TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vendas_chave_idempotencia
+    ON public.vendas(chave_idempotencia)
+    WHERE chave_idempotencia IS NOT NULL;
+
+-- 2. Processamento em lote
+-- p_vendas: [{ "chave": "...", "venda": {...}, "itens": [...], "pagamentos": [...] }, ...]
+-- Retorna: [{ "chave": "...", "venda_id": "...", "status": "criada" | "duplicada" | "erro", "erro": "..." }]
+-- Cada venda roda em seu próprio bloco (subtransação): uma venda inválida não
+-- derruba as demais do lote.
+CREATE OR REPLACE FUNCTION public.processar_vendas_lote(p_vendas JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_entrada JSONB;
+    v_chave TEXT;
+    v_venda_id UUID;
+    v_venda JSONB;
+    v_resultado JSONB := '[]'::JSONB;
+BEGIN
+    FOR v_entrada IN SELECT * FROM jsonb_array_elements(p_vendas)
+    LOOP
+        v_chave := v_entrada->>'chave';
+        v_venda_id := NULL;
+
+        SELECT id INTO v_venda_id FROM public.vendas WHERE chave_idempotencia = v_chave;
+
+        IF v_venda_id IS NOT NULL THEN
+            v_resultado := v_resultado || jsonb_build_object(
+                'chave', v_chave, 'venda_id', v_venda_id, 'status', 'duplicada'
+            );
+            CONTINUE;
+        END IF;
+
+        BEGIN
+            v_venda := public.processar_venda_completa(
+                v_entrada->'venda',
+                COALESCE(v_entrada->'itens', '[]'::JSONB),
+                COALESCE(v_entrada->'pagamentos', '[]'::JSONB)
+            );
+
+            UPDATE public.vendas
+            SET chave_idempotencia = v_chave
+            WHERE id = (v_venda->>'id')::UUID;
+
+            v_resultado := v_resultado || jsonb_build_object(
+                'chave', v_chave, 'venda_id', v_venda->>'id', 'status', 'criada'
+            );
+        EXCEPTION
+            WHEN unique_violation THEN
+                -- Outro replay gravou a mesma chave em paralelo
+                SELECT id INTO v_venda_id FROM public.vendas WHERE chave_idempotencia = v_chave;
+                v_resultado := v_resultado || jsonb_build_object(
+                    'chave', v_chave, 'venda_id', v_venda_id, 'status', 'duplicada'
+                );
+            WHEN OTHERS THEN
+                v_resultado := v_resultado || jsonb_build_object(
+                    'chave', v_chave, 'status', 'erro', 'erro', SQLERRM
+                );
+        END;
+    END LOOP;
+
+    RETURN v_resultado;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 3. Permissões
+GRANT EXECUTE ON FUNCTION public.processar_vendas_lote(JSONB) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.processar_vendas_lote(JSONB) TO service_role;
@@ -0,0 +1,67 @@
+-- ============================================================================
+-- FILA DE IMPRESSÃO COM LEASE (vários printer_service em paralelo)
+-- Cada worker reivindica um lote disjunto de vendas não impressas por um tempo
+-- limitado. Se o worker morrer, o lease expira e as vendas voltam para a fila.
+-- ============================================================================
+
+-- 1. Colunas de controle do lease
+ALTER TABLE public.vendas ADD COLUMN IF NOT EXISTS impressao_worker TEXT;
+ALTER TABLE public.vendas ADD COLUMN IF NOT EXISTS impressao_lease_ate TIMESTAMPTZ;
+
+-- Índice parcial: só as vendas que ainda aguardam cupom
+CREATE INDEX IF NOT EXISTS idx_vendas_aguardando_impressao
+    ON public.vendas(numero_venda)
+    WHERE cupom_impresso = false AND status = 'finalizada';
+
+-- 2. Reivindicar lote
+-- FOR UPDATE SKIP LOCKED: workers concorrentes nunca recebem a mesma venda.
+-- Retorna as vendas no mesmo formato do select do printer_service
+-- (vendas.* + itens_venda[] com produtos.nome).
+CREATE OR REPLACE FUNCTION public.reivindicar_vendas_impressao(
+    p_worker TEXT,
+    p_limite INTEGER DEFAULT 50,
+    p_lease_segundos INTEGER DEFAULT 120
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_resultado JSONB;
+BEGIN
+    WITH candidatas AS (
+        SELECT id
+        FROM public.vendas
+        WHERE cupom_impresso = false
+          AND status = 'finalizada'
+          AND (impressao_lease_ate IS NULL OR impressao_lease_ate < NOW())
+        ORDER BY numero_venda
+        LIMIT p_limite
+        FOR UPDATE SKIP LOCKED
+    ),
+    reivindicadas AS (
+        UPDATE public.vendas v
+        SET impressao_worker = p_worker,
+            impressao_lease_ate = NOW() + make_interval(secs => p_lease_segundos)
+        FROM candidatas c
+        WHERE v.id = c.id
+        RETURNING v.*
+    )
+    SELECT COALESCE(jsonb_agg(
+        to_jsonb(r) || jsonb_build_object('itens_venda', (
+            SELECT COALESCE(jsonb_agg(
+                to_jsonb(iv) || jsonb_build_object('produtos', jsonb_build_object('nome', p.nome))
+                ORDER BY iv.sequencia
+            ), '[]'::JSONB)
+            FROM public.itens_venda iv
+            LEFT JOIN public.produtos p ON p.id = iv.produto_id
+            WHERE iv.venda_id = r.id
+        ))
+        ORDER BY r.numero_venda
+    ), '[]'::JSONB)
+    INTO v_resultado
+    FROM reivindicadas r;
+
+    RETURN v_resultado;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 3. Permissões
+GRANT EXECUTE ON FUNCTION public.reivindicar_vendas_impressao(TEXT, INTEGER, INTEGER) TO service_role;
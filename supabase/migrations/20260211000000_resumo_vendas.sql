@@ -0,0 +1,46 @@
+-- ============================================================================
+-- RESUMO DE VENDAS AGREGADO NO BANCO (agente Python / dashboards)
+-- Devolve só os totais do período em vez de todas as linhas de vendas:
+-- o payload e a latência não crescem com o volume, e o limite de linhas do
+-- PostgREST não trunca mais o resultado.
+-- ============================================================================
+
+-- 1. Índice para o filtro por período (só vendas finalizadas)
+CREATE INDEX IF NOT EXISTS idx_vendas_finalizadas_created_at
+    ON public.vendas(created_at)
+    WHERE status = 'finalizada';
+
+-- 2. Resumo do período [p_inicio, p_fim)
+-- Retorna: { "qtd_vendas": N, "total": 0.00, "ticket_medio": 0.00,
+--            "por_pagamento": [{ "forma_pagamento": "pix", "qtd": N, "total": 0.00 }, ...] }
+CREATE OR REPLACE FUNCTION public.resumo_vendas(
+    p_inicio TIMESTAMPTZ,
+    p_fim TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS JSONB AS $$
+    WITH periodo AS (
+        SELECT total, COALESCE(forma_pagamento::TEXT, 'desconhecido') AS forma
+        FROM public.vendas
+        WHERE status = 'finalizada'
+          AND created_at >= p_inicio
+          AND (p_fim IS NULL OR created_at < p_fim)
+    ),
+    por_forma AS (
+        SELECT forma, COUNT(*) AS qtd, SUM(total) AS total
+        FROM periodo
+        GROUP BY forma
+    )
+    SELECT jsonb_build_object(
+        'qtd_vendas', COALESCE(SUM(qtd), 0),
+        'total', COALESCE(SUM(total), 0),
+        'ticket_medio', COALESCE(ROUND(SUM(total) / NULLIF(SUM(qtd), 0), 2), 0),
+        'por_pagamento', COALESCE(jsonb_agg(jsonb_build_object(
+            'forma_pagamento', forma, 'qtd', qtd, 'total', total
+        ) ORDER BY total DESC), '[]'::JSONB)
+    )
+    FROM por_forma;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- 3. Permissões
+GRANT EXECUTE ON FUNCTION public.resumo_vendas(TIMESTAMPTZ, TIMESTAMPTZ) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.resumo_vendas(TIMESTAMPTZ, TIMESTAMPTZ) TO service_role;
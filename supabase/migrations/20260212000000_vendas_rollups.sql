@@ -0,0 +1,356 @@
+-- ============================================================================
+-- ROLLUPS DE VENDAS (por dia/hora, forma de pagamento e produto)
+-- Agregados mantidos de forma incremental a partir de vendas.updated_at, para
+-- o agente e os dashboards responderem em O(dias) em vez de O(vendas).
+--
+-- Cada venda finalizada tem sua contribuição registrada em
+-- vendas_rollup_contrib. Quando a venda muda (cancelamento, correção de valor
+-- ou forma de pagamento), a contribuição antiga é subtraída e a nova somada,
+-- então reprocessar a mesma venda nunca conta em dobro.
+--
+-- Uso:
+--   SELECT atualizar_rollups();                        -- incremental (watermark)
+--   SELECT backfill_rollups();                         -- reconstrói tudo
+--   SELECT backfill_rollups('2026-02-01', '2026-03-01'); -- reconstrói [inicio, fim)
+--   SELECT verificar_rollups('2026-02-01', '2026-03-01'); -- compara com vendas
+-- ============================================================================
+
+-- 1. Tabelas
+CREATE TABLE IF NOT EXISTS public.vendas_rollup_hora (
+    dia DATE NOT NULL,
+    hora SMALLINT NOT NULL,
+    qtd INTEGER NOT NULL DEFAULT 0,
+    total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, hora)
+);
+
+CREATE TABLE IF NOT EXISTS public.vendas_rollup_pagamento (
+    dia DATE NOT NULL,
+    forma_pagamento TEXT NOT NULL,
+    qtd INTEGER NOT NULL DEFAULT 0,
+    total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, forma_pagamento)
+);
+
+CREATE TABLE IF NOT EXISTS public.vendas_rollup_produto (
+    dia DATE NOT NULL,
+    produto_id UUID NOT NULL,
+    quantidade NUMERIC(14,3) NOT NULL DEFAULT 0,
+    total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    qtd_vendas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, produto_id)
+);
+
+-- Contribuição atual de cada venda finalizada (itens já agrupados por produto)
+CREATE TABLE IF NOT EXISTS public.vendas_rollup_contrib (
+    venda_id UUID PRIMARY KEY,
+    dia DATE NOT NULL,
+    hora SMALLINT NOT NULL,
+    forma_pagamento TEXT NOT NULL,
+    total NUMERIC(14,2) NOT NULL,
+    itens JSONB NOT NULL DEFAULT '[]'::JSONB
+);
+CREATE INDEX IF NOT EXISTS idx_vendas_rollup_contrib_dia ON public.vendas_rollup_contrib(dia);
+
+CREATE TABLE IF NOT EXISTS public.rollup_watermark (
+    nome TEXT PRIMARY KEY,
+    valor TIMESTAMPTZ NOT NULL,
+    atualizado_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+INSERT INTO public.rollup_watermark (nome, valor)
+VALUES ('vendas', '-infinity')
+ON CONFLICT (nome) DO NOTHING;
+
+-- Vendas alteradas depois do watermark
+CREATE INDEX IF NOT EXISTS idx_vendas_updated_at ON public.vendas(updated_at);
+
+-- Totais por dia = soma das 24 horas
+CREATE OR REPLACE VIEW public.vendas_rollup_dia AS
+SELECT dia, SUM(qtd)::INTEGER AS qtd, SUM(total) AS total
+FROM public.vendas_rollup_hora
+GROUP BY dia;
+
+ALTER TABLE public.vendas_rollup_hora ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.vendas_rollup_pagamento ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.vendas_rollup_produto ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.vendas_rollup_contrib ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.rollup_watermark ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Authenticated users can read vendas_rollup_hora"
+    ON public.vendas_rollup_hora FOR SELECT TO authenticated USING (true);
+CREATE POLICY "Authenticated users can read vendas_rollup_pagamento"
+    ON public.vendas_rollup_pagamento FOR SELECT TO authenticated USING (true);
+CREATE POLICY "Authenticated users can read vendas_rollup_produto"
+    ON public.vendas_rollup_produto FOR SELECT TO authenticated USING (true);
+
+-- 2. Dia e hora locais da loja
+CREATE OR REPLACE FUNCTION public._rollup_local(p_ts TIMESTAMPTZ)
+RETURNS TIMESTAMP AS $$
+    SELECT p_ts AT TIME ZONE 'America/Sao_Paulo';
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 3. Contribuição atual de uma venda (nenhuma linha se não estiver finalizada)
+CREATE OR REPLACE FUNCTION public._rollup_contrib_venda(p_venda_id UUID)
+RETURNS SETOF public.vendas_rollup_contrib AS $$
+    SELECT
+        v.id,
+        public._rollup_local(v.created_at)::DATE,
+        EXTRACT(HOUR FROM public._rollup_local(v.created_at))::SMALLINT,
+        COALESCE(v.forma_pagamento::TEXT, 'desconhecido'),
+        v.total,
+        COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'produto_id', i.produto_id, 'quantidade', i.quantidade, 'total', i.total
+            ) ORDER BY i.produto_id)
+            FROM (
+                SELECT produto_id, SUM(quantidade) AS quantidade, SUM(subtotal) AS total
+                FROM public.itens_venda
+                WHERE venda_id = v.id
+                GROUP BY produto_id
+            ) i
+        ), '[]'::JSONB)
+    FROM public.vendas v
+    WHERE v.id = p_venda_id AND v.status = 'finalizada';
+$$ LANGUAGE sql STABLE;
+
+-- 4. Soma (p_sinal = 1) ou subtrai (p_sinal = -1) uma contribuição dos rollups
+CREATE OR REPLACE FUNCTION public._rollup_somar(p_c public.vendas_rollup_contrib, p_sinal INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO public.vendas_rollup_hora AS r (dia, hora, qtd, total)
+    VALUES (p_c.dia, p_c.hora, p_sinal, p_sinal * p_c.total)
+    ON CONFLICT (dia, hora) DO UPDATE
+        SET qtd = r.qtd + EXCLUDED.qtd, total = r.total + EXCLUDED.total;
+
+    INSERT INTO public.vendas_rollup_pagamento AS r (dia, forma_pagamento, qtd, total)
+    VALUES (p_c.dia, p_c.forma_pagamento, p_sinal, p_sinal * p_c.total)
+    ON CONFLICT (dia, forma_pagamento) DO UPDATE
+        SET qtd = r.qtd + EXCLUDED.qtd, total = r.total + EXCLUDED.total;
+
+    INSERT INTO public.vendas_rollup_produto AS r (dia, produto_id, quantidade, total, qtd_vendas)
+    SELECT p_c.dia, (i->>'produto_id')::UUID,
+           p_sinal * (i->>'quantidade')::NUMERIC, p_sinal * (i->>'total')::NUMERIC, p_sinal
+    FROM jsonb_array_elements(p_c.itens) i
+    ON CONFLICT (dia, produto_id) DO UPDATE
+        SET quantidade = r.quantidade + EXCLUDED.quantidade,
+            total = r.total + EXCLUDED.total,
+            qtd_vendas = r.qtd_vendas + EXCLUDED.qtd_vendas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 5. Reaplica uma venda: tira a contribuição antiga, soma a atual
+CREATE OR REPLACE FUNCTION public._rollup_reaplicar_venda(p_venda_id UUID)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_antiga public.vendas_rollup_contrib;
+    v_nova public.vendas_rollup_contrib;
+BEGIN
+    SELECT * INTO v_antiga FROM public.vendas_rollup_contrib WHERE venda_id = p_venda_id;
+    SELECT * INTO v_nova FROM public._rollup_contrib_venda(p_venda_id);
+
+    IF v_antiga IS NOT DISTINCT FROM v_nova THEN
+        RETURN FALSE; -- nada mudou (ex.: só cupom_impresso)
+    END IF;
+
+    IF v_antiga.venda_id IS NOT NULL THEN
+        PERFORM public._rollup_somar(v_antiga, -1);
+        DELETE FROM public.vendas_rollup_contrib WHERE venda_id = p_venda_id;
+    END IF;
+
+    IF v_nova.venda_id IS NOT NULL THEN
+        PERFORM public._rollup_somar(v_nova, 1);
+        INSERT INTO public.vendas_rollup_contrib SELECT (v_nova).*;
+    END IF;
+
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 6. Atualização incremental
+-- Reprocessa as vendas com updated_at depois do watermark, menos p_folga_segundos
+-- para pegar transações que gravaram com um now() anterior mas commitaram depois.
+-- Reprocessar uma venda sem mudanças não altera nada.
+CREATE OR REPLACE FUNCTION public.atualizar_rollups(p_folga_segundos INTEGER DEFAULT 300)
+RETURNS JSONB AS $$
+DECLARE
+    v_watermark TIMESTAMPTZ;
+    v_max TIMESTAMPTZ;
+    v_venda RECORD;
+    v_lidas INTEGER := 0;
+    v_alteradas INTEGER := 0;
+BEGIN
+    -- Uma atualização por vez
+    PERFORM pg_advisory_xact_lock(hashtext('vendas_rollup'));
+
+    SELECT valor INTO v_watermark FROM public.rollup_watermark WHERE nome = 'vendas';
+    v_max := v_watermark;
+
+    FOR v_venda IN
+        SELECT id, updated_at
+        FROM public.vendas
+        WHERE updated_at > v_watermark - make_interval(secs => p_folga_segundos)
+        ORDER BY updated_at
+    LOOP
+        v_lidas := v_lidas + 1;
+        IF public._rollup_reaplicar_venda(v_venda.id) THEN
+            v_alteradas := v_alteradas + 1;
+        END IF;
+        v_max := GREATEST(v_max, v_venda.updated_at);
+    END LOOP;
+
+    UPDATE public.rollup_watermark
+    SET valor = v_max, atualizado_em = NOW()
+    WHERE nome = 'vendas';
+
+    RETURN jsonb_build_object('lidas', v_lidas, 'alteradas', v_alteradas, 'watermark', v_max);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 7. Backfill: reconstrói os dias [p_inicio, p_fim) direto das tabelas de vendas
+-- Sem datas, reconstrói tudo e move o watermark para agora.
+CREATE OR REPLACE FUNCTION public.backfill_rollups(p_inicio DATE DEFAULT NULL, p_fim DATE DEFAULT NULL)
+RETURNS JSONB AS $$
+DECLARE
+    v_vendas INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('vendas_rollup'));
+
+    DELETE FROM public.vendas_rollup_contrib
+    WHERE (p_inicio IS NULL OR dia >= p_inicio) AND (p_fim IS NULL OR dia < p_fim);
+    DELETE FROM public.vendas_rollup_hora
+    WHERE (p_inicio IS NULL OR dia >= p_inicio) AND (p_fim IS NULL OR dia < p_fim);
+    DELETE FROM public.vendas_rollup_pagamento
+    WHERE (p_inicio IS NULL OR dia >= p_inicio) AND (p_fim IS NULL OR dia < p_fim);
+    DELETE FROM public.vendas_rollup_produto
+    WHERE (p_inicio IS NULL OR dia >= p_inicio) AND (p_fim IS NULL OR dia < p_fim);
+
+    INSERT INTO public.vendas_rollup_contrib (venda_id, dia, hora, forma_pagamento, total, itens)
+    SELECT v.id,
+           public._rollup_local(v.created_at)::DATE,
+           EXTRACT(HOUR FROM public._rollup_local(v.created_at))::SMALLINT,
+           COALESCE(v.forma_pagamento::TEXT, 'desconhecido'),
+           v.total,
+           COALESCE(it.itens, '[]'::JSONB)
+    FROM public.vendas v
+    LEFT JOIN LATERAL (
+        SELECT jsonb_agg(jsonb_build_object(
+            'produto_id', i.produto_id, 'quantidade', i.quantidade, 'total', i.total
+        ) ORDER BY i.produto_id) AS itens
+        FROM (
+            SELECT produto_id, SUM(quantidade) AS quantidade, SUM(subtotal) AS total
+            FROM public.itens_venda
+            WHERE venda_id = v.id
+            GROUP BY produto_id
+        ) i
+    ) it ON true
+    WHERE v.status = 'finalizada'
+      AND (p_inicio IS NULL OR public._rollup_local(v.created_at)::DATE >= p_inicio)
+      AND (p_fim IS NULL OR public._rollup_local(v.created_at)::DATE < p_fim);
+    GET DIAGNOSTICS v_vendas = ROW_COUNT;
+
+    INSERT INTO public.vendas_rollup_hora (dia, hora, qtd, total)
+    SELECT dia, hora, COUNT(*), SUM(total)
+    FROM public.vendas_rollup_contrib
+    WHERE (p_inicio IS NULL OR dia >= p_inicio) AND (p_fim IS NULL OR dia < p_fim)
+    GROUP BY dia, hora;
+
+    INSERT INTO public.vendas_rollup_pagamento (dia, forma_pagamento, qtd, total)
+    SELECT dia, forma_pagamento, COUNT(*), SUM(total)
+    FROM public.vendas_rollup_contrib
+    WHERE (p_inicio IS NULL OR dia >= p_inicio) AND (p_fim IS NULL OR dia < p_fim)
+    GROUP BY dia, forma_pagamento;
+
+    INSERT INTO public.vendas_rollup_produto (dia, produto_id, quantidade, total, qtd_vendas)
+    SELECT c.dia, (i->>'produto_id')::UUID, SUM((i->>'quantidade')::NUMERIC),
+           SUM((i->>'total')::NUMERIC), COUNT(*)
+    FROM public.vendas_rollup_contrib c, jsonb_array_elements(c.itens) i
+    WHERE (p_inicio IS NULL OR c.dia >= p_inicio) AND (p_fim IS NULL OR c.dia < p_fim)
+    GROUP BY c.dia, (i->>'produto_id')::UUID;
+
+    IF p_inicio IS NULL AND p_fim IS NULL THEN
+        UPDATE public.rollup_watermark SET valor = NOW(), atualizado_em = NOW() WHERE nome = 'vendas';
+    END IF;
+
+    RETURN jsonb_build_object('vendas', v_vendas, 'inicio', p_inicio, 'fim', p_fim);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 8. Verificação: dias em que o rollup diverge das vendas
+-- Retorna: [{ "dia": "...", "qtd_vendas": N, "qtd_rollup": N, "total_vendas": 0.00, "total_rollup": 0.00 }]
+CREATE OR REPLACE FUNCTION public.verificar_rollups(p_inicio DATE, p_fim DATE)
+RETURNS JSONB AS $$
+    WITH brutas AS (
+        SELECT public._rollup_local(created_at)::DATE AS dia, COUNT(*) AS qtd, SUM(total) AS total
+        FROM public.vendas
+        WHERE status = 'finalizada'
+          AND created_at >= p_inicio::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo'
+          AND created_at < p_fim::TIMESTAMP AT TIME ZONE 'America/Sao_Paulo'
+        GROUP BY 1
+    ),
+    rollup AS (
+        SELECT dia, qtd, total
+        FROM public.vendas_rollup_dia
+        WHERE dia >= p_inicio AND dia < p_fim
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'dia', COALESCE(b.dia, r.dia),
+        'qtd_vendas', COALESCE(b.qtd, 0), 'qtd_rollup', COALESCE(r.qtd, 0),
+        'total_vendas', COALESCE(b.total, 0), 'total_rollup', COALESCE(r.total, 0)
+    ) ORDER BY COALESCE(b.dia, r.dia)), '[]'::JSONB)
+    FROM brutas b
+    FULL JOIN rollup r ON r.dia = b.dia
+    WHERE COALESCE(b.qtd, 0) <> COALESCE(r.qtd, 0)
+       OR COALESCE(b.total, 0) <> COALESCE(r.total, 0);
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- 9. Leitura pelo agente
+-- Mesmo formato de resumo_vendas, somando os rollups dos dias [p_inicio, p_fim)
+CREATE OR REPLACE FUNCTION public.resumo_vendas_rollup(p_inicio DATE, p_fim DATE DEFAULT NULL)
+RETURNS JSONB AS $$
+    WITH por_forma AS (
+        SELECT forma_pagamento AS forma, SUM(qtd) AS qtd, SUM(total) AS total
+        FROM public.vendas_rollup_pagamento
+        WHERE dia >= p_inicio AND (p_fim IS NULL OR dia < p_fim)
+        GROUP BY forma_pagamento
+        HAVING SUM(qtd) <> 0
+    )
+    SELECT jsonb_build_object(
+        'qtd_vendas', COALESCE(SUM(qtd), 0),
+        'total', COALESCE(SUM(total), 0),
+        'ticket_medio', COALESCE(ROUND(SUM(total) / NULLIF(SUM(qtd), 0), 2), 0),
+        'por_pagamento', COALESCE(jsonb_agg(jsonb_build_object(
+            'forma_pagamento', forma, 'qtd', qtd, 'total', total
+        ) ORDER BY total DESC), '[]'::JSONB)
+    )
+    FROM por_forma;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- Produtos mais vendidos (por faturamento) nos dias [p_inicio, p_fim)
+CREATE OR REPLACE FUNCTION public.top_produtos_rollup(p_inicio DATE, p_fim DATE DEFAULT NULL, p_limite INTEGER DEFAULT 10)
+RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_agg(to_jsonb(t) ORDER BY t.total DESC), '[]'::JSONB)
+    FROM (
+        SELECT r.produto_id, p.nome, SUM(r.quantidade) AS quantidade,
+               SUM(r.total) AS total, SUM(r.qtd_vendas) AS qtd_vendas
+        FROM public.vendas_rollup_produto r
+        LEFT JOIN public.produtos p ON p.id = r.produto_id
+        WHERE r.dia >= p_inicio AND (p_fim IS NULL OR r.dia < p_fim)
+        GROUP BY r.produto_id, p.nome
+        HAVING SUM(r.qtd_vendas) > 0
+        ORDER BY SUM(r.total) DESC
+        LIMIT p_limite
+    ) t;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- 10. Permissões
+GRANT EXECUTE ON FUNCTION public.atualizar_rollups(INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.atualizar_rollups(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION public.backfill_rollups(DATE, DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION public.verificar_rollups(DATE, DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION public.resumo_vendas_rollup(DATE, DATE) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.resumo_vendas_rollup(DATE, DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION public.top_produtos_rollup(DATE, DATE, INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.top_produtos_rollup(DATE, DATE, INTEGER) TO service_role;
+
+-- 11. Carga inicial
+SELECT public.backfill_rollups();
@@ -0,0 +1,10 @@
+-- ============================================================================
+-- PROGRESSO DE IMPRESSÃO POR IMPRESSORA
+-- Cada venda vai para todas as impressoras (balcão, cozinha...). Quando só
+-- algumas imprimem, o printer_service grava aqui quais já imprimiram antes de
+-- devolver a venda à fila; a nova tentativa imprime só nas que faltam.
+-- ============================================================================
+
+ALTER TABLE public.vendas ADD COLUMN IF NOT EXISTS impressoras_ok TEXT[] NOT NULL DEFAULT '{}';
+
+-- reivindicar_vendas_impressao retorna vendas.*, então a coluna já vem no lote